@@ -2,7 +2,7 @@ import os
 import sys
 import glob
 
-from PyQt5 import QtWidgets, uic, QtCore
+from PyQt5 import QtWidgets, QtCore
 from PyQt5.QtWidgets import QApplication, QFileDialog, QMessageBox, QMenu, QAction, QDialog
 from PyQt5.QtGui import QIcon, QDesktopServices
 from PyQt5.QtCore import Qt, QModelIndex, QSortFilterProxyModel, QUrl
@@ -13,9 +13,13 @@ from modules.io import network_share_accessible
 from modules.io import io_profile
 from modules.io import io_global
 from modules.io import io_savetitan
+from modules.io import io_profile_batch
+from modules.io import io_savetitan_batch
 
 from modules.misc import center_dialog_over_dialog
 
+from modules.forms import load_form
+
 from modules.sync import check_and_sync_saves
 
 from components.config_editor import ConfigEditorDialog
@@ -82,7 +86,7 @@ def show_config_dialog():
 
     global dialog
 
-    dialog = uic.loadUi("ui/config.ui")
+    dialog = load_form("config.ui")
     dialog.setWindowFlags(dialog.windowFlags() & ~Qt.WindowMaximizeButtonHint)
 
     dialog.setFixedSize(dialog.size())
@@ -211,7 +215,7 @@ def show_config_dialog():
             return
 
         config_dialog = QApplication.activeWindow()
-        add_profile_dialog = uic.loadUi("ui/add_profile.ui")
+        add_profile_dialog = load_form("add_profile.ui")
 
         def select_executable():
             file_filter = "Executable Files (*.exe *.bat *.cmd)" if sys.platform == "win32" else "Executable Files (*.sh *.AppImage)"
@@ -288,10 +292,11 @@ def show_config_dialog():
                     ("checkout", "")
                 ]
 
-                for field, value in profile_info_fields:
-                    io_savetitan("write", profile_id, "profile", field, value)
+                with io_savetitan_batch(profile_id) as profile_info:
+                    for field, value in profile_info_fields:
+                        profile_info.write("profile", field, value)
 
-                io_savetitan("write", profile_id, "saves", "save1", "Save 1")
+                    profile_info.write("saves", "save1", "Save 1")
 
             export_profile_info(profile_name, profile_id, sync_mode, os.path.basename(game_executable))
 
@@ -303,11 +308,12 @@ def show_config_dialog():
                 "saves": "1",
                 "sync_mode": sync_mode,
             }
-            io_profile("write", profile_id, "profile", "watched_config_folders", os.path.dirname(local_save_folder), "add")
-            io_profile("write", profile_id, "profile", "watched_config_folders", os.path.dirname(game_executable), "add")
+            with io_profile_batch(profile_id) as profile:
+                profile.write("profile", "watched_config_folders", os.path.dirname(local_save_folder), "add")
+                profile.write("profile", "watched_config_folders", os.path.dirname(game_executable), "add")
 
-            for field, value in profile_fields.items():
-                io_profile("write", profile_id, "profile", field, value)
+                for field, value in profile_fields.items():
+                    profile.write("profile", field, value)
 
             new_row_data = [profile_name, sync_mode, profile_id]
             configprofileView.model().sourceModel()._data.append(new_row_data)
@@ -354,7 +360,7 @@ def show_config_dialog():
             QMessageBox.warning(None, "Cloud Storage Path Not Found", "Cloud storage path is not configured or invalid. Please configure it.")
             return
 
-        import_profile_dialog = uic.loadUi("ui/import_profile.ui")
+        import_profile_dialog = load_form("import_profile.ui")
         import_profile_dialog.setWindowFlags(import_profile_dialog.windowFlags() & ~Qt.WindowMaximizeButtonHint)
         import_profile_dialog.setFixedSize(import_profile_dialog.size())
         import_profile_dialog.importButton.setEnabled(False)
@@ -395,7 +401,8 @@ def show_config_dialog():
             import_profile_dialog.listWidget.clear()
             import_profile_dialog.listWidget.setEnabled(False)
 
-            subfolders = [f.path for f in os.scandir(cloud_storage_path) if f.is_dir()]
+            # Folders starting with a dot hold shared data such as the chunk object store, not profiles
+            subfolders = [f.path for f in os.scandir(cloud_storage_path) if f.is_dir() and not f.name.startswith(".")]
             total_subfolders = len(subfolders)
             import_profile_dialog.progressBar.setMaximum(total_subfolders - 1)
 
@@ -509,14 +516,15 @@ def show_config_dialog():
                 else:
                     break
 
-            io_profile("write", profile_id, "profile", "name", profile_name)
-            io_profile("write", profile_id, "profile", "local_save_folder", local_save_folder)
-            io_profile("write", profile_id, "profile", "game_executable", executable_path)
-            io_profile("write", profile_id, "profile", "save_slot", save_slot)
-            io_profile("write", profile_id, "profile", "saves", saves)
-            io_profile("write", profile_id, "profile", "sync_mode", sync_mode)
-            io_profile("write", profile_id, "profile", "executable_name", executable_name)
-            io_profile("write", profile_id, "profile", "executable_path", executable_path)
+            with io_profile_batch(profile_id) as profile:
+                profile.write("profile", "name", profile_name)
+                profile.write("profile", "local_save_folder", local_save_folder)
+                profile.write("profile", "game_executable", executable_path)
+                profile.write("profile", "save_slot", save_slot)
+                profile.write("profile", "saves", saves)
+                profile.write("profile", "sync_mode", sync_mode)
+                profile.write("profile", "executable_name", executable_name)
+                profile.write("profile", "executable_path", executable_path)
 
             QMessageBox.information(None, "Success", "Profile imported successfully.")
             new_row_data = [profile_name, sync_mode, profile_id]
@@ -545,7 +553,7 @@ def show_config_dialog():
             QMessageBox.warning(None, "Cloud Storage Path Not Found", "Cloud storage path is not configured or invalid. Please configure it.")
             return
 
-        omit_files_dialog = uic.loadUi("ui/list_dialog.ui")
+        omit_files_dialog = load_form("list_dialog.ui")
         omit_files_dialog.setWindowFlags(omit_files_dialog.windowFlags() & ~Qt.WindowMaximizeButtonHint)
         omit_files_dialog.setFixedSize(omit_files_dialog.size())
 
@@ -757,14 +765,16 @@ def show_config_dialog():
                                     "A profile with the same name already exists. Please choose a different name.")
                 return
 
-        io_profile("write", profile_id, "profile", "name", profile_name)
-        io_profile("write", profile_id, "profile", "local_save_folder", local_save_folder)
-        io_profile("write", profile_id, "profile", "game_executable", game_executable)
-        io_profile("write", profile_id, "profile", "sync_mode", sync_mode)
+        with io_profile_batch(profile_id) as profile:
+            profile.write("profile", "name", profile_name)
+            profile.write("profile", "local_save_folder", local_save_folder)
+            profile.write("profile", "game_executable", game_executable)
+            profile.write("profile", "sync_mode", sync_mode)
 
-        save_slot = io_savetitan("read", profile_id, "saves", "save_slot")
-        io_savetitan("write", profile_id, "profile", "name", profile_name)
-        io_savetitan("write", profile_id, "profile", "executable_name", os.path.basename(game_executable))
+        with io_savetitan_batch(profile_id) as profile_info:
+            save_slot = profile_info.read("saves", "save_slot")
+            profile_info.write("profile", "name", profile_name)
+            profile_info.write("profile", "executable_name", os.path.basename(game_executable))
 
         configprofileView.model().sourceModel()._data = load_data_into_model_data()
 
@@ -13,6 +13,9 @@ from modules.io import io_profile
 
 #from modules.misc import center_dialog_over_dialog
 
+from modules.forms import load_form
+from modules.forms import ui_dir
+
 import modules.paths as paths
 user_config_file = paths.user_config_file
 global_config_file = paths.global_config_file
@@ -24,7 +27,7 @@ class ConfigEditorDialog(QDialog):
 
         self.initial_data = {}
 
-        self.ui = uic.loadUi("ui/config_editor.ui", self)
+        self.ui = uic.loadUi(os.path.join(ui_dir, "config_editor.ui"), self)
         self.setWindowFlags(self.windowFlags() & ~Qt.WindowMaximizeButtonHint)
 
         self.profile_id = profile_id
@@ -69,7 +72,7 @@ class ConfigEditorDialog(QDialog):
 
 
     def config_editor_add_folders_dialog(self):
-        config_editor_add_folders_dialog = uic.loadUi("ui/list_dialog.ui")
+        config_editor_add_folders_dialog = load_form("list_dialog.ui")
         config_editor_add_folders_dialog.setWindowFlags(config_editor_add_folders_dialog.windowFlags() & ~Qt.WindowMaximizeButtonHint)
         config_editor_add_folders_dialog.setFixedSize(config_editor_add_folders_dialog.size())
 
@@ -0,0 +1,45 @@
+import sys
+
+from PyQt5.QtWidgets import QDialog, QLabel, QCheckBox, QPushButton, QVBoxLayout
+from PyQt5.QtCore import Qt
+
+from modules.io import io_global
+
+
+class RiskWarningDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.setWindowTitle("Unstable Build Warning")
+        self.setFixedSize(400, 150)
+
+        self.label = QLabel("This is an unstable build of the program which is likely to be broken in many ways. Use at your own risk and always make personal backups of everything you point this at.", self)
+        self.label.setWordWrap(True)
+
+        self.checkbox = QCheckBox("I acknowledge the risk", self)
+        self.checkbox.stateChanged.connect(self.on_checkbox_state_changed)
+
+        self.ok_button = QPushButton("OK", self)
+        self.ok_button.setEnabled(False)
+        self.ok_button.clicked.connect(self.accept)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.label)
+        layout.addWidget(self.checkbox)
+        layout.addWidget(self.ok_button)
+
+    def on_checkbox_state_changed(self, state):
+        self.ok_button.setEnabled(state == Qt.Checked)
+
+    def closeEvent(self, event):
+        sys.exit(1)
+
+
+def show_risk_warning_if_needed():
+    risk_acknowledged = io_global("read", "config", "risk_acknowledged")
+    if risk_acknowledged is not None:
+        return
+
+    dialog = RiskWarningDialog()
+    if dialog.exec() == QDialog.Accepted:
+        io_global("write", "config", "risk_acknowledged", "1")
@@ -1,26 +1,63 @@
 import os
 import shutil
 
-from PyQt5 import uic
 from PyQt5.QtWidgets import QApplication, QMessageBox, QInputDialog, QListWidgetItem
 from PyQt5.QtCore import Qt
 
 from modules.io import io_profile
 from modules.io import io_global
 from modules.io import io_savetitan
-from modules.io import copy_save_to_cloud
-from modules.io import copy_save_to_local
+from modules.io import storage_layout
+from modules.io import check_slot_layout
+from modules.io import show_error
+from modules.io import StorageLayoutError
+
+from modules.engine import SyncEngine
+
+from modules.manifest import delete_manifest
+
+from modules.chunkstore import objects_dir
+from modules.chunkstore import save_index
+from modules.chunkstore import release_index
 
 from modules.misc import center_dialog_over_dialog
 
+from modules.forms import load_form
+
+from components.sync_progress import run_sync_with_progress
+
 import modules.paths as paths
 user_config_file = paths.user_config_file
 global_config_file = paths.global_config_file
 
 
+# Push or pull straight away on the calling thread, for switching slots without a GUI
+def run_sync_directly(engine, direction):
+    return engine.push() if direction == "push" else engine.pull()
+
+
+# Load another cloud save slot into the local save folder, uploading the current save to its own slot first if asked.
+# run_sync(engine, direction) runs each push and pull; the save manager passes run_sync_with_progress so they run off
+# the GUI thread. Returns the SyncResult of the last sync run. A failed or cancelled upload leaves the current slot
+# loaded, so the local save is never replaced before it is safe in the cloud. Raises StorageLayoutError, before
+# anything is copied, when the new slot is stored in the other layout.
+def switch_save_slot(profile_id, new_save_slot, upload_current=True, run_sync=run_sync_directly):
+    cloud_storage_path = io_global("read", "config", "cloud_storage_path")
+    check_slot_layout(os.path.join(cloud_storage_path, profile_id, f"save{new_save_slot}"), storage_layout())
+
+    if upload_current:
+        result = run_sync(SyncEngine(profile_id), "push")
+        if not result.success:
+            return result
+
+    io_profile("write", profile_id, "profile", "save_slot", new_save_slot)
+
+    return run_sync(SyncEngine(profile_id), "pull")
+
+
 # Function to open save management dialog
 def open_save_bank_manager(profile_id):
-    save_mgmt_dialog = uic.loadUi("ui/save_mgmt.ui")
+    save_mgmt_dialog = load_form("save_mgmt.ui")
     save_mgmt_dialog.setWindowFlags(save_mgmt_dialog.windowFlags() & ~Qt.WindowMaximizeButtonHint)
     save_mgmt_dialog.setFixedSize(save_mgmt_dialog.size())
 
@@ -63,7 +100,10 @@ def open_save_bank_manager(profile_id):
         io_savetitan("write", profile_id, "saves", f'save{number_of_saves}', new_save_name)
 
         new_save_folder = os.path.join(cloud_storage_path, profile_id, f'save{number_of_saves}')
-        os.makedirs(new_save_folder, exist_ok=True)
+        if storage_layout() == "chunked":
+            save_index(new_save_folder, {}, [])
+        else:
+            os.makedirs(new_save_folder, exist_ok=True)
 
         item = QListWidgetItem(new_save_name)
         item.setData(Qt.UserRole, f'save{number_of_saves}')
@@ -90,16 +130,20 @@ def open_save_bank_manager(profile_id):
                                     "Do you want to upload your current save before switching? Your local save will be replaced with the selected one.",
                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
 
-        if reply == QMessageBox.Yes:
-            copy_save_to_cloud(profile_id)
-
         new_save_slot = selected_save_key.replace('save', '')
-        
-        io_profile("write", profile_id, "profile", "save_slot", new_save_slot)
 
-        save_mgmt_dialog.saveslotField.setText(selected_item.text())
+        try:
+            result = switch_save_slot(profile_id, new_save_slot, reply == QMessageBox.Yes, run_sync_with_progress)
+        except StorageLayoutError as e:
+            show_error("Storage Layout Mismatch", str(e))
+            return
+
+        if result.direction == "pull":
+            save_mgmt_dialog.saveslotField.setText(selected_item.text())
 
-        copy_save_to_local(profile_id)
+        # The progress dialog has already shown why a sync failed
+        if not result.success:
+            return
 
         QMessageBox.information(None, "Load Finished", "The selected save has been loaded successfully.")
 
@@ -129,7 +173,12 @@ def open_save_bank_manager(profile_id):
 
         io_savetitan("delete", profile_id, "saves", selected_save_key)
 
-        shutil.rmtree(os.path.join(cloud_storage_path, profile_id, selected_save_key))
+        selected_save_folder = os.path.join(cloud_storage_path, profile_id, selected_save_key)
+        if storage_layout() == "chunked":
+            release_index(objects_dir(cloud_storage_path), selected_save_folder)
+        if os.path.exists(selected_save_folder):
+            shutil.rmtree(selected_save_folder)
+        delete_manifest(selected_save_folder)
 
         list_item = save_mgmt_dialog.save_listWidget.takeItem(save_mgmt_dialog.save_listWidget.row(selected_item))
         del list_item
@@ -0,0 +1,163 @@
+import time
+import threading
+
+from PyQt5.QtWidgets import QDialog, QLabel, QProgressBar, QPushButton, QVBoxLayout
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+
+from modules.engine import SyncResult
+from modules.io import debug_msg
+from modules.io import show_error
+
+# How often the dialog redraws from the latest progress. Workers only store the numbers, so thousands of small files
+# do not flood the event loop with updates.
+progress_refresh_ms = 100
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "Estimating time left..."
+    seconds = int(seconds + 0.5)
+    if seconds < 60:
+        return f"About {seconds} s left"
+    return f"About {seconds // 60}:{seconds % 60:02d} left"
+
+
+class SyncSignals(QObject):
+    finished = pyqtSignal(object)
+
+
+# Runs one push or pull on Qt's thread pool. The engine's own transfer workers do the copying, this thread only
+# waits on them, so the dialog's event loop never blocks on the share.
+class SyncWorker(QRunnable):
+    def __init__(self, engine, direction, plan):
+        super().__init__()
+        self.engine = engine
+        self.direction = direction
+        self.plan = plan
+        self.signals = SyncSignals()
+        self.lock = threading.Lock()
+        self.state = {"rel_path": None, "files_done": 0, "files_total": len(plan.copies) if plan else 0,
+                      "bytes_done": 0, "bytes_total": plan.bytes_to_copy() if plan else 0}
+        engine.on_progress = self.report
+
+    def report(self, rel_path, size, files_done, files_total, bytes_done, bytes_total):
+        with self.lock:
+            self.state = {"rel_path": str(rel_path), "files_done": files_done, "files_total": files_total,
+                          "bytes_done": bytes_done, "bytes_total": bytes_total}
+
+    def progress(self):
+        with self.lock:
+            return dict(self.state)
+
+    def run(self):
+        started = time.monotonic()
+        try:
+            if self.direction == "push":
+                result = self.engine.push(self.plan)
+            else:
+                result = self.engine.pull(self.plan)
+        except Exception as e:
+            debug_msg(f"Sync {self.direction} failed: {e}", profile_id=self.engine.profile_id)
+            result = SyncResult(self.engine.profile_id, self.direction, 0, 0, 0, str(e), time.monotonic() - started)
+        self.signals.finished.emit(result)
+
+
+class SyncProgressDialog(QDialog):
+    def __init__(self, engine, direction, plan=None, title=None, parent=None):
+        super().__init__(parent)
+        self.engine = engine
+        self.result_value = None
+        self.started = time.monotonic()
+
+        self.setWindowTitle(title or ("Uploading save" if direction == "push" else "Downloading save"))
+        self.setMinimumWidth(420)
+        self.setWindowFlags(self.windowFlags() & ~Qt.WindowCloseButtonHint)
+
+        self.file_label = QLabel("Preparing...", self)
+        self.count_label = QLabel("", self)
+        self.eta_label = QLabel(format_eta(None), self)
+
+        self.progress_bar = QProgressBar(self)
+        self.progress_bar.setRange(0, 1000)
+        self.progress_bar.setValue(0)
+
+        self.cancel_button = QPushButton("Cancel", self)
+        self.cancel_button.clicked.connect(self.cancel)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.file_label)
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.count_label)
+        layout.addWidget(self.eta_label)
+        layout.addWidget(self.cancel_button)
+
+        # The dialog keeps the worker, Qt must not delete it once run() returns
+        self.worker = SyncWorker(engine, direction, plan)
+        self.worker.setAutoDelete(False)
+        self.worker.signals.finished.connect(self.on_finished)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(progress_refresh_ms)
+
+        QThreadPool.globalInstance().start(self.worker)
+
+    def refresh(self):
+        state = self.worker.progress()
+        files_total = state["files_total"]
+        bytes_total = state["bytes_total"]
+        bytes_done = state["bytes_done"]
+
+        if state["rel_path"] and not self.engine.cancel_requested():
+            self.file_label.setText(f"Copied: {state['rel_path']}")
+        self.count_label.setText(f"{state['files_done']} of {files_total} file(s), "
+                                 f"{format_size(bytes_done)} of {format_size(bytes_total)}")
+
+        if bytes_total:
+            self.progress_bar.setValue(int(min(bytes_done, bytes_total) * 1000 / bytes_total))
+        elif files_total:
+            self.progress_bar.setValue(int(state["files_done"] * 1000 / files_total))
+
+        # The rate is taken over the whole sync so far, which evens out small files between large ones
+        elapsed = time.monotonic() - self.started
+        if bytes_done and elapsed > 0.5:
+            self.eta_label.setText(format_eta(max(0, bytes_total - bytes_done) / (bytes_done / elapsed)))
+
+    # Files already being copied are finished, nothing new is started
+    def cancel(self):
+        self.engine.request_cancel()
+        self.cancel_button.setEnabled(False)
+        self.file_label.setText("Cancelling after the current file...")
+
+    # Errors from the worker thread are shown here, on the GUI thread
+    def on_finished(self, result):
+        self.timer.stop()
+        self.refresh()
+        self.result_value = result
+        self.accept()
+        if not result.success and not result.cancelled:
+            show_error("Sync Failed", result.error)
+
+    # Closing the window cancels the sync, the dialog stays up until the worker has stopped
+    def reject(self):
+        if self.result_value is None:
+            self.cancel()
+            return
+        super().reject()
+
+
+# Push or pull with a progress dialog and return the SyncResult. A plan with nothing to copy runs straight away.
+def run_sync_with_progress(engine, direction, plan=None, title=None):
+    if plan is not None and not plan.copies:
+        return engine.push(plan) if direction == "push" else engine.pull(plan)
+
+    dialog = SyncProgressDialog(engine, direction, plan, title)
+    dialog.exec_()
+    return dialog.result_value
@@ -0,0 +1,135 @@
+import os
+import sys
+import shutil
+
+from datetime import datetime
+
+from modules.snapshot import take_snapshot
+
+backup_time_format = "%Y%m%d-%H%M%S-%f"
+# Backups are opt-in. On a network share every file missing from the previous backup is read back through this
+# computer and written again, which costs more than the sync itself for small changes.
+default_backup_retention = 0
+
+# ioctl request number for FICLONE on Linux (btrfs, xfs and other reflink capable filesystems)
+FICLONE = 0x40049409
+
+
+# Copy a file, cloning it with a reflink first where the filesystem supports it
+def clone_file(source_file, destination_file):
+    if sys.platform.startswith("linux"):
+        try:
+            import fcntl
+            with open(source_file, 'rb') as source, open(destination_file, 'wb') as destination:
+                fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+            shutil.copystat(source_file, destination_file)
+            return destination_file
+        except OSError:
+            pass
+    shutil.copy2(source_file, destination_file)
+    return destination_file
+
+
+# Backups are named by timestamp, chunked slot backups are stored as <name>.index files instead of folders
+def list_backups(backups_root):
+    if not os.path.isdir(backups_root):
+        return []
+
+    names = set()
+    for entry in os.scandir(backups_root):
+        if entry.name.endswith(".partial") or entry.name.endswith(".tmp"):
+            continue
+        if entry.is_dir():
+            names.add(entry.name)
+        elif entry.name.endswith(".index"):
+            names.add(entry.name[:-len(".index")])
+    return sorted(names)
+
+
+def new_backup_name():
+    return datetime.now().strftime(backup_time_format)
+
+
+# Take a point-in-time copy of a folder. Files whose size and mtime match the previous backup are hard linked to it,
+# so a backup costs only the changed bytes plus a directory of links. Returns None for a folder with no files.
+def take_backup(source_root, backups_root):
+    source = take_snapshot(source_root)
+    if not source.files:
+        return None
+
+    previous = None
+    previous_backups = [name for name in list_backups(backups_root) if os.path.isdir(os.path.join(backups_root, name))]
+    if previous_backups:
+        previous = take_snapshot(os.path.join(backups_root, previous_backups[-1]))
+
+    name = new_backup_name()
+    backup_path = os.path.join(backups_root, name)
+    partial_path = f"{backup_path}.partial"
+
+    os.makedirs(partial_path, exist_ok=True)
+    for rel_dir in source.dirs:
+        os.makedirs(os.path.join(partial_path, rel_dir), exist_ok=True)
+
+    linked = 0
+    copied = 0
+    for rel_path, file_stat in source.files:
+        destination_file = os.path.join(partial_path, rel_path)
+        previous_stat = previous.stats.get(rel_path) if previous else None
+
+        if previous_stat and previous_stat.st_size == file_stat.st_size and previous_stat.st_mtime_ns == file_stat.st_mtime_ns:
+            try:
+                os.link(previous.path(rel_path), destination_file)
+                linked += 1
+                continue
+            except OSError:
+                pass
+
+        clone_file(source.path(rel_path), destination_file)
+        copied += 1
+
+    # The backup only gets its final name once complete, so an interrupted backup is never mistaken for a good one
+    os.rename(partial_path, backup_path)
+    return name, linked, copied
+
+
+# Remove the oldest backups beyond the retention count, release_index is used for chunked slot backups
+def prune_backups(backups_root, retention, release_index=None):
+    if not os.path.isdir(backups_root):
+        return []
+
+    for entry in os.scandir(backups_root):
+        if entry.name.endswith(".partial") and entry.is_dir():
+            shutil.rmtree(entry.path)
+
+    backups = list_backups(backups_root)
+    removed = backups[:max(0, len(backups) - retention)]
+    for name in removed:
+        backup_path = os.path.join(backups_root, name)
+        if os.path.isdir(backup_path):
+            shutil.rmtree(backup_path)
+        elif release_index is not None:
+            release_index(backup_path)
+    return removed
+
+
+# Replace a folder with a backup. The backup is copied to a .partial folder next to it and only swapped in once
+# complete, so a failed restore leaves the current save as it was. Files are copied so later in-place patches never
+# touch the backup.
+def restore_backup(backup_path, destination_root):
+    destination_root = os.path.normpath(destination_root)
+    partial_path = f"{destination_root}.partial"
+    old_path = f"{destination_root}.old"
+
+    # A restore interrupted between the two renames below left the current save only under .old
+    if os.path.isdir(old_path) and not os.path.exists(destination_root):
+        os.rename(old_path, destination_root)
+    for leftover in (partial_path, old_path):
+        if os.path.isdir(leftover):
+            shutil.rmtree(leftover)
+
+    shutil.copytree(backup_path, partial_path, copy_function=clone_file)
+
+    if os.path.exists(destination_root):
+        os.rename(destination_root, old_path)
+    os.rename(partial_path, destination_root)
+    shutil.rmtree(old_path, ignore_errors=True)
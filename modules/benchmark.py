@@ -0,0 +1,327 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import statistics
+
+from datetime import datetime
+
+import modules.hashcache as hashcache
+
+from modules.io import config_cache
+from modules.io import config_cache_lock
+from modules.io import io_global
+from modules.io import io_profile
+from modules.io import io_profile_batch
+from modules.io import io_savetitan
+from modules.io import copy_save_to_cloud
+from modules.io import copy_save_to_local
+
+from modules.session import SyncSession
+
+from modules.engine import SyncEngine
+
+import modules.sharesim as sharesim
+
+# The suite writes config, profiles and caches through the normal modules, so it must only be imported once
+# modules.paths points at a scratch folder. savetitan-bench.py does that before importing it.
+
+benchmark_profile_id = "benchmark"
+results_version = 1
+
+# Synthetic save layouts, file counts and sizes are scaled by --scale. Each shape is a list of
+# (folder, file count, file size) groups plus the files listed as omitted in the profile overrides.
+tree_shapes = {
+    "tiny": {
+        "groups": [(f"slot{index:02}", 100, 2 * 1024) for index in range(20)],
+        "omitted": [],
+    },
+    "huge": {
+        "groups": [("", 3, 32 * 1024 * 1024), ("meta", 4, 4 * 1024)],
+        "omitted": [],
+    },
+    "deep": {
+        "groups": [(os.path.join(*[f"level{depth}" for depth in range(1, level + 1)]), 12, 16 * 1024)
+                   for level in range(1, 17)],
+        "omitted": [],
+    },
+    "omitted": {
+        "groups": [("saves", 400, 8 * 1024), ("cache", 400, 8 * 1024), ("", 2, 1024 * 1024)],
+        "omitted": [os.path.join("cache", f"file{index:05}.bin") for index in range(400)] + ["file00001.bin"],
+    },
+}
+
+# Share of files rewritten by the small-change scenario, at least one file is always changed
+small_change_fraction = 0.01
+
+# A timing only counts as a regression when it is this much slower than the baseline, both relative and absolute,
+# so millisecond noise on tiny operations is not reported
+default_regression_threshold = 0.10
+default_regression_floor = 0.005
+
+
+def write_file(file_path, size, rng):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, 'wb') as f:
+        remaining = size
+        while remaining > 0:
+            block = min(remaining, 1024 * 1024)
+            f.write(rng.randbytes(block))
+            remaining -= block
+
+
+def scaled(value, scale):
+    return max(1, int(value * scale))
+
+
+# Write a shape's files under root and return the relative paths that were created
+def generate_tree(shape, root, scale, seed):
+    rng = random.Random(seed)
+    created = []
+    for folder, count, size in shape["groups"]:
+        for index in range(scaled(count, scale)):
+            rel_path = os.path.join(folder, f"file{index:05}.bin") if folder else f"file{index:05}.bin"
+            write_file(os.path.join(root, rel_path), scaled(size, scale), rng)
+            created.append(rel_path)
+    return created
+
+
+# Overwrite a share of the files with new content of the same size
+def change_files(root, rel_paths, fraction, rng):
+    changed = rng.sample(rel_paths, max(1, int(len(rel_paths) * fraction)))
+    for rel_path in changed:
+        file_path = os.path.join(root, rel_path)
+        write_file(file_path, os.path.getsize(file_path), rng)
+    return changed
+
+
+# Point global.json at a fresh cloud folder and write the benchmark profile
+def setup_profile(work_dir, shape, layout):
+    local_save_folder = os.path.join(work_dir, "local")
+    cloud_storage_path = os.path.join(work_dir, "cloud")
+    os.makedirs(local_save_folder, exist_ok=True)
+    os.makedirs(os.path.join(cloud_storage_path, benchmark_profile_id), exist_ok=True)
+    sharesim.simulate_share(cloud_storage_path)
+
+    io_global("write", "config", "cloud_storage_path", cloud_storage_path)
+    io_global("write", "config", "storage_layout", layout)
+    with io_profile_batch(benchmark_profile_id) as batch:
+        batch.write("profile", "name", "Benchmark")
+        batch.write("profile", "local_save_folder", local_save_folder)
+        batch.write("profile", "save_slot", "1")
+        batch.write("profile", "sync_mode", "Sync")
+        batch.write("overrides", "omitted", list(shape["omitted"]))
+    return local_save_folder
+
+
+# Forget everything cached in memory and on disk, as on the first launch after an install
+def drop_caches(keep_hash_cache_file=False):
+    with config_cache_lock:
+        config_cache.clear()
+    hashcache.hash_cache = None
+    if not keep_hash_cache_file and os.path.exists(hashcache.hash_cache_file):
+        os.remove(hashcache.hash_cache_file)
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - started
+    if isinstance(result, str):
+        raise RuntimeError(f"{func.__name__} failed: {result}")
+    return elapsed
+
+
+# The decision check_and_sync_saves makes on launch: open a session and compare both sides, without the dialogs
+def sync_decision():
+    session = SyncSession(benchmark_profile_id).start()
+    SyncEngine(benchmark_profile_id, session).status()
+    session.close()
+
+
+# The share reads scan_cloud_storage makes in the import dialog: list the profile folders, read each profile_info
+def scan_share():
+    cloud_storage_path = io_global("read", "config", "cloud_storage_path")
+    for entry in os.scandir(cloud_storage_path):
+        if entry.is_dir() and not entry.name.startswith("."):
+            io_savetitan("read", entry.name, "profile")
+
+
+def switch_slot(new_save_slot):
+    from components.save_manager import switch_save_slot
+    return switch_save_slot(benchmark_profile_id, new_save_slot, True)
+
+
+# Run every scenario once for one shape in a fresh work folder and return {scenario: {operation: seconds}}
+def run_shape_once(shape, work_dir, scale, seed, layout, include_slots):
+    rng = random.Random(seed + 1)
+    local_save_folder = setup_profile(work_dir, shape, layout)
+    rel_paths = generate_tree(shape, local_save_folder, scale, seed)
+    synced_paths = [rel_path for rel_path in rel_paths if rel_path not in shape["omitted"]]
+    timings = {}
+
+    # cold: empty cloud slot and no caches, the first sync of a new profile and the first download on another computer
+    drop_caches()
+    cold = timings["cold"] = {}
+    cold["decision"] = timed(sync_decision)
+    cold["push"] = timed(copy_save_to_cloud, benchmark_profile_id)
+    shutil.rmtree(local_save_folder)
+    os.makedirs(local_save_folder)
+    drop_caches()
+    cold["pull"] = timed(copy_save_to_local, benchmark_profile_id)
+
+    # warm: both sides in sync and the hash cache on disk, as on a normal launch in a new process
+    drop_caches(keep_hash_cache_file=True)
+    warm = timings["warm"] = {}
+    warm["decision"] = timed(sync_decision)
+    warm["push"] = timed(copy_save_to_cloud, benchmark_profile_id)
+    warm["pull"] = timed(copy_save_to_local, benchmark_profile_id)
+
+    # no-change: in sync with everything already cached in this process
+    no_change = timings["no_change"] = {}
+    no_change["decision"] = timed(sync_decision)
+    no_change["push"] = timed(copy_save_to_cloud, benchmark_profile_id)
+    no_change["pull"] = timed(copy_save_to_local, benchmark_profile_id)
+    no_change["scan"] = timed(scan_share)
+
+    # small-change: a game rewrote a few files, they are pushed, then changed again and restored from the cloud
+    small_change = timings["small_change"] = {}
+    change_files(local_save_folder, synced_paths, small_change_fraction, rng)
+    small_change["decision"] = timed(sync_decision)
+    small_change["push"] = timed(copy_save_to_cloud, benchmark_profile_id)
+    change_files(local_save_folder, synced_paths, small_change_fraction, rng)
+    small_change["pull"] = timed(copy_save_to_local, benchmark_profile_id)
+
+    # slot switch: upload the current save and load another slot, then switch back
+    if include_slots:
+        io_profile("write", benchmark_profile_id, "profile", "save_slot", "2")
+        change_files(local_save_folder, synced_paths, small_change_fraction, rng)
+        copy_save_to_cloud(benchmark_profile_id)
+        slot_switch = timings["slot_switch"] = {}
+        slot_switch["switch"] = timed(switch_slot, "1")
+        slot_switch["switch_back"] = timed(switch_slot, "2")
+
+    return timings
+
+
+def tree_summary(shape, scale):
+    files = 0
+    total_bytes = 0
+    for folder, count, size in shape["groups"]:
+        count = scaled(count, scale)
+        files += count
+        total_bytes += count * scaled(size, scale)
+    return {"files": files, "bytes": total_bytes, "omitted": len(shape["omitted"])}
+
+
+# Run the suite and return the results document. Every shape runs repeat times in its own folder under work_dir and
+# the median of each timing is kept.
+def run_suite(work_dir, shape_names=None, scale=1.0, repeat=3, seed=1, layout="folder", include_slots=True,
+              include_forms=False, report=None):
+    shape_names = shape_names or list(tree_shapes)
+    results = {}
+
+    for shape_name in shape_names:
+        shape = tree_shapes[shape_name]
+        runs = []
+        for run in range(repeat):
+            run_dir = os.path.join(work_dir, f"{shape_name}-{run}")
+            if report:
+                report(f"{shape_name}: run {run + 1}/{repeat}")
+            runs.append(run_shape_once(shape, run_dir, scale, seed, layout, include_slots))
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+        results[shape_name] = {
+            "tree": tree_summary(shape, scale),
+            "timings": {scenario: {operation: statistics.median(run[scenario][operation] for run in runs)
+                                   for operation in runs[0][scenario]}
+                        for scenario in runs[0]},
+        }
+
+    document = {
+        "version": results_version,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "platform": sys.platform,
+        "python": sys.version.split()[0],
+        "scale": scale,
+        "repeat": repeat,
+        "layout": layout,
+        "results": results,
+    }
+
+    if sharesim.simulator is not None:
+        document["share_simulation"] = {"settings": sharesim.simulator.settings, **sharesim.simulator.stats()}
+
+    if include_forms:
+        from modules.forms import benchmark_forms
+        document["forms"] = benchmark_forms()
+    return document
+
+
+# Every timing in a results document as {"shape/scenario/operation": seconds}
+def flatten_timings(document):
+    timings = {}
+    for shape_name, shape_results in document.get("results", {}).items():
+        for scenario, operations in shape_results["timings"].items():
+            for operation, elapsed in operations.items():
+                timings[f"{shape_name}/{scenario}/{operation}"] = elapsed
+    for ui_name, form_timings in document.get("forms", {}).items():
+        for operation, elapsed in form_timings.items():
+            timings[f"forms/{ui_name}/{operation}"] = elapsed
+    return timings
+
+
+# Compare a run against a baseline. Returns rows of (name, baseline, current, ratio, regressed) for every timing
+# both documents have.
+def compare_results(baseline, current, threshold=default_regression_threshold, floor=default_regression_floor):
+    baseline_timings = flatten_timings(baseline)
+    current_timings = flatten_timings(current)
+    rows = []
+    for name in sorted(set(baseline_timings) & set(current_timings)):
+        before = baseline_timings[name]
+        after = current_timings[name]
+        ratio = after / before if before else float("inf")
+        regressed = after > before * (1 + threshold) and after - before > floor
+        rows.append((name, before, after, ratio, regressed))
+    return rows
+
+
+def format_results(document):
+    lines = []
+    for shape_name, shape_results in document["results"].items():
+        tree = shape_results["tree"]
+        lines.append(f"{shape_name}: {tree['files']} files, {tree['bytes'] / (1024 * 1024):.1f} MB, "
+                     f"{tree['omitted']} omitted")
+        for scenario, operations in shape_results["timings"].items():
+            cells = "  ".join(f"{operation:<11} {elapsed * 1000:8.1f} ms" for operation, elapsed in operations.items())
+            lines.append(f"  {scenario:<13} {cells}")
+
+    if document.get("forms"):
+        lines.append("forms: per load, uic.loadUi vs compiled (first load compiles)")
+        for ui_name, form_timings in document["forms"].items():
+            lines.append(f"  {ui_name:<20} loadUi {form_timings['loadUi'] * 1000:6.2f} ms  "
+                         f"compiled {form_timings['compiled'] * 1000:6.2f} ms  "
+                         f"first {form_timings['compiled_first'] * 1000:6.2f} ms")
+    return "\n".join(lines)
+
+
+def format_comparison(rows):
+    name_width = max([len(row[0]) for row in rows] + [len("Timing")])
+    lines = [f"{'Timing':<{name_width}}  {'Baseline ms':>11}  {'Current ms':>10}  {'Ratio':>6}"]
+    for name, before, after, ratio, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        lines.append(f"{name:<{name_width}}  {before * 1000:>11.1f}  {after * 1000:>10.1f}  {ratio:>6.2f}{flag}")
+    return "\n".join(lines)
+
+
+def load_results(results_file):
+    with open(results_file, 'r') as f:
+        return json.load(f)
+
+
+def save_results(results_file, document):
+    os.makedirs(os.path.dirname(os.path.abspath(results_file)), exist_ok=True)
+    with open(results_file, 'w') as f:
+        json.dump(document, f, indent=2)
@@ -0,0 +1,242 @@
+import os
+import json
+import shutil
+import time
+import socket
+import hashlib
+import threading
+
+from pathlib import Path
+
+from modules.snapshot import TreeSnapshot
+
+from modules.transfer import write_json_atomic
+
+chunk_size = 4 * 1024 * 1024
+index_version = 1
+
+
+# Stand-in for os.stat_result so a chunked slot's index can be diffed like a folder on disk
+class IndexStat:
+    def __init__(self, size, mtime_ns):
+        self.st_size = size
+        self.st_mtime_ns = mtime_ns
+        self.st_ino = 0
+
+
+# Every chunked slot under a cloud storage path shares one object directory
+def objects_dir(cloud_storage_path):
+    return os.path.join(cloud_storage_path, ".objects")
+
+
+def object_path(objects_root, chunk_hash):
+    return os.path.join(objects_root, chunk_hash[:2], chunk_hash)
+
+
+# The index replaces the save<N> folder and sits where the folder would be as save<N>.index
+def index_path(cloud_profile_save_path):
+    return f"{os.path.normpath(str(cloud_profile_save_path))}.index"
+
+
+def load_index(cloud_profile_save_path):
+    path = index_path(cloud_profile_save_path)
+    if not os.path.exists(path):
+        return {}, []
+
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}, []
+
+    if data.get("version") != index_version:
+        return {}, []
+    return data.get("files", {}), data.get("dirs", [])
+
+
+# Each writer gets its own temp file, so two computers saving the same slot never publish each other's partial index
+def save_index(cloud_profile_save_path, files, dirs):
+    path = index_path(cloud_profile_save_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_json_atomic(path, {"version": index_version, "layout": "chunked", "files": files, "dirs": dirs})
+
+
+# Build a snapshot of a chunked slot from its index without touching any chunk
+def take_index_snapshot(cloud_profile_save_path, omitted_files=()):
+    omitted_files = set(omitted_files)
+    files, dirs = load_index(cloud_profile_save_path)
+
+    snapshot_files = []
+    for key, entry in files.items():
+        rel_path = str(Path(key))
+        if rel_path not in omitted_files:
+            snapshot_files.append((rel_path, IndexStat(entry["size"], entry["mtime_ns"])))
+
+    snapshot_files.sort(key=lambda item: os.path.normcase(item[0]))
+    return TreeSnapshot(cloud_profile_save_path, snapshot_files, sorted(str(Path(key)) for key in dirs))
+
+
+# Split a file into fixed size chunks and upload only the chunks the object store does not have yet
+def store_file_chunks(objects_root, file_path):
+    file_digest = hashlib.blake2b(digest_size=32)
+    chunks = []
+    bytes_written = 0
+
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            file_digest.update(chunk)
+            chunk_hash = hashlib.blake2b(chunk, digest_size=32).hexdigest()
+            chunks.append(chunk_hash)
+
+            # An existing chunk is touched so a collection running now treats it as new until the index is saved
+            chunk_file = object_path(objects_root, chunk_hash)
+            try:
+                os.utime(chunk_file)
+                continue
+            except FileNotFoundError:
+                pass
+
+            os.makedirs(os.path.dirname(chunk_file), exist_ok=True)
+            temp_file = f"{chunk_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_file, 'wb') as out:
+                out.write(chunk)
+            os.replace(temp_file, chunk_file)
+            bytes_written += len(chunk)
+
+    return file_digest.hexdigest(), chunks, bytes_written
+
+
+# Rebuild a file from its chunks through a temp file, then give it the mtime recorded in the index
+def restore_file_chunks(objects_root, chunks, destination_file, mtime_ns):
+    temp_file = f"{destination_file}.savetitan-tmp"
+    try:
+        with open(temp_file, 'wb') as out:
+            for chunk_hash in chunks:
+                with open(object_path(objects_root, chunk_hash), 'rb') as f:
+                    shutil.copyfileobj(f, out)
+        os.utime(temp_file, ns=(mtime_ns, mtime_ns))
+        os.replace(temp_file, destination_file)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+# Chunks are never deleted when an index stops using them. Another slot, a backup, or an index written by another
+# computer may still need them, and no count kept on the share can be trusted to say otherwise. Unused chunks are
+# collected instead by marking everything any index references and sweeping the rest, at most once per
+# gc_interval_seconds and only for chunks older than gc_grace_seconds, so chunks a push is uploading right now are safe.
+gc_interval_seconds = 24 * 60 * 60
+gc_grace_seconds = 24 * 60 * 60
+# A collection that has held the lock this long is assumed to have crashed
+gc_lock_stale_seconds = 60 * 60
+
+
+def gc_lock_path(objects_root):
+    return os.path.join(objects_root, "gc.lock")
+
+
+def gc_stamp_path(objects_root):
+    return os.path.join(objects_root, "gc.last")
+
+
+# Take the collection lock on the share with an exclusive create, False when another computer holds it
+def acquire_gc_lock(objects_root):
+    path = gc_lock_path(objects_root)
+    os.makedirs(objects_root, exist_ok=True)
+    for attempt in range(2):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if attempt == 0 and time.time() - os.stat(path).st_mtime > gc_lock_stale_seconds:
+                    os.remove(path)
+                    continue
+            except OSError:
+                pass
+            return False
+        with os.fdopen(fd, 'w') as f:
+            json.dump({"host": socket.gethostname(), "pid": os.getpid(), "time": time.time()}, f)
+        return True
+    return False
+
+
+def release_gc_lock(objects_root):
+    try:
+        os.remove(gc_lock_path(objects_root))
+    except FileNotFoundError:
+        pass
+
+
+# Every chunk referenced by a slot or backup index anywhere under the cloud storage path. Raises ValueError when an
+# index can not be read, since sweeping without it could delete chunks it needs.
+def referenced_chunks(cloud_storage_path):
+    objects_root = objects_dir(cloud_storage_path)
+    referenced = set()
+    for root, dirs, files in os.walk(cloud_storage_path):
+        if os.path.normcase(os.path.abspath(root)) == os.path.normcase(os.path.abspath(objects_root)):
+            dirs[:] = []
+            continue
+        for name in files:
+            if not name.endswith(".index"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                raise ValueError(f"Could not read chunk index {path}: {e}")
+            if data.get("version") != index_version:
+                raise ValueError(f"Unknown chunk index version in {path}")
+            for entry in data.get("files", {}).values():
+                referenced.update(entry.get("chunks", []))
+    return referenced
+
+
+# Mark and sweep the object store under the collection lock. Returns the number of chunks removed, None when another
+# computer is collecting.
+def collect_garbage(objects_root):
+    if not acquire_gc_lock(objects_root):
+        return None
+    try:
+        referenced = referenced_chunks(os.path.dirname(os.path.normpath(objects_root)))
+        cutoff = time.time() - gc_grace_seconds
+        removed = 0
+        for prefix in os.scandir(objects_root):
+            if not prefix.is_dir():
+                continue
+            for entry in os.scandir(prefix.path):
+                name = entry.name.split(".", 1)[0]
+                if name in referenced and not entry.name.endswith(".tmp"):
+                    continue
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+
+        with open(gc_stamp_path(objects_root), 'w') as f:
+            f.write(str(time.time()))
+        return removed
+    finally:
+        release_gc_lock(objects_root)
+
+
+# Collect garbage if nobody on the share has done so in the last gc_interval_seconds. Failing to collect only leaves
+# unused chunks behind, so errors are returned rather than raised.
+def collect_garbage_if_due(objects_root):
+    try:
+        if time.time() - os.stat(gc_stamp_path(objects_root)).st_mtime < gc_interval_seconds:
+            return None
+    except FileNotFoundError:
+        if not os.path.isdir(objects_root):
+            return None
+    try:
+        return collect_garbage(objects_root)
+    except (OSError, ValueError) as e:
+        return e
+
+
+# Drop a chunked slot or backup by removing its index, its chunks are left for the next collection
+def release_index(objects_root, cloud_profile_save_path):
+    path = index_path(cloud_profile_save_path)
+    if os.path.exists(path):
+        os.remove(path)
+    collect_garbage_if_due(objects_root)
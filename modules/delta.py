@@ -0,0 +1,56 @@
+import os
+import shutil
+import hashlib
+
+delta_block_size = 1024 * 1024
+default_delta_threshold_mb = 64
+
+
+# Read a file once, returning its content hash and the hash of every fixed size block
+def block_signatures(file_path, block_size=delta_block_size):
+    file_digest = hashlib.blake2b(digest_size=32)
+    blocks = []
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            file_digest.update(block)
+            blocks.append(hashlib.blake2b(block, digest_size=16).hexdigest())
+    return file_digest.hexdigest(), blocks
+
+
+# Copy a file through a temp file next to the destination so a failed copy never leaves a partial save behind
+def atomic_copy(source_file, destination_file):
+    temp_file = f"{destination_file}.savetitan-tmp"
+    try:
+        shutil.copy2(source_file, temp_file)
+        os.replace(temp_file, destination_file)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+# Rewrite only the blocks of the destination whose signature differs from the source, then trim it to the source size
+def patch_changed_blocks(source_file, destination_file, source_blocks, destination_blocks, source_size, block_size):
+    changed_blocks = [index for index, block in enumerate(source_blocks)
+                      if index >= len(destination_blocks) or destination_blocks[index] != block]
+
+    bytes_written = 0
+    with open(source_file, 'rb') as source, open(destination_file, 'r+b') as destination:
+        for index in changed_blocks:
+            source.seek(index * block_size)
+            data = source.read(block_size)
+            destination.seek(index * block_size)
+            destination.write(data)
+            bytes_written += len(data)
+        destination.truncate(source_size)
+
+    shutil.copystat(source_file, destination_file)
+    return bytes_written
+
+
+# Patch the destination in place, falling back to an atomic full copy if anything goes wrong part way through
+def delta_copy(source_file, destination_file, source_blocks, destination_blocks, source_size, block_size=delta_block_size):
+    try:
+        return patch_changed_blocks(source_file, destination_file, source_blocks, destination_blocks, source_size, block_size)
+    except OSError:
+        atomic_copy(source_file, destination_file)
+        return source_size
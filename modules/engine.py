@@ -0,0 +1,167 @@
+import time
+import threading
+
+from datetime import datetime
+
+from modules.io import plan_sync
+from modules.io import copy_save_to_cloud
+from modules.io import copy_save_to_local
+from modules.io import debug_msg
+
+from modules.trace import span
+
+# Outcomes of comparing the local save folder with the cloud save slot
+STATUS_CLOUD_EMPTY = "cloud_empty"
+STATUS_UP_TO_DATE = "up_to_date"
+STATUS_CLOUD_AHEAD = "cloud_ahead"
+STATUS_CONFLICT = "conflict"
+
+
+# Where a profile's saves stand, with the plans that would bring either side up to date
+class SyncStatus:
+    def __init__(self, state, push_plan, pull_plan, diff):
+        self.state = state
+        self.push_plan = push_plan
+        self.pull_plan = pull_plan
+        self.diff = diff
+
+    def local_time(self):
+        if not self.diff.source_newest_mtime_ns:
+            return datetime(1900, 1, 1)
+        return datetime.fromtimestamp(self.diff.source_newest_mtime_ns / 1e9)
+
+    def cloud_time(self):
+        if not self.diff.destination_newest_mtime_ns:
+            return datetime(1900, 1, 1)
+        return datetime.fromtimestamp(self.diff.destination_newest_mtime_ns / 1e9)
+
+    def cloud_is_newer(self):
+        return self.cloud_time() > self.local_time()
+
+
+# What a push or pull did. error is None on success, otherwise the message the copy functions returned. A cancelled
+# sync also has an error, saying how many files were left.
+class SyncResult:
+    def __init__(self, profile_id, direction, files_copied, bytes_copied, files_deleted, error, elapsed, cancelled=False):
+        self.profile_id = profile_id
+        self.direction = direction
+        self.files_copied = files_copied
+        self.bytes_copied = bytes_copied
+        self.files_deleted = files_deleted
+        self.error = error
+        self.elapsed = elapsed
+        self.cancelled = cancelled
+
+    @property
+    def success(self):
+        return self.error is None
+
+    def as_dict(self):
+        return {
+            "profile_id": self.profile_id,
+            "direction": self.direction,
+            "success": self.success,
+            "cancelled": self.cancelled,
+            "error": self.error,
+            "files_copied": self.files_copied,
+            "files_deleted": self.files_deleted,
+            "bytes_copied": self.bytes_copied,
+            "elapsed": self.elapsed,
+        }
+
+
+# Sync logic for one profile with no GUI in it, so it can run from a worker thread, a scheduler or a benchmark.
+#   on_progress(rel_path, size, files_done, files_total, bytes_done, bytes_total) is called after each copied file,
+#   from the transfer worker threads.
+#   on_conflict(status) is called by sync() when both sides changed and returns "push", "pull" or None to skip.
+# request_cancel() can be called from any thread, the running push or pull stops at the next file boundary.
+class SyncEngine:
+    def __init__(self, profile_id, session=None, on_progress=None, on_conflict=None):
+        self.profile_id = profile_id
+        self.session = session
+        self.on_progress = on_progress
+        self.on_conflict = on_conflict
+        self.last_status = None
+        self.cancel_event = threading.Event()
+
+    def request_cancel(self):
+        self.cancel_event.set()
+
+    def cancel_requested(self):
+        return self.cancel_event.is_set()
+
+    def plan(self):
+        return plan_sync(self.profile_id, self.session)
+
+    def status(self):
+        with span("status", profile_id=self.profile_id):
+            push_plan, pull_plan, diff = self.plan()
+
+        if not pull_plan.cloud_snapshot.files and not pull_plan.cloud_snapshot.dirs:
+            state = STATUS_CLOUD_EMPTY
+        elif not diff.added and not diff.changed:
+            state = STATUS_CLOUD_AHEAD if diff.removed else STATUS_UP_TO_DATE
+        else:
+            state = STATUS_CONFLICT
+
+        self.last_status = SyncStatus(state, push_plan, pull_plan, diff)
+        debug_msg(f"Sync status: {state}", profile_id=self.profile_id)
+        return self.last_status
+
+    def push(self, plan=None):
+        return self.run("push", copy_save_to_cloud, plan)
+
+    def pull(self, plan=None):
+        return self.run("pull", copy_save_to_local, plan)
+
+    # Bring both sides in line: pull when only the cloud has extra files, ask on_conflict when both changed
+    def sync(self):
+        status = self.status()
+        if status.state == STATUS_CLOUD_AHEAD:
+            return self.pull(status.pull_plan)
+        if status.state == STATUS_CONFLICT and self.on_conflict is not None:
+            direction = self.on_conflict(status)
+            if direction == "push":
+                return self.push(status.push_plan)
+            if direction == "pull":
+                return self.pull(status.pull_plan)
+        return None
+
+    def run(self, direction, copy_function, plan):
+        if plan is None:
+            status = self.last_status or self.status()
+            plan = status.push_plan if direction == "push" else status.pull_plan
+
+        # Files and bytes are counted as they are copied, since the copy functions plan again if the one passed in
+        # went stale
+        lock = threading.Lock()
+        files_total = len(plan.copies)
+        bytes_total = plan.bytes_to_copy()
+        done = {"files": 0, "bytes": 0}
+
+        def report(rel_path, size):
+            with lock:
+                done["files"] += 1
+                done["bytes"] += size
+                files_done = done["files"]
+                bytes_done = done["bytes"]
+            if self.on_progress is not None:
+                self.on_progress(rel_path, size, files_done, files_total, bytes_done, bytes_total)
+
+        # The copy functions add the sync to profile_info.savetitan's history, after the session's own write lands
+        if self.session is not None:
+            self.session.wait_for_write()
+
+        started = time.monotonic()
+        with span(direction, profile_id=self.profile_id, files=files_total, bytes=bytes_total):
+            error = copy_function(self.profile_id, plan, report, self.cancel_event)
+        elapsed = time.monotonic() - started
+
+        # Deletes are skipped once a sync is cancelled
+        cancelled = self.cancel_event.is_set() and done["files"] < files_total
+        files_deleted = 0 if cancelled else len(plan.deletes)
+
+        debug_msg(f"Sync engine {direction} finished", profile_id=self.profile_id, phase=direction,
+                  bytes=done["bytes"], elapsed=elapsed, cancelled=cancelled)
+        return SyncResult(self.profile_id, direction, done["files"], done["bytes"], files_deleted, error, elapsed,
+                          cancelled)
@@ -0,0 +1,120 @@
+import os
+import io
+import time
+import hashlib
+import importlib.util
+
+from PyQt5 import QtWidgets
+
+from modules.transfer import write_text_atomic
+
+import modules.paths as paths
+
+ui_dir = os.path.join(paths.script_dir, "ui")
+forms_cache_dir = os.path.join(paths.user_config_file, "ui_cache")
+
+# Widget classes built from compiled forms, keyed by .ui path along with the .ui mtime they were compiled from
+form_classes = {}
+
+
+# Compiled forms are named after the .ui file plus a hash of its full path, so copies of SaveTitan in different
+# folders never share a cache entry
+def compiled_form_path(ui_file):
+    name = os.path.splitext(os.path.basename(ui_file))[0]
+    path_hash = hashlib.blake2b(ui_file.encode("utf-8"), digest_size=4).hexdigest()
+    return os.path.join(forms_cache_dir, f"{name}_{path_hash}.py")
+
+
+# Compile a .ui file to Python. pixmaps are resolved to absolute paths next to the .ui file by uic itself.
+# The top level widget class is appended so loading never needs to look at the XML again.
+def compile_form(ui_file, py_file, ui_mtime_ns):
+    # uic and the XML parser take longer to import than a compiled form takes to build, so only load them here
+    import xml.etree.ElementTree as ElementTree
+    from PyQt5 import uic
+
+    root = ElementTree.parse(ui_file).getroot()
+    base_class_name = root.find("widget").get("class")
+    form_class_name = "Ui_" + root.findtext("class")
+
+    source = io.StringIO()
+    uic.compileUi(ui_file, source)
+    source.write(f"\nform_class = {form_class_name}\n")
+    source.write(f"base_class_name = {base_class_name!r}\n")
+    source.write(f"ui_mtime_ns = {ui_mtime_ns}\n")
+
+    os.makedirs(os.path.dirname(py_file), exist_ok=True)
+    write_text_atomic(py_file, source.getvalue(), encoding="utf-8")
+
+
+def import_form_module(py_file):
+    spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(py_file))[0], py_file)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# The widget class for a .ui file, compiling it again only when the .ui file's mtime changed
+def form_class(ui_file):
+    ui_mtime_ns = os.stat(ui_file).st_mtime_ns
+
+    cached = form_classes.get(ui_file)
+    if cached and cached[0] == ui_mtime_ns:
+        return cached[1]
+
+    py_file = compiled_form_path(ui_file)
+    module = None
+    if os.path.exists(py_file):
+        module = import_form_module(py_file)
+        if getattr(module, "ui_mtime_ns", None) != ui_mtime_ns:
+            module = None
+
+    if module is None:
+        compile_form(ui_file, py_file, ui_mtime_ns)
+        module = import_form_module(py_file)
+
+    base_class = getattr(QtWidgets, module.base_class_name)
+    widget_class = type(module.form_class.__name__, (module.form_class, base_class), {})
+    form_classes[ui_file] = (ui_mtime_ns, widget_class)
+    return widget_class
+
+
+# Drop-in replacement for uic.loadUi("ui/<name>"): the same widget with its children as attributes, built from
+# the compiled form. Falls back to parsing the .ui file if the compiled form can't be written or loaded.
+def load_form(ui_name, parent=None):
+    ui_file = os.path.join(ui_dir, ui_name)
+    try:
+        widget_class = form_class(ui_file)
+    except (OSError, SyntaxError, ImportError, AttributeError):
+        from PyQt5 import uic
+        return uic.loadUi(ui_file)
+
+    widget = widget_class(parent)
+    widget.setupUi(widget)
+    return widget
+
+
+# Time building each dialog with uic.loadUi against the compiled form cache, in seconds per load
+def benchmark_forms(repeat=20):
+    from PyQt5 import uic
+
+    results = {}
+    for ui_name in sorted(name for name in os.listdir(ui_dir) if name.endswith(".ui")):
+        ui_file = os.path.join(ui_dir, ui_name)
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            uic.loadUi(ui_file).deleteLater()
+        load_ui_time = (time.perf_counter() - started) / repeat
+
+        form_classes.pop(ui_file, None)
+        started = time.perf_counter()
+        load_form(ui_name).deleteLater()
+        first_load_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            load_form(ui_name).deleteLater()
+        compiled_time = (time.perf_counter() - started) / repeat
+
+        results[ui_name] = {"loadUi": load_ui_time, "compiled_first": first_load_time, "compiled": compiled_time}
+    return results
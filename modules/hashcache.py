@@ -0,0 +1,143 @@
+import os
+import json
+import atexit
+import hashlib
+import threading
+
+from collections import OrderedDict
+
+from modules.transfer import write_json_atomic
+
+from modules.trace import traced
+
+import modules.paths as paths
+user_config_file = paths.user_config_file
+
+hash_cache_file = os.path.join(user_config_file, "hash_cache.json")
+default_max_entries = 50000
+hash_block_size = 1024 * 1024
+
+
+# Calculate the content hash of a file
+def hash_file(file_path):
+    digest = hashlib.blake2b(digest_size=32)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(hash_block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Persistent cache of local file hashes keyed by the file's stat signature (size, mtime_ns, inode)
+class HashCache:
+    def __init__(self, cache_file, max_entries=default_max_entries):
+        self.cache_file = cache_file
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self.lock = threading.Lock()
+        # Syncs of several profiles can finish at once, only one of them writes the cache file at a time
+        self.save_lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        # Entries are stored oldest first so the LRU order survives a round trip
+        for path, entry in data.get("entries", []):
+            self.entries[path] = entry
+        self.evict()
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            entries = list(self.entries.items())
+            self.dirty = False
+
+        with self.save_lock:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            write_json_atomic(self.cache_file, {"entries": entries})
+
+    def evict(self):
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.dirty = True
+
+    # On Windows a stat taken from os.scandir has no inode, so a zero inode on either side only compares size and mtime
+    def signature_matches(self, entry, signature):
+        if entry[:2] != signature[:2]:
+            return False
+        return not entry[2] or not signature[2] or entry[2] == signature[2]
+
+    # Return the hash of a local file, only reading it when its stat signature changed since it was last hashed
+    def get_hash(self, file_path, file_stat=None):
+        if file_stat is None:
+            file_stat = os.stat(file_path)
+        key = os.path.normcase(os.path.abspath(file_path))
+        signature = [file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino]
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and self.signature_matches(entry, signature):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[3]
+            self.misses += 1
+
+        file_hash = hash_file(file_path)
+
+        with self.lock:
+            self.entries[key] = signature + [file_hash]
+            self.entries.move_to_end(key)
+            self.dirty = True
+            self.evict()
+        return file_hash
+
+    # Record a hash that is already known, e.g. the manifest hash of a file that was just copied down
+    def remember(self, file_path, file_hash, file_stat=None):
+        if file_stat is None:
+            file_stat = os.stat(file_path)
+        key = os.path.normcase(os.path.abspath(file_path))
+
+        with self.lock:
+            self.entries[key] = [file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino, file_hash]
+            self.entries.move_to_end(key)
+            self.dirty = True
+            self.evict()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+
+hash_cache = None
+hash_cache_lock = threading.Lock()
+
+
+def get_hash_cache():
+    global hash_cache
+    if hash_cache is None:
+        from modules.io import io_global
+        max_entries = io_global("read", "config", "hash_cache_size") or default_max_entries
+        with hash_cache_lock:
+            if hash_cache is None:
+                hash_cache = HashCache(hash_cache_file, int(max_entries))
+                atexit.register(save_hash_cache)
+    return hash_cache
+
+
+@traced("cache", 0)
+def save_hash_cache():
+    if hash_cache is not None:
+        hash_cache.save()
+
+
+def hash_cache_stats():
+    return get_hash_cache().stats()
@@ -0,0 +1,166 @@
+import os
+import json
+import socket
+
+from datetime import datetime
+
+from modules.transfer import write_json_atomic
+from modules.transfer import write_text_atomic
+
+import modules.paths as paths
+
+history_dir = os.path.join(paths.user_config_file, "history")
+
+# Every sync is kept locally, the file is trimmed back to this many records once it grows past twice that. Records
+# are around 300 bytes, which is used to check the file size before counting lines.
+local_history_kept = 2000
+history_record_size = 300
+# profile_info.savetitan is read on every launch, so it only carries the most recent syncs from all computers
+cloud_history_kept = 50
+
+percentile_points = (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))
+
+
+# One finished sync. bytes_copied counts only files that copied successfully, save_bytes is the size of the synced
+# side, so growth of the save itself shows up separately from how much each sync moved.
+def sync_record(direction, files_scanned, files_copied, files_deleted, bytes_copied, save_bytes, duration, error=None):
+    return {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "host": socket.gethostname(),
+        "direction": direction,
+        "files_scanned": files_scanned,
+        "files_copied": files_copied,
+        "files_deleted": files_deleted,
+        "bytes_copied": bytes_copied,
+        "save_bytes": save_bytes,
+        "duration": round(duration, 4),
+        "mb_per_s": round(bytes_copied / (1024 * 1024) / duration, 3) if duration > 0 and bytes_copied else None,
+        "success": error is None,
+        "error": error,
+    }
+
+
+def history_file(profile_id):
+    return os.path.join(history_dir, f"{profile_id}.jsonl")
+
+
+# Records are appended one JSON line at a time, so recording a sync never rewrites the whole history
+def append_local_history(profile_id, record):
+    path = history_file(profile_id)
+    os.makedirs(history_dir, exist_ok=True)
+    with open(path, 'a') as f:
+        f.write(json.dumps(record) + "\n")
+
+    if os.path.getsize(path) > local_history_kept * 2 * history_record_size:
+        records = load_local_history(profile_id)
+        if len(records) > local_history_kept * 2:
+            write_text_atomic(path, "".join(json.dumps(entry) + "\n" for entry in records[-local_history_kept:]))
+
+
+def load_local_history(profile_id):
+    path = history_file(profile_id)
+    if not os.path.exists(path):
+        return []
+
+    records = []
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+# Add the record to the "history" list in profile_info.savetitan, dropping the oldest past cloud_history_kept
+def append_cloud_history(profile_info_path, record):
+    data = {}
+    if os.path.exists(profile_info_path):
+        with open(profile_info_path, 'r') as f:
+            data = json.load(f)
+
+    history = data.get("history")
+    if not isinstance(history, list):
+        history = []
+    history.append(record)
+    data["history"] = history[-cloud_history_kept:]
+
+    write_json_atomic(profile_info_path, data)
+
+
+def load_cloud_history(profile_info_path):
+    if not os.path.exists(profile_info_path):
+        return []
+    with open(profile_info_path, 'r') as f:
+        history = json.load(f).get("history")
+    return history if isinstance(history, list) else []
+
+
+# Local and cloud history together in time order, each sync once
+def merge_history(*sources):
+    merged = {}
+    for records in sources:
+        for record in records:
+            merged[(record.get("time"), record.get("host"), record.get("direction"))] = record
+    return sorted(merged.values(), key=lambda record: record.get("time") or "")
+
+
+# Linear interpolation between the closest ranks, fraction is 0.5 for the median
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return None
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def summarize(records):
+    durations = [record["duration"] for record in records if record.get("duration") is not None]
+    rates = [record["mb_per_s"] for record in records if record.get("mb_per_s")]
+    save_sizes = [record["save_bytes"] for record in records if record.get("save_bytes") is not None]
+    return {
+        "syncs": len(records),
+        "failed": sum(1 for record in records if not record.get("success", True)),
+        "duration": {name: percentile(durations, fraction) for name, fraction in percentile_points},
+        "mb_per_s": {name: percentile(rates, fraction) for name, fraction in percentile_points},
+        "save_bytes": percentile(save_sizes, 0.5),
+    }
+
+
+# Percentiles per direction over the whole history and per month, so a slowing share or a growing save stands out
+def history_stats(records):
+    stats = {"overall": {}, "by_month": {}}
+    for direction in sorted({record.get("direction") for record in records}):
+        direction_records = [record for record in records if record.get("direction") == direction]
+        stats["overall"][direction] = summarize(direction_records)
+
+        months = {}
+        for record in direction_records:
+            months.setdefault((record.get("time") or "")[:7], []).append(record)
+        stats["by_month"][direction] = {month: summarize(month_records) for month, month_records in sorted(months.items())}
+    return stats
+
+
+def format_number(value, digits=2):
+    return "-" if value is None else f"{value:.{digits}f}"
+
+
+def format_stats(stats):
+    lines = [f"{'Direction':<10} {'Syncs':>6} {'Failed':>6}  {'Duration s p50/p90/p99':>24}  {'MB/s p50/p90/p99':>22}  {'Save MB':>8}"]
+    for direction, summary in stats["overall"].items():
+        durations = "/".join(format_number(summary["duration"][name]) for name, fraction in percentile_points)
+        rates = "/".join(format_number(summary["mb_per_s"][name]) for name, fraction in percentile_points)
+        save_mb = summary["save_bytes"] / (1024 * 1024) if summary["save_bytes"] is not None else None
+        lines.append(f"{direction:<10} {summary['syncs']:>6} {summary['failed']:>6}  {durations:>24}  {rates:>22}  "
+                     f"{format_number(save_mb, 1):>8}")
+
+    lines.append("")
+    lines.append(f"{'Month':<8} {'Direction':<10} {'Syncs':>6}  {'Duration p50':>12}  {'MB/s p50':>9}  {'Save MB':>8}")
+    for direction, months in stats["by_month"].items():
+        for month, summary in months.items():
+            save_mb = summary["save_bytes"] / (1024 * 1024) if summary["save_bytes"] is not None else None
+            lines.append(f"{month:<8} {direction:<10} {summary['syncs']:>6}  {format_number(summary['duration']['p50']):>12}  "
+                         f"{format_number(summary['mb_per_s']['p50']):>9}  {format_number(save_mb, 1):>8}")
+    return "\n".join(lines)
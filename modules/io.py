@@ -1,16 +1,81 @@
 import os
+import sys
+import copy
 import glob
 import string
 import random
 import filecmp
 import shutil
 import json
-import logging
+import time
+import threading
+import functools
 
 from datetime import datetime
 from pathlib import Path
 from filecmp import cmp
-from PyQt5.QtWidgets import QMessageBox
+
+from modules.manifest import load_manifest
+from modules.manifest import save_manifest
+from modules.manifest import manifest_key
+from modules.manifest import manifest_entry
+from modules.manifest import local_file_hash
+from modules.manifest import files_match
+from modules.manifest import valid_manifest_entry
+from modules.manifest import delete_manifest
+
+from modules.hashcache import get_hash_cache
+from modules.hashcache import save_hash_cache
+from modules.hashcache import hash_cache_stats
+from modules.hashcache import hash_file
+
+from modules.transfer import run_parallel
+from modules.transfer import make_parent_dirs
+from modules.transfer import write_json_atomic
+from modules.transfer import transfer_error_message
+from modules.transfer import sync_was_cancelled
+from modules.transfer import SyncCancelled
+from modules.transfer import default_transfer_workers
+
+from modules.snapshot import take_snapshot
+from modules.snapshot import diff_snapshots
+
+from modules.plan import SyncPlan
+
+from modules.chunkstore import objects_dir
+from modules.chunkstore import index_path
+from modules.chunkstore import load_index
+from modules.chunkstore import save_index
+from modules.chunkstore import take_index_snapshot
+from modules.chunkstore import store_file_chunks
+from modules.chunkstore import restore_file_chunks
+from modules.chunkstore import collect_garbage_if_due
+from modules.chunkstore import release_index
+
+from modules.backup import take_backup
+from modules.backup import prune_backups
+from modules.backup import restore_backup
+from modules.backup import list_backups
+from modules.backup import new_backup_name
+from modules.backup import default_backup_retention
+
+from modules.logs import log_event
+
+from modules.profilestore import active_profile_store
+
+from modules.startup import phase as startup_phase
+
+from modules.trace import traced
+
+from modules.history import sync_record
+from modules.history import append_local_history
+from modules.history import append_cloud_history
+
+from modules.delta import block_signatures
+from modules.delta import delta_copy
+from modules.delta import atomic_copy
+from modules.delta import delta_block_size
+from modules.delta import default_delta_threshold_mb
 
 import modules.paths as paths
 script_dir = paths.script_dir
@@ -19,12 +84,9 @@ global_config_file = paths.global_config_file
 game_overrides_config_file = paths.game_overrides_config_file
 python_exe_path = paths.python_exe_path
 
-logger = logging.getLogger('debug_logger')
-logger.setLevel(logging.DEBUG)
-handler = logging.FileHandler('debug.log')
-formatter = logging.Formatter('%(asctime)s - %(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
+# The debug flag is read from global.json at most this often, writes through io_global refresh it at once
+debug_refresh_interval = 5
+debug_state = {"enabled": False, "checked_at": None}
 
 
 # Generate a 6 character string for use for profile_id's
@@ -35,6 +97,22 @@ def generate_id():
     return random_id
 
 
+# Report an error in a message box when the GUI is running, or on stderr for the headless command line.
+# Qt is only imported if something else already loaded it, so headless commands never pay for it. Widgets can only be
+# created on the GUI thread, so a sync running on a worker logs the error and returns it for the GUI to show.
+def show_error(title, message):
+    if "PyQt5.QtWidgets" in sys.modules:
+        from PyQt5.QtWidgets import QApplication, QMessageBox
+        from PyQt5.QtCore import QThread
+        app = QApplication.instance()
+        if app is not None and QThread.currentThread() is app.thread():
+            QMessageBox.critical(None, title, message)
+            return
+        if app is not None:
+            debug_msg(f"{title}: {message}")
+    print(f"{title}: {message}", file=sys.stderr)
+
+
 # Check a function's ability to perform the given action (read, write, execute) on the file/folder path
 def check_permissions(path, file_type, action):
     actions = {
@@ -47,8 +125,8 @@ def check_permissions(path, file_type, action):
         return True
 
     if not os.access(path, actions[action]):
-        QMessageBox.critical(None, "Access Denied",
-                             f"Permission denied to {action} the {file_type}. Please check the file permissions and try again.")
+        show_error("Access Denied",
+                   f"Permission denied to {action} the {file_type}. Please check the file permissions and try again.")
         return False
     return True
 
@@ -58,19 +136,22 @@ def network_share_accessible():
     cloud_storage_path = io_global("read", "config", "cloud_storage_path")
 
     if cloud_storage_path is None:
-        QMessageBox.critical(None, "Cloud Storage Path Not Found", "Cloud storage path is not configured. Please configure it.")
+        show_error("Cloud Storage Path Not Found", "Cloud storage path is not configured. Please configure it.")
         return False
 
     #cloud_storage_path = cloud_storage_path.replace("\\", "\\\\")
 
-    if check_permissions(cloud_storage_path, 'cloud storage', "read"):
+    with startup_phase("share check"):
+        share_readable = check_permissions(cloud_storage_path, 'cloud storage', "read")
+    if share_readable:
         return True
     else:
-        QMessageBox.critical(None, "Network Error",
-                             f"An error occurred while trying to access the network share: Permission denied.")
+        show_error("Network Error",
+                   f"An error occurred while trying to access the network share: Permission denied.")
         return False
 
 
+@traced("config")
 def io_profile(read_write_mode, profile_id=None, section=None, field=None, value=None, modifier=None):
     read_write_mode = str(read_write_mode)
     profile_id = str(profile_id) if profile_id is not None else None
@@ -84,6 +165,10 @@ def io_profile(read_write_mode, profile_id=None, section=None, field=None, value
 
     modifier = str(modifier) if modifier is not None else None
 
+    store = active_profile_store(profile_store_enabled())
+    if store is not None:
+        return io_profile_store(store, read_write_mode, profile_id, section, field, value, modifier)
+
     if read_write_mode == "read":
 
         if profile_id and section and field:
@@ -146,25 +231,7 @@ def io_profile(read_write_mode, profile_id=None, section=None, field=None, value
             with open(json_file, 'r') as f:
                 data = json.load(f)
 
-        if section not in data:
-            data[section] = {}
-
-        current_value = data[section].get(field, "")
-
-        if modifier == "add":
-            if not isinstance(current_value, list):
-                current_value = [current_value] if current_value else []
-            current_value.append(value)
-        elif modifier == "remove":
-            if isinstance(current_value, list):
-                if value in map(str.lower, current_value):
-                    current_value.remove(next(item for item in current_value if item.lower() == value))
-            elif not isinstance(current_value, list) and current_value.lower() == value:
-                current_value = None
-        else:
-            current_value = value if value is not None else ""
-
-        data[section][field] = current_value
+        update_profile_field(data, section, field, value, modifier)
         with open(json_file, "w") as f:
             json.dump(data, f)
 
@@ -181,6 +248,127 @@ def io_profile(read_write_mode, profile_id=None, section=None, field=None, value
             raise FileNotFoundError(f"No profile found with ID: {profile_id}")
 
 
+# Apply one io_profile write (plain value, "add" or "remove" modifier) to a loaded profile document
+def update_profile_field(data, section, field, value, modifier):
+    if section not in data:
+        data[section] = {}
+
+    current_value = data[section].get(field, "")
+
+    if modifier == "add":
+        if not isinstance(current_value, list):
+            current_value = [current_value] if current_value else []
+        current_value.append(value)
+    elif modifier == "remove":
+        if isinstance(current_value, list):
+            if value in map(str.lower, current_value):
+                current_value.remove(next(item for item in current_value if item.lower() == value))
+        elif not isinstance(current_value, list) and current_value.lower() == value:
+            current_value = None
+    else:
+        current_value = value if value is not None else ""
+
+    data[section][field] = current_value
+
+
+# Profiles are kept as one JSON file each unless profile_store is set to "sqlite" in global.json
+def profile_store_enabled():
+    return io_global("read", "config", "profile_store") == "sqlite"
+
+
+# io_profile on top of the SQLite profile store, with the same modes and return values as the JSON files
+def io_profile_store(store, read_write_mode, profile_id, section, field, value, modifier):
+    if read_write_mode == "read":
+        if profile_id and section:
+            data = store.load(profile_id)
+            if data is None:
+                return None
+            if field:
+                return data.get(section, {}).get(field, None)
+            return data.get(section, None)
+
+        elif section and field and value:
+            return store.find(section, field, value)
+
+        elif section:
+            return {file_id: data[section] for file_id, data in store.all_profiles().items() if section in data}
+        else:
+            return store.profile_ids()
+
+    elif read_write_mode == "write":
+        if not profile_id or not section or not field:
+            raise ValueError("For 'write' mode, profile_id, section, and field must be specified.")
+
+        data = store.load(profile_id) or {}
+        update_profile_field(data, section, field, value, modifier)
+        store.save(profile_id, data)
+
+    elif read_write_mode == "delete":
+        if not profile_id:
+            raise ValueError("For 'delete' mode, profile_id must be specified.")
+
+        if not store.delete(profile_id):
+            raise FileNotFoundError(f"No profile found with ID: {profile_id}")
+
+
+# Parsed config documents keyed by path, each stored with the (mtime_ns, size) it was read at
+config_cache = {}
+config_cache_lock = threading.Lock()
+# Held from reading a config file to writing it back, so writes from several threads never drop each other's changes
+config_write_lock = threading.RLock()
+
+# One lock per profile around every read and write of its profile_info.savetitan, for syncs running side by side
+profile_info_locks = {}
+profile_info_locks_lock = threading.Lock()
+
+
+def profile_info_lock(profile_id):
+    with profile_info_locks_lock:
+        return profile_info_locks.setdefault(str(profile_id), threading.RLock())
+
+
+def config_signature(config_file):
+    try:
+        file_stat = os.stat(config_file)
+    except OSError:
+        return None
+    return file_stat.st_mtime_ns, file_stat.st_size
+
+
+# Return the parsed config file, re-reading it only when a stat shows it changed on disk
+def load_config(config_file):
+    signature = config_signature(config_file)
+    if signature is None:
+        # Reported once, not on every read of a config file that was never created
+        with config_cache_lock:
+            cached = config_cache.get(config_file)
+            config_cache[config_file] = (None, {})
+        if not cached or cached[0] is not None:
+            print(f"File {config_file} does not exist. Data is empty.", file=sys.stderr)
+        return {}
+
+    with config_cache_lock:
+        cached = config_cache.get(config_file)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+    with open(config_file, 'r') as f:
+        data = json.load(f)
+
+    with config_cache_lock:
+        config_cache[config_file] = (signature, data)
+    return data
+
+
+# Written to a temporary file and moved into place, so threads reading the config never see half a file
+def store_config(config_file, data):
+    write_json_atomic(config_file, data)
+
+    with config_cache_lock:
+        config_cache[config_file] = (config_signature(config_file), data)
+
+
+@traced("config")
 def io_config(read_write_mode, config_file, section=None, field=None, value=None, modifier=None):
     read_write_mode = str(read_write_mode).lower()
     section = str(section) if section is not None else None
@@ -197,17 +385,13 @@ def io_config(read_write_mode, config_file, section=None, field=None, value=None
 
     modifier = str(modifier).lower() if modifier is not None else None
 
-    data = {}
-    if os.path.exists(config_file):
-        with open(config_file, 'r') as f:
-            data = json.load(f)
-    else:
-        print(f"File {config_file} does not exist. Data is empty.")
+    data = load_config(config_file)
 
     if read_write_mode == "read":
         if not section or not field:
             raise ValueError("For 'read' mode, section and field must be specified.")
-        return data.get(section, {}).get(field, None)
+        # Lists and dicts are copied so callers can't modify the cached document
+        return copy.deepcopy(data.get(section, {}).get(field, None))
 
     elif read_write_mode == "write":
         if not section or not field:
@@ -215,41 +399,46 @@ def io_config(read_write_mode, config_file, section=None, field=None, value=None
 
         os.makedirs(os.path.dirname(config_file), exist_ok=True)
 
-        if section not in data:
-            data[section] = {}
-
-        current_value = data[section].get(field, "")
-
-        if modifier == "add":
-            if not isinstance(current_value, list):
-                current_value = [current_value] if current_value else []
-            if original_value not in current_value:
-                current_value.append(original_value)
-        elif modifier == "remove":
-            if isinstance(current_value, list):
-                if value in map(str.lower, current_value):
-                    current_value.remove(next(item for item in current_value if item.lower() == value))
-            elif not isinstance(current_value, list) and str(current_value).lower() == value:
-                current_value = None
-        else:
-            current_value = value if value is not None else ""
-
-        data[section][field] = current_value
-        with open(config_file, "w") as f:
-            json.dump(data, f)
+        with config_write_lock:
+            data = copy.deepcopy(load_config(config_file))
+            if section not in data:
+                data[section] = {}
+
+            current_value = data[section].get(field, "")
+
+            if modifier == "add":
+                if not isinstance(current_value, list):
+                    current_value = [current_value] if current_value else []
+                if original_value not in current_value:
+                    current_value.append(original_value)
+            elif modifier == "remove":
+                if isinstance(current_value, list):
+                    if value in map(str.lower, current_value):
+                        current_value.remove(next(item for item in current_value if item.lower() == value))
+                elif not isinstance(current_value, list) and str(current_value).lower() == value:
+                    current_value = None
+            else:
+                current_value = value if value is not None else ""
+
+            data[section][field] = current_value
+            store_config(config_file, data)
 
     else:
         raise ValueError("Invalid mode. Expected 'read' or 'write'.")
 
 
 def io_global(read_write_mode, section=None, field=None, value=None, modifier=None):
-    return io_config(read_write_mode, global_config_file, section, field, value, modifier)
+    result = io_config(read_write_mode, global_config_file, section, field, value, modifier)
+    if str(read_write_mode).lower() == "write" and field == "debug":
+        refresh_debug_flag()
+    return result
 
 
 def io_go(read_write_mode, section=None, field=None, value=None, modifier=None):
     return io_config(read_write_mode, game_overrides_config_file, section, field, value, modifier)
 
 
+@traced("config")
 def io_savetitan(read_write_mode, profile_id, section, field=None, write_value=None, modifier=None):
     profile_id = str(profile_id)
     section = str(section)
@@ -266,56 +455,161 @@ def io_savetitan(read_write_mode, profile_id, section, field=None, write_value=N
         
     profile_info_path = os.path.join(cloud_storage_path, profile_id, "profile_info.savetitan")
 
-    data = {}
-    if os.path.exists(profile_info_path):
-        with open(profile_info_path, 'r') as f:
-            data = json.load(f)
-
-    if read_write_mode == "read":
-        if field:
-            return data.get(section, {}).get(field, None)
-        else:
-            return data.get(section, None)
+    # Held for reads too, so a read never sees another thread's write half done
+    with profile_info_lock(profile_id):
+        data = {}
+        if os.path.exists(profile_info_path):
+            with open(profile_info_path, 'r') as f:
+                data = json.load(f)
 
-    elif read_write_mode == "write":
-        if not field:
-            raise ValueError("For write operation, field is required.")
-
-        if section not in data:
-            data[section] = {}
-
-        current_value = data[section].get(field, "")
-
-        if modifier == "add":
-            if not isinstance(current_value, list):
-                current_value = [current_value] if current_value else []
-            current_value.append(write_value)
-        elif modifier == "remove":
-            if isinstance(current_value, list) and write_value in current_value:
-                current_value.remove(write_value)
-            elif not isinstance(current_value, list) and current_value == write_value:
-                current_value = None
-        else:
-            current_value = write_value if write_value is not None else ""
+        if read_write_mode == "read":
+            if field:
+                return data.get(section, {}).get(field, None)
+            else:
+                return data.get(section, None)
 
-        data[section][field] = current_value
+        elif read_write_mode == "write":
+            if not field:
+                raise ValueError("For write operation, field is required.")
 
-        with open(profile_info_path, 'w') as f:
-            json.dump(data, f)
-    
-    elif read_write_mode == "delete":
-        if not field:
-            raise ValueError("For delete operation, field is required.")
+            update_savetitan_field(data, section, field, write_value, modifier)
 
-        if section in data and field in data[section]:
-            del data[section][field]
             with open(profile_info_path, 'w') as f:
                 json.dump(data, f)
+
+        elif read_write_mode == "delete":
+            if not field:
+                raise ValueError("For delete operation, field is required.")
+
+            if section in data and field in data[section]:
+                del data[section][field]
+                with open(profile_info_path, 'w') as f:
+                    json.dump(data, f)
+            else:
+                raise ValueError(f"No such field '{field}' in section '{section}'.")
+
         else:
-            raise ValueError(f"No such field '{field}' in section '{section}'.")
-            
+            raise ValueError("Invalid operation. Expected 'read', 'write' or 'delete'.")
+
+
+# Apply one io_savetitan write (plain value, "add" or "remove" modifier) to a loaded profile_info document
+def update_savetitan_field(data, section, field, write_value, modifier):
+    if section not in data:
+        data[section] = {}
+
+    current_value = data[section].get(field, "")
+
+    if modifier == "add":
+        if not isinstance(current_value, list):
+            current_value = [current_value] if current_value else []
+        current_value.append(write_value)
+    elif modifier == "remove":
+        if isinstance(current_value, list) and write_value in current_value:
+            current_value.remove(write_value)
+        elif not isinstance(current_value, list) and current_value == write_value:
+            current_value = None
     else:
-        raise ValueError("Invalid operation. Expected 'read', 'write' or 'delete'.")
+        current_value = write_value if write_value is not None else ""
+
+    data[section][field] = current_value
+
+
+# Batch of io_profile writes: the profile is loaded once on entry and written once on a clean exit.
+#   with io_profile_batch(profile_id) as batch:
+#       batch.write("profile", "name", profile_name)
+class ProfileBatch:
+    def __init__(self, profile_id):
+        self.profile_id = str(profile_id)
+        self.store = active_profile_store(profile_store_enabled())
+        self.json_file = os.path.join(user_config_file, "profiles", f"{self.profile_id}.json")
+        self.data = {}
+        self.changed = False
+
+    def __enter__(self):
+        if self.store is not None:
+            self.data = self.store.load(self.profile_id) or {}
+        elif os.path.exists(self.json_file):
+            if not check_permissions(self.json_file, "file", "write"):
+                raise PermissionError(f"Write permission denied for the file: {self.json_file}")
+            with open(self.json_file, 'r') as f:
+                self.data = json.load(f)
+        return self
+
+    def read(self, section, field=None):
+        if field is None:
+            return self.data.get(section, None)
+        return self.data.get(section, {}).get(field, None)
+
+    def write(self, section, field, value=None, modifier=None):
+        if isinstance(value, str) and modifier == "remove":
+            value = value.lower()
+        update_profile_field(self.data, str(section), str(field), value, modifier)
+        self.changed = True
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None or not self.changed:
+            return False
+
+        if self.store is not None:
+            self.store.save(self.profile_id, self.data)
+        else:
+            os.makedirs(os.path.dirname(self.json_file), exist_ok=True)
+            write_json_atomic(self.json_file, self.data)
+        return False
+
+
+# Batch of io_savetitan writes, so setting up a profile on the network share is one read and one write
+class SaveTitanBatch:
+    def __init__(self, profile_id):
+        cloud_storage_path = io_global("read", "config", "cloud_storage_path")
+        if cloud_storage_path is None:
+            raise ValueError("Cloud storage path is not defined.")
+
+        self.profile_info_path = os.path.join(cloud_storage_path, str(profile_id), "profile_info.savetitan")
+        self.data = {}
+        self.changed = False
+        self.lock = profile_info_lock(profile_id)
+
+    # The profile's profile_info lock is held for the whole batch
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            if os.path.exists(self.profile_info_path):
+                with open(self.profile_info_path, 'r') as f:
+                    self.data = json.load(f)
+        except BaseException:
+            self.lock.release()
+            raise
+        return self
+
+    def read(self, section, field=None):
+        if field is None:
+            return self.data.get(section, None)
+        return self.data.get(section, {}).get(field, None)
+
+    def write(self, section, field, write_value=None, modifier=None):
+        if write_value is not None:
+            write_value = str(write_value)
+        if modifier is not None:
+            modifier = str(modifier)
+        update_savetitan_field(self.data, str(section), str(field), write_value, modifier)
+        self.changed = True
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None and self.changed:
+                write_json_atomic(self.profile_info_path, self.data)
+        finally:
+            self.lock.release()
+        return False
+
+
+def io_profile_batch(profile_id):
+    return ProfileBatch(profile_id)
+
+
+def io_savetitan_batch(profile_id):
+    return SaveTitanBatch(profile_id)
 
 
 # Checks for file mismatch (Unused currently due to issues)
@@ -360,173 +654,596 @@ def check_folder_mismatch(folder_a, folder_b, profile_id):
     return compare_dirs(comparison)
 
 
+# Number of concurrent workers used for compare, copy and delete operations
+def transfer_workers():
+    workers = io_global("read", "config", "transfer_workers")
+    try:
+        return max(1, int(workers))
+    except (TypeError, ValueError):
+        return default_transfer_workers
+
+
+# Cloud storage layout, "folder" keeps a plain copy per save slot, "chunked" stores slots as indexes into a shared object store
+def storage_layout():
+    return "chunked" if io_global("read", "config", "storage_layout") == "chunked" else "folder"
+
+
+# Raised when a save slot on the share is stored in the other layout from the one this computer is set to use
+class StorageLayoutError(ValueError):
+    pass
+
+
+# The slot itself records its layout on the share: a chunked slot is a save<N>.index file, a folder slot is a save<N>
+# folder with something in it. None for a slot nothing has been synced to yet.
+def slot_layout(cloud_profile_save_path):
+    if os.path.exists(index_path(cloud_profile_save_path)):
+        return "chunked"
+    if os.path.isdir(cloud_profile_save_path):
+        with os.scandir(cloud_profile_save_path) as entries:
+            if any(entries):
+                return "folder"
+    return None
+
+
+# Refuse to sync a slot written in the other layout, it would look empty and a push would replace it
+def check_slot_layout(cloud_profile_save_path, layout):
+    found = slot_layout(cloud_profile_save_path)
+    if found is not None and found != layout:
+        raise StorageLayoutError(f"The cloud save slot {cloud_profile_save_path} is stored in the {found} layout but this "
+                                 f"computer uses the {layout} layout. Set storage_layout in global.json to \"{found}\" "
+                                 f"to sync it.")
+
+
+# Scan both sides of a profile once and build the push and pull plans from the same diff
+@traced("sync", 1)
+def plan_sync(profile_id, session=None):
+    if session is not None:
+        cloud_storage_path = session.cloud_storage_path
+        profile_data = session.profile
+        omitted_files = session.omitted_files
+    else:
+        cloud_storage_path = io_global("read", "config", "cloud_storage_path")
+        profile_data = io_profile("read", profile_id, "profile")
+        omitted_files = io_profile("read", profile_id, "overrides", "omitted") or []
+
+    local_save_folder = profile_data.get("local_save_folder")
+    save_slot = profile_data.get("save_slot")
+
+    cloud_profile_save_path = Path(cloud_storage_path) / profile_id / f"save{save_slot}"
+
+    layout = storage_layout()
+    check_slot_layout(cloud_profile_save_path, layout)
+    objects_root = objects_dir(cloud_storage_path)
+    unchanged_manifest = {}
+
+    # A session hands over the local scan it started at launch, in parallel with reading the share
+    local_snapshot = session.take_local_snapshot() if session is not None else None
+    if local_snapshot is None:
+        with startup_phase("tree scan: local"):
+            local_snapshot = take_snapshot(local_save_folder, omitted_files)
+    with startup_phase("tree scan: cloud"):
+        if layout == "chunked":
+            manifest, dirs = load_index(cloud_profile_save_path)
+            cloud_snapshot = take_index_snapshot(cloud_profile_save_path, omitted_files)
+        else:
+            manifest = load_manifest(cloud_profile_save_path)
+            cloud_snapshot = take_snapshot(cloud_profile_save_path, omitted_files)
+
+    def compare_file(rel_path, local_stat, cloud_stat):
+        if files_match(manifest, rel_path, local_snapshot.path(rel_path), cloud_snapshot.path(rel_path), local_stat, cloud_stat):
+            unchanged_manifest[manifest_key(rel_path)] = manifest[manifest_key(rel_path)]
+            return True
+        return False
+
+    with startup_phase("diff"):
+        diff = diff_snapshots(local_snapshot, cloud_snapshot, compare_file, transfer_workers())
+    for rel_path, error in diff.errors:
+        debug_msg(f"Could not compare {rel_path}, treating it as changed: {error}")
+
+    save_hash_cache()
+    debug_msg(f"Hash cache: {hash_cache_stats()}")
+
+    push_plan = SyncPlan("push", local_snapshot, cloud_snapshot, diff, manifest, unchanged_manifest, omitted_files, layout, objects_root)
+    pull_plan = SyncPlan("pull", local_snapshot, cloud_snapshot, diff, manifest, unchanged_manifest, omitted_files, layout, objects_root)
+    return push_plan, pull_plan, diff
+
+
+# Use the plan computed earlier in this launch if nothing changed since, otherwise plan again
+@traced("sync", 1)
+def current_plan(profile_id, plan, direction):
+    if plan is not None and plan.direction == direction and plan.is_current():
+        debug_msg("Reusing sync plan, files are unchanged since it was made.")
+        return plan
+
+    push_plan, pull_plan, diff = plan_sync(profile_id)
+    return push_plan if direction == "push" else pull_plan
+
+
 # Function to sync saves (Copy local saves to cloud storage)
-def copy_save_to_cloud(profile_id):
-    debug_msg("Starting cloud sync...")
-    cloud_storage_path = io_global("read", "config", "cloud_storage_path")
+@traced("sync", 1)
+def copy_save_to_cloud(profile_id, plan=None, progress=None, cancel=None):
+    started = time.monotonic()
+    debug_msg("Starting cloud sync...", profile_id=profile_id, phase="push")
 
     profile_data = io_profile("read", profile_id, "profile")
     local_save_folder = profile_data.get("local_save_folder")
     save_slot = profile_data.get("save_slot")
     
-    omitted_files = io_profile("read", profile_id, "overrides", "omitted") or []
+    overrides = io_profile("read", profile_id, "overrides") or {}
+    delta_enabled = overrides.get("delta_transfer") == "enable"
+    delta_threshold = int(overrides.get("delta_threshold_mb") or default_delta_threshold_mb) * 1024 * 1024
 
     debug_msg(f"Local save folder: {local_save_folder}, Save slot: {save_slot}")
 
-    cloud_profile_save_path = Path(cloud_storage_path) / profile_id / f"save{save_slot}"
-
     if not network_share_accessible():
         return "Cloud path is inaccessible"
 
-    debug_msg("Cloud path is accessible. Making backup copy...")
-    #make_backup_copy(profile_id, "cloud_backup")
+    plan = current_plan(profile_id, plan, "push")
+    debug_msg(f"Sync plan: {plan.summary()}")
+
+    if not plan.is_empty():
+        debug_msg("Cloud path is accessible. Making backup copy...")
+        make_backup_copy(profile_id, "cloud_backup")
+
+    workers = transfer_workers()
+    if plan.layout == "chunked":
+        errors, bytes_copied = push_chunked_plan(plan, workers, progress, cancel)
+        return finish_sync(profile_id, errors, "cloud", plan, started, bytes_copied)
+
+    manifest = plan.manifest
+    synced_manifest = plan.synced_manifest
+    local_snapshot = plan.local_snapshot
+    cloud_snapshot = plan.cloud_snapshot
+    cloud_profile_save_path = cloud_snapshot.root
+
+    def copy_file(rel_path):
+        local_file = local_snapshot.path(rel_path)
+        cloud_file = cloud_snapshot.path(rel_path)
+        local_stat = local_snapshot.stats[rel_path]
+        cloud_stat = cloud_snapshot.stats.get(rel_path)
+
+        if delta_enabled and local_stat.st_size >= delta_threshold:
+            file_hash, blocks = block_signatures(local_file)
+            entry = valid_manifest_entry(manifest, rel_path, cloud_stat) if cloud_stat else None
+
+            if entry and entry.get("blocks") is not None and entry.get("block_size") == delta_block_size:
+                bytes_written = delta_copy(local_file, cloud_file, blocks, entry["blocks"], local_stat.st_size)
+                debug_msg("Patched changed blocks", profile_id=profile_id, phase="push", path=rel_path, bytes=bytes_written)
+            else:
+                shutil.copy2(local_file, cloud_file)
+                bytes_written = local_stat.st_size
+                debug_msg("Copied file", profile_id=profile_id, phase="push", path=rel_path, bytes=local_stat.st_size)
 
-    for root, dirs, files in os.walk(local_save_folder):
-        for file in files:
-            local_file = os.path.join(root, file)
-            rel_path = os.path.relpath(local_file, local_save_folder)
-            cloud_file = os.path.join(cloud_profile_save_path, rel_path)
+            synced_manifest[manifest_key(rel_path)] = manifest_entry(os.stat(cloud_file), file_hash, blocks, delta_block_size)
+            get_hash_cache().remember(local_file, file_hash, local_stat)
+            return bytes_written
 
-            if rel_path in omitted_files:
-                debug_msg(f"Skipping file because it's omitted: {local_file}")
-                continue
+        shutil.copy2(local_file, cloud_file)
+        debug_msg("Copied file", profile_id=profile_id, phase="push", path=rel_path, bytes=local_stat.st_size)
+        synced_manifest[manifest_key(rel_path)] = manifest_entry(os.stat(cloud_file), local_file_hash(local_file, local_stat))
+        return local_stat.st_size
 
-            if not os.path.exists(cloud_file) or not filecmp.cmp(local_file, cloud_file, shallow=False):
-                debug_msg(f"Copying or overwriting file: {local_file} to {cloud_file}")
-                os.makedirs(os.path.dirname(cloud_file), exist_ok=True)
-                shutil.copy2(local_file, cloud_file)
+    def delete_file(cloud_file):
+        debug_msg(f"Deleting file: {cloud_file}")
+        os.remove(cloud_file)
 
-    for root, dirs, files in os.walk(cloud_profile_save_path, topdown=False):
-        for name in files:
-            cloud_file = os.path.join(root, name)
-            rel_path = os.path.relpath(cloud_file, cloud_profile_save_path)
-            local_file = os.path.join(local_save_folder, rel_path)
+    make_parent_dirs([cloud_snapshot.path(rel_path) for rel_path in plan.copies])
+    copied, errors = run_parallel(with_progress(copy_file, plan, progress, cancel), plan.copies, workers)
 
-            if not os.path.exists(local_file):
-                debug_msg(f"Deleting file: {cloud_file}")
-                os.remove(cloud_file)
+    # A cancelled sync stops before deleting anything, the cloud copy of those files is left as it was
+    if sync_was_cancelled(errors):
+        keep_unreached_entries(manifest, synced_manifest, cancelled_files(errors) + list(plan.deletes))
+        save_manifest(cloud_profile_save_path, synced_manifest)
+        return finish_sync(profile_id, errors, "cloud", plan, started, sum(copied))
 
-        for name in dirs:
-            cloud_dir = os.path.join(root, name)
-            rel_path = os.path.relpath(cloud_dir, cloud_profile_save_path)
-            local_dir = os.path.join(local_save_folder, rel_path)
+    errors += apply_case_renames(plan, errors)
+    _, delete_errors = run_parallel(delete_file, [cloud_snapshot.path(rel_path) for rel_path in plan.deletes], workers)
+    errors += delete_errors
 
-            if not os.path.exists(local_dir):
-                debug_msg(f"Deleting directory: {cloud_dir}")
-                shutil.rmtree(cloud_dir)
+    for rel_dir in plan.delete_dirs:
+        cloud_dir = cloud_snapshot.path(rel_dir)
+        if os.path.exists(cloud_dir):
+            debug_msg(f"Deleting directory: {cloud_dir}")
+            shutil.rmtree(cloud_dir)
 
-    debug_msg(f"Sync for Profile ID: {profile_id} to cloud completed successfully.")
-    return
+    save_manifest(cloud_profile_save_path, synced_manifest)
+    return finish_sync(profile_id, errors, "cloud", plan, started, sum(copied))
 
 
 # Function to sync saves (Copy cloud saves to local storage)
-def copy_save_to_local(profile_id):
-    debug_msg("Starting local sync...")
-    cloud_storage_path = io_global("read", "config", "cloud_storage_path")
+@traced("sync", 1)
+def copy_save_to_local(profile_id, plan=None, progress=None, cancel=None):
+    started = time.monotonic()
+    debug_msg("Starting local sync...", profile_id=profile_id, phase="pull")
 
     profile_data = io_profile("read", profile_id, "profile")
     local_save_folder = profile_data.get("local_save_folder")
     save_slot = profile_data.get("save_slot")
     
-    omitted_files = io_profile("read", profile_id, "overrides", "omitted") or []
+    overrides = io_profile("read", profile_id, "overrides") or {}
+    delta_enabled = overrides.get("delta_transfer") == "enable"
+    delta_threshold = int(overrides.get("delta_threshold_mb") or default_delta_threshold_mb) * 1024 * 1024
 
     debug_msg(f"Local save folder: {local_save_folder}, Save slot: {save_slot}")
 
-    cloud_profile_save_path = Path(cloud_storage_path) / profile_id / f"save{save_slot}"
-
     if not network_share_accessible():
         return "Cloud path is inaccessible"
 
-    debug_msg("Cloud path is accessible. Making backup copy...")
-    #make_backup_copy(profile_id, "local_backup")
+    plan = current_plan(profile_id, plan, "pull")
+    debug_msg(f"Sync plan: {plan.summary()}")
+
+    if not plan.is_empty():
+        debug_msg("Cloud path is accessible. Making backup copy...")
+        make_backup_copy(profile_id, "local_backup")
+
+    workers = transfer_workers()
+    if plan.layout == "chunked":
+        errors, bytes_copied = pull_chunked_plan(plan, workers, progress, cancel)
+        return finish_sync(profile_id, errors, "local", plan, started, bytes_copied)
+
+    manifest = plan.manifest
+    synced_manifest = plan.synced_manifest
+    local_snapshot = plan.local_snapshot
+    cloud_snapshot = plan.cloud_snapshot
+    cloud_profile_save_path = cloud_snapshot.root
+
+    def copy_file(rel_path):
+        local_file = local_snapshot.path(rel_path)
+        cloud_file = cloud_snapshot.path(rel_path)
+        cloud_stat = cloud_snapshot.stats[rel_path]
+
+        entry = valid_manifest_entry(manifest, rel_path, cloud_stat)
+        use_delta = delta_enabled and cloud_stat.st_size >= delta_threshold
+
+        if use_delta and entry and entry.get("blocks") is not None and entry.get("block_size") == delta_block_size and os.path.exists(local_file):
+            local_hash, local_blocks = block_signatures(local_file)
+            bytes_written = delta_copy(cloud_file, local_file, entry["blocks"], local_blocks, cloud_stat.st_size)
+            debug_msg("Patched changed blocks", profile_id=profile_id, phase="pull", path=rel_path, bytes=bytes_written)
+
+            # The local side is cheap to re-read, so verify the patched file and fall back to a full copy on mismatch
+            if hash_file(local_file) != entry["hash"]:
+                debug_msg(f"Patched file does not match the cloud hash, copying in full: {local_file}")
+                atomic_copy(cloud_file, local_file)
+                bytes_written += cloud_stat.st_size
+        else:
+            shutil.copy2(cloud_file, local_file)
+            bytes_written = cloud_stat.st_size
+            debug_msg("Copied file", profile_id=profile_id, phase="pull", path=rel_path, bytes=cloud_stat.st_size)
+
+        if entry:
+            synced_manifest[manifest_key(rel_path)] = entry
+            get_hash_cache().remember(local_file, entry["hash"])
+        elif use_delta:
+            file_hash, blocks = block_signatures(local_file)
+            synced_manifest[manifest_key(rel_path)] = manifest_entry(cloud_stat, file_hash, blocks, delta_block_size)
+            get_hash_cache().remember(local_file, file_hash)
+        else:
+            synced_manifest[manifest_key(rel_path)] = manifest_entry(cloud_stat, local_file_hash(local_file))
+        return bytes_written
+
+    def delete_file(local_file):
+        debug_msg(f"Deleting file: {local_file}")
+        os.remove(local_file)
 
-    for root, dirs, files in os.walk(cloud_profile_save_path):
-        for file in files:
-            cloud_file = os.path.join(root, file)
-            rel_path = os.path.relpath(cloud_file, cloud_profile_save_path)
-            local_file = os.path.join(local_save_folder, rel_path)
+    make_parent_dirs([local_snapshot.path(rel_path) for rel_path in plan.copies])
+    copied, errors = run_parallel(with_progress(copy_file, plan, progress, cancel), plan.copies, workers)
 
-            if rel_path in omitted_files:
-                debug_msg(f"Skipping file because it's omitted: {cloud_file}")
-                continue
+    if sync_was_cancelled(errors):
+        keep_unreached_entries(manifest, synced_manifest, cancelled_files(errors))
+    else:
+        errors += apply_case_renames(plan, errors)
+        _, delete_errors = run_parallel(delete_file, [local_snapshot.path(rel_path) for rel_path in plan.deletes], workers)
+        errors += delete_errors
 
-            if not os.path.exists(local_file) or not filecmp.cmp(local_file, cloud_file, shallow=False):
-                debug_msg(f"Copying or overwriting file: {cloud_file} to {local_file}")
-                os.makedirs(os.path.dirname(local_file), exist_ok=True)
-                shutil.copy2(cloud_file, local_file)
+        for rel_dir in plan.delete_dirs:
+            local_dir = local_snapshot.path(rel_dir)
+            if os.path.exists(local_dir):
+                debug_msg(f"Deleting directory: {local_dir}")
+                shutil.rmtree(local_dir)
 
-    for root, dirs, files in os.walk(local_save_folder, topdown=False):
-        for name in files:
-            local_file = os.path.join(root, name)
-            rel_path = os.path.relpath(local_file, local_save_folder)
-            cloud_file = os.path.join(cloud_profile_save_path, rel_path)
+    if synced_manifest != manifest:
+        save_manifest(cloud_profile_save_path, synced_manifest)
+    return finish_sync(profile_id, errors, "local", plan, started, sum(copied))
 
-            if not os.path.exists(cloud_file):
-                debug_msg(f"Deleting file: {local_file}")
-                os.remove(local_file)
 
-        for name in dirs:
-            local_dir = os.path.join(root, name)
-            rel_path = os.path.relpath(local_dir, local_save_folder)
-            cloud_dir = os.path.join(cloud_profile_save_path, rel_path)
+# Upload the changed files of a chunked slot as chunks and write its new index. Returns the errors and the bytes of new
+# chunks written, chunks the share already held are not uploaded again.
+@traced("sync", 0)
+def push_chunked_plan(plan, workers, progress=None, cancel=None):
+    local_snapshot = plan.local_snapshot
+    old_files = plan.manifest
+    new_files = dict(plan.synced_manifest)
 
-            if not os.path.exists(cloud_dir):
-                debug_msg(f"Deleting directory: {local_dir}")
-                shutil.rmtree(local_dir)
+    # Omitted files are not part of the sync, so whatever the index already holds for them is kept
+    for key, entry in old_files.items():
+        if str(Path(key)) in plan.omitted_files:
+            new_files[key] = entry
+
+    def store_file(rel_path):
+        local_file = local_snapshot.path(rel_path)
+        local_stat = local_snapshot.stats[rel_path]
+
+        file_hash, chunks, bytes_written = store_file_chunks(plan.objects_root, local_file)
+        debug_msg(f"Stored {local_file} as {len(chunks)} chunk(s), {bytes_written} new bytes")
+
+        entry = manifest_entry(local_stat, file_hash)
+        entry["chunks"] = chunks
+        new_files[manifest_key(rel_path)] = entry
+        get_hash_cache().remember(local_file, file_hash, local_stat)
+        return bytes_written
+
+    stored, errors = run_parallel(with_progress(store_file, plan, progress, cancel), plan.copies, workers)
+
+    # A file that failed to upload keeps its previous entry so its chunks stay referenced
+    for rel_path, error in errors:
+        if manifest_key(rel_path) in old_files:
+            new_files[manifest_key(rel_path)] = old_files[manifest_key(rel_path)]
 
-    debug_msg(f"Sync for Profile ID: {profile_id} to local completed successfully.")
+    for rel_path in plan.deletes:
+        if sync_was_cancelled(errors) and manifest_key(rel_path) in old_files:
+            new_files[manifest_key(rel_path)] = old_files[manifest_key(rel_path)]
+        else:
+            debug_msg(f"Removing from index: {rel_path}")
+
+    save_index(plan.cloud_snapshot.root, new_files, [manifest_key(rel_dir) for rel_dir in local_snapshot.dirs])
+    collect_chunk_garbage(plan.objects_root)
+    return errors, sum(stored)
+
+
+# Sweep chunks no index references any more, if no computer on the share has done so recently
+def collect_chunk_garbage(objects_root):
+    result = collect_garbage_if_due(objects_root)
+    if isinstance(result, Exception):
+        debug_msg(f"Could not collect unused chunks: {result}")
+    elif result:
+        debug_msg(f"Removed {result} unused chunk(s)")
+
+
+# Rebuild the changed files of a chunked slot from the object store. Returns the errors and the bytes read from it.
+@traced("sync", 0)
+def pull_chunked_plan(plan, workers, progress=None, cancel=None):
+    local_snapshot = plan.local_snapshot
+
+    def restore_file(rel_path):
+        entry = plan.manifest[manifest_key(rel_path)]
+        local_file = local_snapshot.path(rel_path)
+
+        debug_msg(f"Restoring file from {len(entry['chunks'])} chunk(s): {local_file}")
+        restore_file_chunks(plan.objects_root, entry["chunks"], local_file, entry["mtime_ns"])
+        get_hash_cache().remember(local_file, entry["hash"])
+        return entry["size"]
+
+    def delete_file(local_file):
+        debug_msg(f"Deleting file: {local_file}")
+        os.remove(local_file)
+
+    make_parent_dirs([local_snapshot.path(rel_path) for rel_path in plan.copies])
+    restored, errors = run_parallel(with_progress(restore_file, plan, progress, cancel), plan.copies, workers)
+    if sync_was_cancelled(errors):
+        return errors, sum(restored)
+
+    errors += apply_case_renames(plan, errors)
+    _, delete_errors = run_parallel(delete_file, [local_snapshot.path(rel_path) for rel_path in plan.deletes], workers)
+    errors += delete_errors
+
+    for rel_dir in plan.delete_dirs:
+        local_dir = local_snapshot.path(rel_dir)
+        if os.path.exists(local_dir):
+            debug_msg(f"Deleting directory: {local_dir}")
+            shutil.rmtree(local_dir)
+
+    return errors, sum(restored)
+
+
+# Wrap a per-file copy function so progress(rel_path, size) is called after each file is copied. The copy functions
+# run on the worker pool, so progress is called from worker threads. Once the cancel event is set, files not yet
+# started fail with SyncCancelled instead, files already being copied are finished.
+def with_progress(copy_file, plan, progress, cancel=None):
+    if progress is None and cancel is None:
+        return copy_file
+
+    @functools.wraps(copy_file)
+    def copy_and_report(rel_path):
+        if cancel is not None and cancel.is_set():
+            raise SyncCancelled(f"Sync cancelled before copying {rel_path}")
+        result = copy_file(rel_path)
+        if progress is not None:
+            progress(rel_path, plan.source.stats[rel_path].st_size)
+        return result
+
+    return copy_and_report
+
+
+# Settle the files a plan saw renamed by case alone, once their copies are done. Where the old and new name are the
+# same file the copy went into it, so it is renamed to the new case; anywhere else the old file is deleted. A pair
+# whose copy failed is left alone so the old file is kept.
+def apply_case_renames(plan, errors):
+    failed = {str(item) for item, error in errors}
+    rename_errors = []
+    for old_rel_path, new_rel_path in plan.case_renames:
+        if new_rel_path in failed:
+            continue
+        old_path = plan.destination.path(old_rel_path)
+        new_path = plan.destination.path(new_rel_path)
+        try:
+            if os.path.exists(new_path) and os.path.samefile(old_path, new_path):
+                debug_msg(f"Renaming {old_path} to {new_path}")
+                os.rename(old_path, new_path)
+            else:
+                debug_msg(f"Deleting file: {old_path}")
+                os.remove(old_path)
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            rename_errors.append((old_rel_path, e))
+    return rename_errors
+
+
+def cancelled_files(errors):
+    return [item for item, error in errors if isinstance(error, SyncCancelled)]
+
+
+# Files a cancelled sync never reached are unchanged in the cloud, so what the manifest knew about them still holds
+def keep_unreached_entries(manifest, synced_manifest, rel_paths):
+    for rel_path in rel_paths:
+        key = manifest_key(rel_path)
+        if key in manifest and key not in synced_manifest:
+            synced_manifest[key] = manifest[key]
+
+
+# Log the outcome of a sync and turn the collected errors into the copy functions' return value
+def finish_sync(profile_id, errors, destination, plan, started, bytes_copied):
+    save_hash_cache()
+
+    debug_msg(f"Hash cache: {hash_cache_stats()}")
+
+    error_message = transfer_error_message(errors)
+    record_sync_history(profile_id, plan, errors, bytes_copied, time.monotonic() - started, error_message)
+
+    if errors:
+        for item, error in errors:
+            debug_msg(f"Failed to sync {item}: {error}")
+        return error_message
+
+    debug_msg(f"Sync for Profile ID: {profile_id} to {destination} completed successfully.", profile_id=profile_id,
+              phase=plan.direction, bytes=bytes_copied, elapsed=time.monotonic() - started)
     return
 
 
-# Perform backup function prior to sync
-def make_backup_copy(profile_id, which_side):
-    debug_msg("Starting backup process...")
+# Append the outcome of a sync to the local history and to profile_info.savetitan. bytes_copied is what the sync
+# actually moved: changed blocks for a delta copy, new chunks for a chunked push. Failing to record a sync is logged and
+# never fails the sync itself.
+def record_sync_history(profile_id, plan, errors, bytes_copied, duration, error_message):
+    failed = {str(item) for item, error in errors}
+    copied = [rel_path for rel_path in plan.copies if str(rel_path) not in failed]
+    failed_deletes = len(errors) - (len(plan.copies) - len(copied))
+
+    record = sync_record(plan.direction, len(plan.source.files), len(copied), max(0, len(plan.deletes) - failed_deletes),
+                         bytes_copied, plan.source.total_bytes(),
+                         duration, error_message)
+
+    try:
+        append_local_history(profile_id, record)
+    except OSError as e:
+        debug_msg(f"Could not record sync history locally: {e}", profile_id=profile_id)
+
+    cloud_storage_path = io_global("read", "config", "cloud_storage_path")
+    if not cloud_storage_path or not os.path.isdir(os.path.join(cloud_storage_path, profile_id)):
+        return
+    try:
+        with profile_info_lock(profile_id):
+            append_cloud_history(os.path.join(cloud_storage_path, profile_id, "profile_info.savetitan"), record)
+    except (OSError, ValueError) as e:
+        debug_msg(f"Could not record sync history in profile_info.savetitan: {e}", profile_id=profile_id)
+
+
+# Number of point-in-time backups kept per save slot, 0 turns backups off
+def backup_retention():
+    retention = io_global("read", "config", "backup_retention")
+    try:
+        return max(0, int(retention))
+    except (TypeError, ValueError):
+        return default_backup_retention
+
+
+# Where the backups for one side of a profile live, cloud backups sit next to the slot as save<N>.backups
+def backup_location(profile_id, which_side):
+    if which_side not in ["local_backup", "cloud_backup"]:
+        raise Exception("Invalid which_side argument")
+
+    if which_side == "local_backup":
+        local_save_folder = io_profile("read", profile_id, "profile", "local_save_folder")
+        return local_save_folder, os.path.join(user_config_file, "backups", profile_id)
+
     cloud_storage_path = io_global("read", "config", "cloud_storage_path")
     save_slot = io_profile("read", profile_id, "profile", "save_slot")
     cloud_profile_folder_save = os.path.join(cloud_storage_path, profile_id, f"save{save_slot}")
-    cloud_profile_folder_save_bak = f"{cloud_profile_folder_save}.bak"
+    return cloud_profile_folder_save, f"{cloud_profile_folder_save}.backups"
 
-    if which_side not in ["local_backup", "cloud_backup"]:
-        raise Exception("Invalid which_side argument")
 
-    if os.path.exists(cloud_profile_folder_save_bak):
-        debug_msg(f"Deleting existing backup: {cloud_profile_folder_save_bak}")
-        shutil.rmtree(cloud_profile_folder_save_bak)
+# Back up one side of a profile as it is now. Returns the backup name, or None when that side has no files.
+def take_backup_copy(profile_id, which_side):
+    source_root, backups_root = backup_location(profile_id, which_side)
 
-    os.makedirs(cloud_profile_folder_save_bak, exist_ok=True)
+    # A chunked slot is backed up by keeping a copy of its index, which keeps its chunks from being collected
+    if which_side == "cloud_backup" and storage_layout() == "chunked":
+        files, dirs = load_index(source_root)
+        if not files:
+            return None
+        name = new_backup_name()
+        save_index(os.path.join(backups_root, name), files, dirs)
+        debug_msg(f"Backup {name} created from the slot index.")
+        return name
+
+    backup = take_backup(source_root, backups_root)
+    if backup is None:
+        return None
+    name, linked, copied = backup
+    debug_msg(f"Backup {name} created: {copied} file(s) copied, {linked} file(s) hard linked.")
+    return name
+
+
+# Perform backup function prior to sync
+@traced("backup", 2)
+def make_backup_copy(profile_id, which_side):
+    retention = backup_retention()
+    if retention == 0:
+        return
+
+    debug_msg("Starting backup process...")
+    source_root, backups_root = backup_location(profile_id, which_side)
+    cloud_storage_path = io_global("read", "config", "cloud_storage_path")
+    objects_root = objects_dir(cloud_storage_path)
+
+    if take_backup_copy(profile_id, which_side) is None:
+        debug_msg("Nothing to back up, the save is empty.")
+        return
+
+    removed = prune_backups(backups_root, retention, lambda backup_path: release_index(objects_root, backup_path))
+    for name in removed:
+        debug_msg(f"Deleting old backup: {name}")
 
-    if which_side == "local_backup":
-        local_save_folder = io_profile("read", profile_id, "profile", "local_save_folder")
-        debug_msg("Performing local backup...")
-        for root, dirs, files in os.walk(local_save_folder):
-            rel_path = os.path.relpath(root, local_save_folder)
-            backup_path = os.path.join(cloud_profile_folder_save_bak, rel_path)
-
-            for file in files:
-                local_file = os.path.join(root, file)
-                backup_file = os.path.join(backup_path, file)
-
-                debug_msg(f"Copying file: {local_file} to {backup_file}")
-                os.makedirs(backup_path, exist_ok=True)
-                shutil.copy2(local_file, backup_file)
-
-    elif which_side == "cloud_backup":
-        debug_msg("Performing cloud backup...")
-        for root, dirs, files in os.walk(cloud_profile_folder_save):
-            rel_path = os.path.relpath(root, cloud_profile_folder_save)
-            backup_path = os.path.join(cloud_profile_folder_save_bak, rel_path)
-
-            for file in files:
-                cloud_file = os.path.join(root, file)
-                backup_file = os.path.join(backup_path, file)
-
-                debug_msg(f"Copying file: {cloud_file} to {backup_file}")
-                os.makedirs(backup_path, exist_ok=True)
-                shutil.copy2(cloud_file, backup_file)
-    
     debug_msg("Backup process completed.")
 
 
+def list_backup_copies(profile_id, which_side):
+    source_root, backups_root = backup_location(profile_id, which_side)
+    return list_backups(backups_root)
+
+
+# Put a backup back in place of the current save, the latest backup is used when no name is given
+def restore_backup_copy(profile_id, which_side, backup_name=None):
+    source_root, backups_root = backup_location(profile_id, which_side)
+
+    backups = list_backups(backups_root)
+    if not backups:
+        return "No backups found"
+    if backup_name is None:
+        backup_name = backups[-1]
+    elif backup_name not in backups:
+        return f"Backup {backup_name} not found"
+
+    backup_path = os.path.join(backups_root, backup_name)
+
+    # The save being replaced is backed up first, whatever the retention, so a restore can always be undone
+    current_backup = take_backup_copy(profile_id, which_side)
+    if current_backup is not None:
+        debug_msg(f"Backed up the current save as {current_backup} before restoring")
+
+    debug_msg(f"Restoring backup {backup_path} to {source_root}")
+
+    if os.path.isdir(backup_path):
+        restore_backup(backup_path, source_root)
+        if which_side == "cloud_backup":
+            delete_manifest(source_root)
+    else:
+        files, dirs = load_index(backup_path)
+        save_index(source_root, files, dirs)
+
+    debug_msg("Backup restored.")
+    return
+
+
 def send_notification(message):
     import sys
     if sys.platform == "win32":
@@ -542,6 +1259,21 @@ def send_notification(message):
         notification.show()
 
 
-def debug_msg(message):
-    if io_global("read", "config", "debug") == "enable":
-        logger.debug(message)
\ No newline at end of file
+def refresh_debug_flag():
+    debug_state["enabled"] = io_global("read", "config", "debug") == "enable"
+    debug_state["checked_at"] = time.monotonic()
+
+
+def debug_enabled():
+    checked_at = debug_state["checked_at"]
+    if checked_at is None or time.monotonic() - checked_at > debug_refresh_interval:
+        refresh_debug_flag()
+    return debug_state["enabled"]
+
+
+# Log a message with optional structured fields (profile_id, phase, path, bytes, elapsed). Returns before doing any
+# work when debug is off.
+def debug_msg(message, **fields):
+    if not debug_enabled():
+        return
+    log_event(message, **fields)
\ No newline at end of file
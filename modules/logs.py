@@ -0,0 +1,105 @@
+import os
+import queue
+import atexit
+import logging
+import threading
+
+from datetime import datetime
+
+import modules.paths as paths
+
+log_dir = os.path.join(paths.user_config_file, "logs")
+log_max_bytes = 5 * 1024 * 1024
+log_backup_count = 2
+log_runs_kept = 10
+
+# Extra fields debug_msg can attach to a log line, written as key=value after the message
+structured_fields = ("profile_id", "phase", "path", "bytes", "elapsed")
+
+logger = logging.getLogger('debug_logger')
+logger.setLevel(logging.DEBUG)
+logger.propagate = False
+
+listener = None
+listener_lock = threading.Lock()
+
+
+class StructuredFormatter(logging.Formatter):
+    def format(self, record):
+        message = super().format(record)
+        fields = []
+        for name in structured_fields:
+            value = getattr(record, name, None)
+            if value is None:
+                continue
+            if name == "elapsed":
+                value = f"{value:.3f}s"
+            fields.append(f"{name}={value}")
+        return f"{message} [{' '.join(fields)}]" if fields else message
+
+
+# Each run writes its own log file, named by start time and process ID so concurrent runs never share one
+def run_log_file():
+    name = f"savetitan-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.log"
+    return os.path.join(log_dir, name)
+
+
+# Keep only the most recent run logs, rotated parts of a run are removed along with it
+def prune_run_logs(keep=log_runs_kept):
+    try:
+        logs = sorted(name for name in os.listdir(log_dir) if name.startswith("savetitan-") and name.endswith(".log"))
+    except OSError:
+        return
+
+    for name in logs[:max(0, len(logs) - keep)]:
+        for rotated in [name] + [f"{name}.{index}" for index in range(1, log_backup_count + 1)]:
+            try:
+                os.remove(os.path.join(log_dir, rotated))
+            except OSError:
+                pass
+
+
+# Start the background listener that owns the log file. Callers only put records on a queue, so a log line never
+# waits on the disk. Started on the first message so runs with debug off never create a log file.
+def start_logging():
+    global listener
+
+    # logging.handlers pulls in socket and pickle, so it is only imported once debug logging is actually used
+    import logging.handlers
+
+    with listener_lock:
+        if listener is not None:
+            return
+
+        os.makedirs(log_dir, exist_ok=True)
+        prune_run_logs(log_runs_kept - 1)
+
+        file_handler = logging.handlers.RotatingFileHandler(run_log_file(), maxBytes=log_max_bytes,
+                                                            backupCount=log_backup_count, encoding="utf-8")
+        file_handler.setFormatter(StructuredFormatter('%(asctime)s - %(threadName)s - %(message)s'))
+
+        log_queue = queue.SimpleQueue()
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+        listener = logging.handlers.QueueListener(log_queue, file_handler)
+        listener.start()
+        atexit.register(stop_logging)
+
+
+# Flush whatever is still queued and close the log file
+def stop_logging():
+    global listener
+
+    with listener_lock:
+        if listener is None:
+            return
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+        listener = None
+
+
+def log_event(message, **fields):
+    if listener is None:
+        start_logging()
+    logger.debug(message, extra=fields)
@@ -0,0 +1,101 @@
+import os
+import json
+
+from pathlib import Path
+
+from modules.hashcache import hash_file
+from modules.hashcache import get_hash_cache
+
+from modules.transfer import write_json_atomic
+
+from modules.trace import traced
+
+manifest_version = 1
+
+
+# Manifest keys always use forward slashes so Windows and Linux hosts can share a slot
+def manifest_key(rel_path):
+    return Path(rel_path).as_posix()
+
+
+# The manifest lives next to the save<N> folder as save<N>.manifest
+def manifest_path(cloud_profile_save_path):
+    return f"{os.path.normpath(str(cloud_profile_save_path))}.manifest"
+
+
+def manifest_entry(file_stat, file_hash, blocks=None, block_size=None):
+    entry = {"size": file_stat.st_size, "mtime_ns": file_stat.st_mtime_ns, "hash": file_hash}
+    if blocks is not None:
+        entry["blocks"] = blocks
+        entry["block_size"] = block_size
+    return entry
+
+
+# Return the manifest entry for a cloud file only while its size and mtime still match the file on the share
+def valid_manifest_entry(manifest, rel_path, cloud_stat):
+    entry = manifest.get(manifest_key(rel_path))
+    if entry and entry.get("hash") and entry.get("size") == cloud_stat.st_size and entry.get("mtime_ns") == cloud_stat.st_mtime_ns:
+        return entry
+    return None
+
+
+# Load the manifest for a save slot, returns an empty dict when missing or unreadable
+def load_manifest(cloud_profile_save_path):
+    path = manifest_path(cloud_profile_save_path)
+    if not os.path.exists(path):
+        return {}
+
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    if data.get("version") != manifest_version:
+        return {}
+    return data.get("files", {})
+
+
+# Write the manifest for a save slot through its own temp file, so a failed write never leaves it half written and two
+# computers saving the same slot never publish each other's partial file
+@traced("sync", 1)
+def save_manifest(cloud_profile_save_path, files):
+    write_json_atomic(manifest_path(cloud_profile_save_path), {"version": manifest_version, "files": files})
+
+
+def delete_manifest(cloud_profile_save_path):
+    path = manifest_path(cloud_profile_save_path)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+# Return the recorded hash of a cloud file while its size and mtime still match the manifest, otherwise read and record it
+def cloud_file_hash(manifest, rel_path, cloud_file, cloud_stat=None):
+    if cloud_stat is None:
+        cloud_stat = os.stat(cloud_file)
+
+    entry = valid_manifest_entry(manifest, rel_path, cloud_stat)
+    if entry:
+        return entry["hash"]
+
+    file_hash = hash_file(cloud_file)
+    manifest[manifest_key(rel_path)] = manifest_entry(cloud_stat, file_hash)
+    return file_hash
+
+
+# Local hashes go through the persistent hash cache so unchanged files are never re-read
+def local_file_hash(local_file, local_stat=None):
+    return get_hash_cache().get_hash(local_file, local_stat)
+
+
+# Compare a local file with its cloud copy, only the local side is read unless the cloud hash is unknown
+def files_match(manifest, rel_path, local_file, cloud_file, local_stat=None, cloud_stat=None):
+    if local_stat is None:
+        local_stat = os.stat(local_file)
+    if cloud_stat is None:
+        cloud_stat = os.stat(cloud_file)
+
+    if local_stat.st_size != cloud_stat.st_size:
+        return False
+
+    return local_file_hash(local_file, local_stat) == cloud_file_hash(manifest, rel_path, cloud_file, cloud_stat)
@@ -0,0 +1,76 @@
+from modules.snapshot import take_snapshot
+from modules.snapshot import extra_dirs
+
+from modules.chunkstore import take_index_snapshot
+
+
+def format_bytes(size):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+# The file stat signature used to tell whether a snapshot is still current without reading any contents
+def snapshot_signature(snapshot):
+    return [(rel_path, file_stat.st_size, file_stat.st_mtime_ns) for rel_path, file_stat in snapshot.files]
+
+
+# A list of copy and delete operations for one direction, built from a single diff of both sides
+class SyncPlan:
+    def __init__(self, direction, local_snapshot, cloud_snapshot, diff, manifest, unchanged_manifest, omitted_files,
+                 layout="folder", objects_root=None):
+        self.direction = direction
+        self.layout = layout
+        self.objects_root = objects_root
+        self.local_snapshot = local_snapshot
+        self.cloud_snapshot = cloud_snapshot
+        self.manifest = manifest
+        self.synced_manifest = dict(unchanged_manifest)
+        self.omitted_files = omitted_files
+
+        if direction == "push":
+            self.source = local_snapshot
+            self.destination = cloud_snapshot
+            self.copies = sorted(diff.added + diff.changed)
+            deletes = diff.removed
+            delete_dirs = extra_dirs(local_snapshot, cloud_snapshot)
+        elif direction == "pull":
+            self.source = cloud_snapshot
+            self.destination = local_snapshot
+            self.copies = sorted(diff.removed + diff.changed)
+            deletes = diff.added
+            delete_dirs = extra_dirs(cloud_snapshot, local_snapshot)
+        else:
+            raise ValueError("Invalid direction. Expected 'push' or 'pull'.")
+
+        # A file renamed by case alone is one copy and one delete. On Windows and most network shares both name the
+        # same file, so the old name is never deleted outright: case_renames holds (old, new) pairs that are settled
+        # once the copy has landed. Folders renamed by case are never removed for the same reason.
+        copy_keys = {rel_path.casefold(): rel_path for rel_path in self.copies}
+        self.case_renames = [(rel_path, copy_keys[rel_path.casefold()]) for rel_path in deletes
+                             if rel_path.casefold() in copy_keys]
+        self.deletes = [rel_path for rel_path in deletes if rel_path.casefold() not in copy_keys]
+        source_dirs = {rel_dir.casefold() for rel_dir in self.source.dirs}
+        self.delete_dirs = [rel_dir for rel_dir in delete_dirs if rel_dir.casefold() not in source_dirs]
+
+    def bytes_to_copy(self):
+        return sum(self.source.stats[rel_path].st_size for rel_path in self.copies)
+
+    def is_empty(self):
+        return not self.copies and not self.deletes and not self.delete_dirs
+
+    def summary(self):
+        return f"{len(self.copies)} file(s) ({format_bytes(self.bytes_to_copy())}) to copy, {len(self.deletes)} to delete"
+
+    # Re-stat both sides and confirm nothing changed since the plan was made, no file contents are read
+    def is_current(self):
+        local_snapshot = take_snapshot(self.local_snapshot.root, self.omitted_files)
+        if self.layout == "chunked":
+            cloud_snapshot = take_index_snapshot(self.cloud_snapshot.root, self.omitted_files)
+        else:
+            cloud_snapshot = take_snapshot(self.cloud_snapshot.root, self.omitted_files)
+        return (snapshot_signature(local_snapshot) == snapshot_signature(self.local_snapshot)
+                and snapshot_signature(cloud_snapshot) == snapshot_signature(self.cloud_snapshot)
+                and local_snapshot.dirs == self.local_snapshot.dirs
+                and cloud_snapshot.dirs == self.cloud_snapshot.dirs)
@@ -0,0 +1,123 @@
+import os
+import glob
+import json
+import sqlite3
+import threading
+
+import modules.paths as paths
+
+from modules.transfer import write_json_atomic
+
+profile_db_file = os.path.join(paths.user_config_file, "profiles.db")
+profiles_dir = os.path.join(paths.user_config_file, "profiles")
+# Profile files already moved into the store are kept here, under profiles_dir, instead of being deleted
+imported_dir_name = "imported"
+
+# Profile fields with their own indexed column, so looking a profile up by them never reads every profile
+indexed_fields = {"name": "name_lower", "game_executable": "executable_lower"}
+
+profile_store = None
+# The backend the profiles were last moved to, "sqlite" or "json"
+profile_backend = None
+profile_store_lock = threading.Lock()
+
+
+# All profiles in one SQLite database. Each profile is kept as its JSON document, with the lower-cased name and
+# executable copied into indexed columns on every write.
+class ProfileStore:
+    def __init__(self, db_file):
+        os.makedirs(os.path.dirname(db_file), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS profiles "
+                        "(profile_id TEXT PRIMARY KEY, data TEXT NOT NULL, name_lower TEXT, executable_lower TEXT)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS profiles_name ON profiles (name_lower)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS profiles_executable ON profiles (executable_lower)")
+
+    def load(self, profile_id):
+        with self.lock:
+            row = self.db.execute("SELECT data FROM profiles WHERE profile_id = ?", (profile_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, profile_id, data):
+        profile = data.get("profile", {})
+        row = (profile_id, json.dumps(data), lower_or_none(profile.get("name")), lower_or_none(profile.get("game_executable")))
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO profiles (profile_id, data, name_lower, executable_lower) "
+                            "VALUES (?, ?, ?, ?)", row)
+
+    def delete(self, profile_id):
+        with self.lock:
+            return self.db.execute("DELETE FROM profiles WHERE profile_id = ?", (profile_id,)).rowcount > 0
+
+    def profile_ids(self):
+        with self.lock:
+            return [row[0] for row in self.db.execute("SELECT profile_id FROM profiles ORDER BY profile_id")]
+
+    def all_profiles(self):
+        with self.lock:
+            rows = self.db.execute("SELECT profile_id, data FROM profiles ORDER BY profile_id").fetchall()
+        return {profile_id: json.loads(data) for profile_id, data in rows}
+
+    # Profile IDs whose section field equals value, ignoring case. Indexed fields are a single index lookup.
+    def find(self, section, field, value):
+        column = indexed_fields.get(field) if section == "profile" else None
+        if column:
+            with self.lock:
+                rows = self.db.execute(f"SELECT profile_id FROM profiles WHERE {column} = ? ORDER BY profile_id",
+                                       (value.lower(),)).fetchall()
+            return [row[0] for row in rows]
+
+        return [profile_id for profile_id, data in self.all_profiles().items()
+                if str(data.get(section, {}).get(field, "")).lower() == value.lower()]
+
+    # Move profiles/*.json files into the store. Each file is moved to profiles/imported once its profile is saved, so
+    # the JSON backend never sees a copy older than the store's. Unreadable files are left where they are.
+    def import_json(self, json_dir):
+        imported = 0
+        for json_file in glob.glob(os.path.join(json_dir, '*.json')):
+            try:
+                with open(json_file, 'r') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            profile_id = os.path.splitext(os.path.basename(json_file))[0]
+            self.save(profile_id, data)
+            os.makedirs(os.path.join(json_dir, imported_dir_name), exist_ok=True)
+            os.replace(json_file, os.path.join(json_dir, imported_dir_name, os.path.basename(json_file)))
+            imported += 1
+        return imported
+
+    # Move every profile in the store back out to profiles/*.json, for when the JSON backend is in use again.
+    # A row is only deleted once its file is written.
+    def export_json(self, json_dir):
+        os.makedirs(json_dir, exist_ok=True)
+        exported = 0
+        for profile_id, data in self.all_profiles().items():
+            write_json_atomic(os.path.join(json_dir, f"{profile_id}.json"), data)
+            self.delete(profile_id)
+            exported += 1
+        return exported
+
+
+def lower_or_none(value):
+    return value.lower() if isinstance(value, str) else None
+
+
+# The SQLite store when it is the backend in use, None for the JSON files. On the first call, and whenever global.json
+# switches backends, the profiles are moved over from the other backend so only one of them ever holds a profile.
+def active_profile_store(use_sqlite):
+    global profile_store, profile_backend
+    backend = "sqlite" if use_sqlite else "json"
+    with profile_store_lock:
+        if backend != profile_backend:
+            if profile_store is None and (use_sqlite or os.path.exists(profile_db_file)):
+                profile_store = ProfileStore(profile_db_file)
+            if use_sqlite:
+                profile_store.import_json(profiles_dir)
+            elif profile_store is not None:
+                profile_store.export_json(profiles_dir)
+            profile_backend = backend
+        return profile_store if use_sqlite else None
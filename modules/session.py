@@ -0,0 +1,135 @@
+import os
+import json
+
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.io import io_global
+from modules.io import io_profile
+from modules.io import update_savetitan_field
+from modules.io import write_json_atomic
+from modules.io import profile_info_lock
+from modules.io import debug_msg
+
+from modules.snapshot import take_snapshot
+
+from modules.startup import phase
+
+
+# Everything one launch needs from the config files and the cloud share, read once. The share probe,
+# profile_info.savetitan and the local save folder are fetched on background threads while the rest of the launch
+# carries on, and checkout changes are written back to the share in one write.
+class SyncSession:
+    def __init__(self, profile_id):
+        self.profile_id = str(profile_id)
+        with phase("config read: session"):
+            self.cloud_storage_path = io_global("read", "config", "cloud_storage_path")
+            self.profile = io_profile("read", self.profile_id, "profile") or {}
+            self.omitted_files = io_profile("read", self.profile_id, "overrides", "omitted") or []
+
+        self.profile_info_path = None
+        if self.cloud_storage_path:
+            self.profile_info_path = os.path.join(self.cloud_storage_path, self.profile_id, "profile_info.savetitan")
+
+        self.executor = None
+        self.share_future = None
+        self.profile_info_future = None
+        self.local_snapshot_future = None
+        self.write_future = None
+        self.pending = {}
+
+    # Start probing the share, reading profile_info.savetitan and scanning the local save folder at the same time. A
+    # share that is slow to answer then costs the launch once instead of delaying the local scan as well.
+    def start(self):
+        if self.executor is not None:
+            return self
+        self.executor = ThreadPoolExecutor(max_workers=3)
+        self.share_future = self.executor.submit(self.probe_share)
+        self.profile_info_future = self.executor.submit(self.load_profile_info)
+        local_save_folder = self.profile.get("local_save_folder")
+        if local_save_folder:
+            self.local_snapshot_future = self.executor.submit(self.scan_local, local_save_folder)
+        return self
+
+    def scan_local(self, local_save_folder):
+        with phase("tree scan: local"):
+            return take_snapshot(local_save_folder, self.omitted_files)
+
+    def probe_share(self):
+        with phase("share check"):
+            return bool(self.cloud_storage_path) and os.path.exists(self.cloud_storage_path)
+
+    # Whether the cloud share answered, from the probe started with the session when there is one
+    def share_accessible(self):
+        if self.share_future is None:
+            return self.probe_share()
+        return self.share_future.result()
+
+    def load_profile_info(self):
+        with phase("share read: profile_info.savetitan"):
+            if not self.profile_info_path or not os.path.exists(self.profile_info_path):
+                return {}
+            with open(self.profile_info_path, 'r') as f:
+                return json.load(f)
+
+    def profile_info(self):
+        self.start()
+        return self.profile_info_future.result()
+
+    def read(self, section, field=None):
+        data = self.profile_info()
+        if field is None:
+            return data.get(section, None)
+        return data.get(section, {}).get(field, None)
+
+    # Changes are kept in memory until flush, so several of them cost a single write to the share
+    def write(self, section, field, write_value=None):
+        if write_value is not None:
+            write_value = str(write_value)
+        self.wait_for_write()
+        update_savetitan_field(self.profile_info(), section, field, write_value, None)
+        self.pending[(section, field)] = write_value
+
+    # Write pending changes in the background. profile_info.savetitan is read again under the profile's lock first, so
+    # whatever other computers wrote since the launch, their checkout or sync history, is kept.
+    def flush(self):
+        if not self.pending:
+            return
+        pending = self.pending
+        self.pending = {}
+        self.wait_for_write()
+        self.write_future = self.executor.submit(self.write_profile_info, pending)
+
+    def write_profile_info(self, pending):
+        with profile_info_lock(self.profile_id):
+            data = self.load_profile_info()
+            for (section, field), write_value in pending.items():
+                update_savetitan_field(data, section, field, write_value, None)
+            write_json_atomic(self.profile_info_path, data)
+        debug_msg(f"Wrote {len(pending)} change(s) to profile_info.savetitan", profile_id=self.profile_id)
+
+    def wait_for_write(self):
+        if self.write_future is not None:
+            self.write_future.result()
+            self.write_future = None
+
+    # The local scan taken at launch, handed out once; anything later scans again
+    def take_local_snapshot(self):
+        future = self.local_snapshot_future
+        self.local_snapshot_future = None
+        return future.result() if future is not None else None
+
+    def close(self):
+        if self.executor is None:
+            return
+        self.flush()
+        self.wait_for_write()
+        self.executor.shutdown(wait=False)
+        self.executor = None
+
+
+# Create the session for a launch and, for synced profiles, start fetching from the share straight away
+def start_session(profile_id):
+    session = SyncSession(profile_id)
+    if session.profile.get("sync_mode") == "Sync":
+        session.start()
+    return session
@@ -0,0 +1,257 @@
+import os
+import io
+import sys
+import json
+import time
+import random
+import builtins
+import threading
+
+# Set to a preset name, a JSON object or key=value pairs, e.g. "vpn" or "latency_ms=40,jitter_ms=10,bandwidth_mb_s=5".
+# global.json can hold the same settings as an object in config/share_simulation. The environment variable wins.
+share_sim_env_var = "SAVETITAN_SHARE_SIM"
+
+# Rough conditions for the places a cloud_storage_path usually lives
+share_presets = {
+    "lan": {"latency_ms": 0.5, "jitter_ms": 0.2, "bandwidth_mb_s": 100},
+    "wifi": {"latency_ms": 5, "jitter_ms": 2, "bandwidth_mb_s": 20},
+    "vpn": {"latency_ms": 40, "jitter_ms": 10, "bandwidth_mb_s": 5},
+}
+
+# File system calls that cost a round trip to the share. Any of them, and open, can get its own latency with
+# "<name>_ms", e.g. "stat_ms=2".
+simulated_calls = ("stat", "lstat", "scandir", "listdir", "access", "mkdir", "rmdir", "remove", "unlink", "rename",
+                   "replace", "utime", "chmod", "link")
+
+simulator = None
+
+
+# Turn the environment variable or global.json value into a settings dict, None when simulation is off
+def parse_share_settings(spec):
+    if not spec:
+        return None
+    if isinstance(spec, dict):
+        settings = dict(spec)
+    elif spec.strip().startswith("{"):
+        settings = json.loads(spec)
+    else:
+        settings = {}
+        for part in spec.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            if "=" not in part:
+                part = f"preset={part}"
+            key, value = part.split("=", 1)
+            settings[key.strip()] = value.strip()
+
+    preset = settings.pop("preset", None)
+    if preset is not None:
+        if preset not in share_presets:
+            raise ValueError(f"Unknown share simulation preset: {preset}. Choose from {', '.join(share_presets)}")
+        settings = dict(share_presets[preset], **settings)
+
+    return {key: value if key == "seed" else float(value) for key, value in settings.items()}
+
+
+def share_settings():
+    spec = os.environ.get(share_sim_env_var)
+    if not spec:
+        from modules.io import io_global
+        spec = io_global("read", "config", "share_simulation")
+    return parse_share_settings(spec)
+
+
+# A file opened on the share. Reads and writes are paced by the simulator's bandwidth. fileno() is refused so
+# shutil falls back to copying through read and write instead of sendfile, which would skip the pacing.
+class SimulatedFile:
+    def __init__(self, file, simulator):
+        self.file = file
+        self.simulator = simulator
+
+    def read(self, *args):
+        data = self.file.read(*args)
+        self.simulator.transfer(len(data))
+        return data
+
+    def readinto(self, buffer):
+        size = self.file.readinto(buffer)
+        self.simulator.transfer(size or 0)
+        return size
+
+    def readline(self, *args):
+        line = self.file.readline(*args)
+        self.simulator.transfer(len(line))
+        return line
+
+    def write(self, data):
+        written = self.file.write(data)
+        self.simulator.transfer(len(data))
+        return written
+
+    def fileno(self):
+        raise io.UnsupportedOperation("fileno is not available on a simulated share")
+
+    def __iter__(self):
+        for line in self.file:
+            self.simulator.transfer(len(line))
+            yield line
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.file.close()
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+# Slows down every file system call under the share roots. Latency is paid per call, with jitter spread evenly
+# around it. Bandwidth is one link shared by all threads, so parallel transfers split it like they would on a NAS.
+class ShareSimulator:
+    def __init__(self, settings, roots=()):
+        self.settings = settings
+        self.roots = []
+        self.lock = threading.Lock()
+        self.random = random.Random(settings.get("seed"))
+        self.link_free_at = 0.0
+        self.calls = {}
+        self.bytes = 0
+        self.delay = 0.0
+        self.originals = {}
+        for root in roots:
+            self.add_root(root)
+
+    def add_root(self, root):
+        root = os.path.normcase(os.path.abspath(root))
+        with self.lock:
+            if root not in self.roots:
+                self.roots.append(root)
+
+    def on_share(self, path):
+        if isinstance(path, int) or path is None:
+            return False
+        try:
+            path = os.fsdecode(path)
+        except TypeError:
+            return False
+        path = os.path.normcase(os.path.abspath(path))
+        return any(path == root or path.startswith(root + os.sep) for root in self.roots)
+
+    def latency(self, call):
+        latency = self.settings.get(f"{call}_ms", self.settings.get("latency_ms", 0.0))
+        jitter = self.settings.get("jitter_ms", 0.0)
+        if jitter:
+            with self.lock:
+                latency += self.random.uniform(-jitter, jitter)
+        return max(0.0, latency) / 1000
+
+    def round_trip(self, call):
+        delay = self.latency(call)
+        with self.lock:
+            self.calls[call] = self.calls.get(call, 0) + 1
+            self.delay += delay
+        if delay:
+            time.sleep(delay)
+
+    def transfer(self, size):
+        bandwidth = self.settings.get("bandwidth_mb_s")
+        with self.lock:
+            self.bytes += size
+            if not bandwidth or not size:
+                return
+            now = time.monotonic()
+            started = max(now, self.link_free_at)
+            self.link_free_at = started + size / (bandwidth * 1024 * 1024)
+            wait = self.link_free_at - now
+            self.delay += wait
+        time.sleep(wait)
+
+    def wrap_call(self, call, original):
+        def simulated(*args, **kwargs):
+            path = args[0] if args else kwargs.get("path")
+            if self.on_share(path):
+                self.round_trip(call)
+            return original(*args, **kwargs)
+        simulated.__name__ = original.__name__
+        return simulated
+
+    def wrap_rename(self, call, original):
+        def simulated(source, destination, *args, **kwargs):
+            if self.on_share(source) or self.on_share(destination):
+                self.round_trip(call)
+            return original(source, destination, *args, **kwargs)
+        simulated.__name__ = original.__name__
+        return simulated
+
+    def wrap_open(self, original):
+        def simulated(file, *args, **kwargs):
+            if not self.on_share(file):
+                return original(file, *args, **kwargs)
+            self.round_trip("open")
+            return SimulatedFile(original(file, *args, **kwargs), self)
+        simulated.__name__ = original.__name__
+        return simulated
+
+    def install(self):
+        if self.originals:
+            return
+        for call in simulated_calls:
+            original = getattr(os, call, None)
+            if original is None:
+                continue
+            self.originals[call] = original
+            wrap = self.wrap_rename if call in ("rename", "replace", "link") else self.wrap_call
+            setattr(os, call, wrap(call, original))
+        self.originals["open"] = builtins.open
+        builtins.open = self.wrap_open(builtins.open)
+
+    def uninstall(self):
+        for call, original in self.originals.items():
+            if call == "open":
+                builtins.open = original
+            else:
+                setattr(os, call, original)
+        self.originals = {}
+
+    def stats(self):
+        with self.lock:
+            return {"calls": dict(self.calls), "bytes": self.bytes, "delay": self.delay}
+
+
+# Start simulating a slow share if the environment or global.json asks for it. cloud_storage_path defaults to the
+# configured one; more roots can be added later with simulate_share.
+def install_share_simulator(cloud_storage_path=None, settings=None):
+    global simulator
+
+    if settings is None:
+        settings = share_settings()
+    if not settings:
+        return None
+
+    if cloud_storage_path is None:
+        from modules.io import io_global
+        cloud_storage_path = io_global("read", "config", "cloud_storage_path")
+
+    if simulator is None:
+        simulator = ShareSimulator(settings)
+        simulator.install()
+        print(f"Simulating a slow cloud share: {settings}", file=sys.stderr)
+    if cloud_storage_path:
+        simulator.add_root(cloud_storage_path)
+    return simulator
+
+
+# Treat another folder as part of the share, e.g. a benchmark's cloud folder created after the simulator started
+def simulate_share(path):
+    if simulator is not None:
+        simulator.add_root(path)
+
+
+def uninstall_share_simulator():
+    global simulator
+    if simulator is not None:
+        simulator.uninstall()
+        simulator = None
@@ -0,0 +1,139 @@
+import os
+
+from modules.transfer import run_parallel
+
+
+# A single scan of a save folder: every file with the stat taken from the directory listing, sorted by relative path
+# as the file system compares names, so on Windows "Save.dat" and "save.dat" sort together
+class TreeSnapshot:
+    def __init__(self, root, files, dirs):
+        self.root = str(root)
+        self.files = files
+        self.dirs = dirs
+        self.stats = dict(files)
+
+    def path(self, rel_path):
+        return os.path.join(self.root, rel_path)
+
+    def newest_mtime_ns(self):
+        return max((file_stat.st_mtime_ns for rel_path, file_stat in self.files), default=0)
+
+    def total_bytes(self):
+        return sum(file_stat.st_size for rel_path, file_stat in self.files)
+
+
+# Result of comparing a source snapshot against a destination snapshot
+class TreeDiff:
+    def __init__(self):
+        self.added = []
+        self.removed = []
+        self.changed = []
+        self.unchanged = []
+        self.source_newest_mtime_ns = 0
+        self.destination_newest_mtime_ns = 0
+        self.errors = []
+
+    def identical(self):
+        return not self.added and not self.removed and not self.changed
+
+
+# Walk a folder once with os.scandir, reusing the stat information each DirEntry already carries
+def take_snapshot(root, omitted_files=()):
+    root = str(root)
+    omitted_files = set(omitted_files)
+    files = []
+    dirs = []
+
+    if not os.path.isdir(root):
+        return TreeSnapshot(root, files, dirs)
+
+    pending_dirs = [""]
+    while pending_dirs:
+        rel_dir = pending_dirs.pop()
+        with os.scandir(os.path.join(root, rel_dir)) as entries:
+            for entry in entries:
+                rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+
+                if entry.is_dir():
+                    dirs.append(rel_path)
+                    # Same as os.walk, symlinked folders are listed but not descended into
+                    if not entry.is_symlink():
+                        pending_dirs.append(rel_path)
+                elif rel_path not in omitted_files:
+                    files.append((rel_path, entry.stat()))
+
+    files.sort(key=lambda item: os.path.normcase(item[0]))
+    dirs.sort()
+    return TreeSnapshot(root, files, dirs)
+
+
+# Merge-join two sorted snapshots in one pass. Files present on both sides with the same size are handed to
+# files_match(rel_path, source_stat, destination_stat) on the worker pool to decide whether their content differs.
+# Names are joined by their os.path.normcase key. Two names that only differ by case are reported as one added and
+# one removed file, each under its own name, and SyncPlan keeps the delete from hitting the file just copied.
+def diff_snapshots(source, destination, files_match=None, workers=1):
+    diff = TreeDiff()
+    same_size = []
+
+    source_files = source.files
+    destination_files = destination.files
+    source_keys = [os.path.normcase(rel_path) for rel_path, file_stat in source_files]
+    destination_keys = [os.path.normcase(rel_path) for rel_path, file_stat in destination_files]
+    i = 0
+    j = 0
+    while i < len(source_files) or j < len(destination_files):
+        if j >= len(destination_files) or (i < len(source_files) and source_keys[i] < destination_keys[j]):
+            rel_path, source_stat = source_files[i]
+            diff.added.append(rel_path)
+            diff.source_newest_mtime_ns = max(diff.source_newest_mtime_ns, source_stat.st_mtime_ns)
+            i += 1
+        elif i >= len(source_files) or destination_keys[j] < source_keys[i]:
+            rel_path, destination_stat = destination_files[j]
+            diff.removed.append(rel_path)
+            diff.destination_newest_mtime_ns = max(diff.destination_newest_mtime_ns, destination_stat.st_mtime_ns)
+            j += 1
+        elif source_files[i][0] != destination_files[j][0]:
+            rel_path, source_stat = source_files[i]
+            diff.added.append(rel_path)
+            diff.source_newest_mtime_ns = max(diff.source_newest_mtime_ns, source_stat.st_mtime_ns)
+            rel_path, destination_stat = destination_files[j]
+            diff.removed.append(rel_path)
+            diff.destination_newest_mtime_ns = max(diff.destination_newest_mtime_ns, destination_stat.st_mtime_ns)
+            i += 1
+            j += 1
+        else:
+            rel_path, source_stat = source_files[i]
+            destination_stat = destination_files[j][1]
+            diff.source_newest_mtime_ns = max(diff.source_newest_mtime_ns, source_stat.st_mtime_ns)
+            diff.destination_newest_mtime_ns = max(diff.destination_newest_mtime_ns, destination_stat.st_mtime_ns)
+
+            if source_stat.st_size != destination_stat.st_size:
+                diff.changed.append(rel_path)
+            elif files_match is None:
+                diff.unchanged.append(rel_path)
+            else:
+                same_size.append((rel_path, source_stat, destination_stat))
+            i += 1
+            j += 1
+
+    results, errors = run_parallel(lambda item: files_match(*item), same_size, workers, "compare")
+    diff.errors = [(item[0], error) for item, error in errors]
+
+    # Files whose comparison errored are treated as changed so the copy pass retries them
+    failed = {rel_path for rel_path, error in diff.errors}
+    matched = iter(results)
+    for rel_path, source_stat, destination_stat in same_size:
+        if rel_path in failed or not next(matched):
+            diff.changed.append(rel_path)
+        else:
+            diff.unchanged.append(rel_path)
+
+    diff.changed.sort()
+    return diff
+
+
+# Directories that exist in the destination but not the source, deepest first so they can be removed in order
+def extra_dirs(source, destination):
+    source_dirs = set(source.dirs)
+    return sorted((rel_dir for rel_dir in destination.dirs if rel_dir not in source_dirs),
+                  key=lambda rel_dir: rel_dir.count(os.sep), reverse=True)
@@ -0,0 +1,143 @@
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+
+from datetime import datetime
+
+from modules.trace import span
+
+# Set to 1, or to the path of the JSON report, to time a launch without passing --profile-startup
+startup_env_var = "SAVETITAN_PROFILE_STARTUP"
+
+# Taken when this module is first imported, which savetitan-cmd.py does before anything else
+process_started = time.perf_counter()
+
+startup_state = {"enabled": False, "report_file": None, "reported": False}
+startup_phases = []
+startup_lock = threading.Lock()
+
+
+# Turn timing on from --profile-startup [file] or the environment variable. Read straight from argv because the
+# imports being timed happen before argparse runs.
+def enable_from_args(argv=None, environ=None):
+    argv = sys.argv[1:] if argv is None else argv
+    environ = os.environ if environ is None else environ
+
+    report_file = None
+    enabled = False
+    for index, arg in enumerate(argv):
+        if arg == "--profile-startup":
+            enabled = True
+            if index + 1 < len(argv) and not argv[index + 1].startswith("-"):
+                report_file = argv[index + 1]
+        elif arg.startswith("--profile-startup="):
+            enabled = True
+            report_file = arg.split("=", 1)[1] or None
+
+    env_value = environ.get(startup_env_var, "")
+    if not enabled and env_value and env_value != "0":
+        enabled = True
+        if env_value != "1":
+            report_file = env_value
+
+    if enabled:
+        enable(report_file)
+    return enabled
+
+
+def enable(report_file=None):
+    startup_state["enabled"] = True
+    startup_state["report_file"] = report_file
+
+
+def profiling_enabled():
+    return startup_state["enabled"]
+
+
+def record(name, started, elapsed):
+    with startup_lock:
+        startup_phases.append({
+            "name": name,
+            "start": started - process_started,
+            "elapsed": elapsed,
+            "thread": threading.current_thread().name,
+        })
+
+
+@contextlib.contextmanager
+def timed_phase(name):
+    started = time.perf_counter()
+    try:
+        with span(name, "startup"):
+            yield
+    finally:
+        record(name, started, time.perf_counter() - started)
+
+
+# Time a block of the launch path. Phases are also trace spans, so with both timing and tracing off this hands back
+# a shared no-op context and the instrumented code costs two dictionary lookups.
+def phase(name):
+    if not startup_state["enabled"]:
+        return span(name, "startup")
+    return timed_phase(name)
+
+
+# A point in time rather than a span, e.g. the moment the game process was spawned
+def mark(name):
+    if startup_state["enabled"]:
+        now = time.perf_counter()
+        record(name, now, 0.0)
+
+
+def default_report_file():
+    import modules.paths as paths
+    name = f"startup-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.json"
+    return os.path.join(paths.user_config_file, "logs", name)
+
+
+def format_table(phases, total):
+    name_width = max([len(entry["name"]) for entry in phases] + [len("Phase")])
+    lines = [f"{'Phase':<{name_width}}  {'Start ms':>9}  {'Elapsed ms':>10}  Thread"]
+    for entry in phases:
+        lines.append(f"{entry['name']:<{name_width}}  {entry['start'] * 1000:>9.1f}  "
+                     f"{entry['elapsed'] * 1000:>10.1f}  {entry['thread']}")
+    lines.append(f"{'Total':<{name_width}}  {'':>9}  {total * 1000:>10.1f}")
+    return "\n".join(lines)
+
+
+# Print the phases as a table to stderr and write them as JSON. Called once, when the game is spawned or, for
+# launches that never get that far, at exit.
+def write_report():
+    if not startup_state["enabled"] or startup_state["reported"]:
+        return None
+    startup_state["reported"] = True
+
+    total = time.perf_counter() - process_started
+    with startup_lock:
+        phases = sorted(startup_phases, key=lambda entry: entry["start"])
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "argv": sys.argv,
+        "platform": sys.platform,
+        "python": sys.version.split()[0],
+        "total": total,
+        "phases": phases,
+    }
+
+    print(format_table(phases, total), file=sys.stderr)
+
+    report_file = startup_state["report_file"] or default_report_file()
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(report_file)), exist_ok=True)
+        with open(report_file, 'w') as f:
+            json.dump(report, f, indent=2)
+    except OSError as e:
+        print(f"Could not write the startup profile to {report_file}: {e}", file=sys.stderr)
+        return None
+
+    print(f"Startup profile written to {report_file}", file=sys.stderr)
+    return report_file
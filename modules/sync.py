@@ -1,27 +1,38 @@
 import os
 import sys
-import filecmp
-from datetime import datetime
 import socket
 import subprocess
-import psutil
-import time
-
-from pathlib import Path
 
 from PyQt5.QtWidgets import QMessageBox
 from PyQt5.QtCore import QTimer
-from PyQt5 import uic
 
 from modules.io import check_permissions
-from modules.io import io_profile
 from modules.io import io_global
 from modules.io import io_go
 from modules.io import io_savetitan
-from modules.io import copy_save_to_cloud
-from modules.io import copy_save_to_local
 from modules.io import send_notification
 from modules.io import debug_msg
+from modules.io import show_error
+from modules.io import StorageLayoutError
+
+from modules.session import SyncSession
+
+from modules.forms import load_form
+
+from modules.engine import SyncEngine
+from modules.engine import STATUS_UP_TO_DATE
+from modules.engine import STATUS_CLOUD_AHEAD
+from modules.engine import STATUS_CONFLICT
+
+from components.sync_progress import run_sync_with_progress
+
+from modules.tracker import become_subreaper
+from modules.tracker import name_observed
+from modules.tracker import ProcessTracker
+
+import modules.startup as startup
+
+from modules.trace import span
 
 import modules.paths as paths
 script_dir = paths.script_dir
@@ -32,32 +43,27 @@ python_exe_path = paths.python_exe_path
 
 
 # Function to check and sync saves
-def check_and_sync_saves(profile_id, launch_game_bool=True):
+def check_and_sync_saves(profile_id, launch_game_bool=True, session=None):
     #Load data set
-    cloud_storage_path = io_global("read", "config", "cloud_storage_path")
+    if session is None:
+        session = SyncSession(profile_id)
 
-    profile_fields = io_profile("read", profile_id, "profile")
+    profile_fields = session.profile
 
-    platform_flag = 1 if sys.platform == 'win32' else None
- 
     profile_name = profile_fields.get("name")
     game_executable = profile_fields.get("game_executable")
-    local_save_folder = profile_fields.get("local_save_folder")
-    save_slot = profile_fields.get("save_slot")
     sync_mode = profile_fields.get("sync_mode")
 
-    # Read omitted files
-    omitted_files = io_profile("read", profile_id, "overrides", "omitted") or []
-
-    cloud_profile_save_path = os.path.join(cloud_storage_path, profile_id, "save" + save_slot)
-
     if sync_mode != "Sync":
         if launch_game_bool:
             launch_game_without_sync(game_executable)
         return
 
+    session.start()
+
     # Check: Checkout Hostname
-    checkout_previous_user = io_savetitan("read", profile_id, "profile", "checkout")
+    with span("read checkout", profile_id=profile_id):
+        checkout_previous_user = session.read("profile", "checkout")
     checkout_current_user = socket.gethostname()
     if checkout_previous_user and checkout_previous_user != checkout_current_user:
         checkout_msgbox = QMessageBox()
@@ -72,269 +78,204 @@ def check_and_sync_saves(profile_id, launch_game_bool=True):
         result = checkout_msgbox.exec_()
 
         if result == -1 or checkout_msgbox.clickedButton() == no_button:
+            session.close()
             if launch_game_bool:
                 sys.exit()
             else:
                 return
         elif checkout_msgbox.clickedButton() == yes_button:
-            io_savetitan("write", profile_id, "profile", "checkout", checkout_current_user)
+            session.write("profile", "checkout", checkout_current_user)
 
     elif not checkout_previous_user:
-        io_savetitan("write", profile_id, "profile", "checkout", checkout_current_user)
-
-    if os.path.exists(cloud_profile_save_path) and os.listdir(cloud_profile_save_path):
-        files_identical = True
-        for dirpath, dirnames, filenames in os.walk(local_save_folder):
-            for filename in filenames:
-                local_file = os.path.join(dirpath, filename)
-
-                # Check: Skip omitted files
-                rel_file_path = os.path.relpath(local_file, local_save_folder)
-
-                if rel_file_path in omitted_files:
-                    continue
-
-                cloud_file = os.path.join(cloud_profile_save_path, os.path.relpath(local_file, local_save_folder))
-                if os.path.exists(cloud_file):
-                    rel_cloud_file_path = os.path.relpath(cloud_file, cloud_profile_save_path)
-
-                    if rel_cloud_file_path in omitted_files:
-                        continue
-                    if not filecmp.cmp(local_file, cloud_file, shallow=False):
-                        files_identical = False
-                        break
-                else:
-                    files_identical = False
-                    break
-            if not files_identical:
-                break
-
-        # Check: If files indentical, tally the amount of files
-        if files_identical:
-            local_files_count = len(os.listdir(local_save_folder))
-            cloud_files_count = len(os.listdir(cloud_profile_save_path))
-            
-            # Result: More local files than cloud - Action: Copy contents of local folder to cloud
-            if local_files_count > cloud_files_count:
-                if launch_game_bool:
-                    send_notification(f"Save is up to date. Launching \"{profile_name}\".")
-                    launch_game(profile_id)
-                else:
-                    send_notification(f"Save is up to date for \"{profile_name}\". No changes made.")
-                
-            # Result: More cloud files than local - Action: Copy contents of cloud folder to local
-            elif cloud_files_count > local_files_count:
-                copy_save_to_local(profile_id)
-                if launch_game_bool:
-                    send_notification(f"Save is up to date. Launching \"{profile_name}\".")
-                    launch_game(profile_id)
-                else:
-                    send_notification(f"Save is up to date for \"{profile_name}\". No changes made.")
-                
-            # Result: Content and amount of files is identical - Action: Launch the game, upload when done
-            else:
-                if launch_game_bool:
-                    send_notification(f"Save is up to date. Launching \"{profile_name}\".")
-                    launch_game(profile_id)
-                else:
-                    send_notification(f"Save is up to date for \"{profile_name}\". No changes made.")
+        session.write("profile", "checkout", checkout_current_user)
+
+    # The checkout is written to the share in the background while the saves are compared
+    session.flush()
+    engine = SyncEngine(profile_id, session)
+    try:
+        status = engine.status()
+    except StorageLayoutError as e:
+        show_error("Storage Layout Mismatch", str(e))
+        session.write("profile", "checkout")
+        session.close()
+        if launch_game_bool:
+            sys.exit()
+        return
 
-        # Result: Files aren't identical - Action: Compare files to find latest timestamp
+    # Result: More cloud files than local - Action: Copy contents of cloud folder to local
+    if status.state == STATUS_CLOUD_AHEAD:
+        run_sync_with_progress(engine, "pull", status.pull_plan)
+        if launch_game_bool:
+            send_notification(f"Save is up to date. Launching \"{profile_name}\".")
+            launch_game(profile_id, session)
         else:
-            local_file_time = datetime(1900, 1, 1)
-            cloud_file_time = datetime(1900, 1, 1)
-
-            for dirpath, dirnames, filenames in os.walk(local_save_folder):
-                for filename in filenames:
-                    local_file = os.path.join(dirpath, filename)
-
-                    # Check: Skip omitted files
-                    rel_file_path = os.path.relpath(local_file, local_save_folder)
-
-                    if rel_file_path in omitted_files:
-                        continue
-
-                    file_time = datetime.fromtimestamp(os.path.getmtime(os.path.join(dirpath, filename)))
-                    if local_file_time < file_time:
-                        local_file_time = file_time
-                           
-            for dirpath, dirnames, filenames in os.walk(cloud_profile_save_path):
-                for filename in filenames:
-                    cloud_file = os.path.join(dirpath, filename)
-
-                    cloud_file_norm = os.path.normpath(str(Path(cloud_file)))
-                    if cloud_file_norm in omitted_files:
-                        continue
-                    
-                    file_time = datetime.fromtimestamp(os.path.getmtime(os.path.join(dirpath, filename)))
-                    if cloud_file_time < file_time:
-                        cloud_file_time = file_time
-                           
-            for dirpath, dirnames, filenames in os.walk(cloud_profile_save_path):
-                for filename in filenames:
-                    file_time = datetime.fromtimestamp(os.path.getmtime(os.path.join(dirpath, filename)))
-                    if cloud_file_time < file_time:
-                        cloud_file_time = file_time
-
-            local_save_time_str = local_file_time.strftime("%B %d, %Y, %I:%M:%S %p")
-            cloud_save_time_str = cloud_file_time.strftime("%B %d, %Y, %I:%M:%S %p")
-
-            sync_diag = uic.loadUi("ui/sync_diag.ui")
-            sync_diag.local_date.setText(local_save_time_str)
-            sync_diag.cloud_date.setText(cloud_save_time_str)
-
-            config_profiles = io_profile("read", profile_id, "profile")
-
-            sync_diag.setWindowTitle(f"Profile: {profile_name}")
-            if cloud_file_time > local_file_time:
-                sync_diag.local_indication.setText("Local Copy: Older")
-                sync_diag.cloud_indication.setText("Cloud Copy: Newer")
+            send_notification(f"Save is up to date for \"{profile_name}\". No changes made.")
+
+    # Result: Content and amount of files is identical - Action: Launch the game, upload when done
+    elif status.state == STATUS_UP_TO_DATE:
+        if launch_game_bool:
+            send_notification(f"Save is up to date. Launching \"{profile_name}\".")
+            launch_game(profile_id, session)
+        else:
+            send_notification(f"Save is up to date for \"{profile_name}\". No changes made.")
+
+    # Result: Files aren't identical - Action: Ask which copy to keep
+    elif status.state == STATUS_CONFLICT:
+        with span("sync dialog", "ui"):
+            direction = ask_sync_direction(profile_name, status)
+
+        if direction == "push":
+            if launch_game_bool:
+                launch_game(profile_id, session)
             else:
-                sync_diag.local_indication.setText("Local Copy: Newer")
-                sync_diag.cloud_indication.setText("Cloud Copy: Older")
-
-
-            def on_nosyncButton_clicked():
-                executable_path = io_profile("read", profile_id, "profile", "game_executable")
-                io_savetitan("write", profile_id, "profile", "checkout")
-                sync_diag.hide
-                if launch_game_bool:
-                    launch_game_without_sync(executable_path)
-
-
-            def on_rejected_connect():
-                io_savetitan("write", profile_id, "profile", "checkout")
-                if launch_game_bool:
-                    sys.exit()
-                else:
-                    return
-
-
-            def handle_upload_button_click():
-                sync_diag.hide()
-                
-                if launch_game_bool:
-                    launch_game(profile_id)
-                else:
-                    result = copy_save_to_cloud(profile_id)
-                    profile_fields = io_profile("read", profile_id, "profile")
-                    profile_name = profile_fields.get("name")
-
-                    if result is None:
-                        debug_msg("Cloud sync successful.")
-                        send_notification(f"Profile \"{profile_name}\" has synced to the cloud successfully.")
-                    else:
-                        debug_msg(f"Cloud sync failed: {result}")
-                        send_notification(f"Profile \"{profile_name}\" has failed to sync to the cloud: {result}")
-
-
-            def handle_download_button_click():
-                sync_diag.hide()
-                result = copy_save_to_local(profile_id)
-                
-                if launch_game_bool:
-                    launch_game(profile_id)
-                else:
-                    profile_fields = io_profile("read", profile_id, "profile")
-                    profile_name = profile_fields.get("name")
-
-                    if result is None:
-                        debug_msg("Local sync successful.")
-                        send_notification(f"Profile \"{profile_name}\" has synced the cloud save to local successfully.")
-                    else:
-                        debug_msg(f"Local sync failed: {result}")
-                        send_notification(f"Profile \"{profile_name}\" has failed to sync the cloud save to local: {result}")
-
-            sync_diag.downloadButton.clicked.connect(handle_download_button_click)
-            sync_diag.uploadButton.clicked.connect(handle_upload_button_click)
-            sync_diag.nosyncButton.clicked.connect(lambda: [on_nosyncButton_clicked()])
-            sync_diag.rejected.connect(lambda: on_rejected_connect())
-            
-            sync_diag.exec_()
+                notify_sync_result(profile_name, run_sync_with_progress(engine, "push", status.push_plan))
+
+        elif direction == "pull":
+            result = run_sync_with_progress(engine, "pull", status.pull_plan)
+            if launch_game_bool:
+                launch_game(profile_id, session)
+            else:
+                notify_sync_result(profile_name, result)
+
+        elif direction == "skip":
+            session.write("profile", "checkout")
+            session.close()
+            if launch_game_bool:
+                launch_game_without_sync(game_executable)
+
+        else:
+            session.write("profile", "checkout")
+            session.close()
+            if launch_game_bool:
+                sys.exit()
+
     else:
         if launch_game_bool:
-            launch_game(profile_id)
+            launch_game(profile_id, session)
         else:
             send_notification(f"Save is up to date for \"{profile_name}\". No changes made.")
             return
 
 
-# Function to wait for a process and its children to finish
-def wait_for_process_to_finish(process_names):
-    if not isinstance(process_names, list):
-        process_names = [process_names]
+# Show the sync dialog for a conflict and return "push", "pull", "skip" or None if it was closed
+def ask_sync_direction(profile_name, status):
+    local_save_time_str = status.local_time().strftime("%B %d, %Y, %I:%M:%S %p")
+    cloud_save_time_str = status.cloud_time().strftime("%B %d, %Y, %I:%M:%S %p")
+
+    sync_diag = load_form("sync_diag.ui")
+    sync_diag.local_date.setText(local_save_time_str)
+    sync_diag.cloud_date.setText(cloud_save_time_str)
+    sync_diag.plan_summary.setText(f"Upload: {status.push_plan.summary()}\nDownload: {status.pull_plan.summary()}")
 
-    while True:
-        matching_processes = [proc for proc in psutil.process_iter(['name', 'pid', 'status']) 
-                              if proc.info['name'].lower() in map(str.lower, process_names) 
-                              and proc.info['status'] != 'zombie']
+    sync_diag.setWindowTitle(f"Profile: {profile_name}")
+    if status.cloud_is_newer():
+        sync_diag.local_indication.setText("Local Copy: Older")
+        sync_diag.cloud_indication.setText("Cloud Copy: Newer")
+    else:
+        sync_diag.local_indication.setText("Local Copy: Newer")
+        sync_diag.cloud_indication.setText("Cloud Copy: Older")
 
-        if not matching_processes:
-            debug_msg(f"No matching processes found for: {process_names}")
-            time.sleep(2)
+    choice = []
 
-            matching_processes = [proc for proc in psutil.process_iter(['name', 'pid', 'status']) 
-                                  if proc.info['name'].lower() in map(str.lower, process_names)
-                                  and proc.info['status'] != 'zombie']
+    def choose(direction):
+        choice.append(direction)
+        sync_diag.accept()
 
-            if not matching_processes:
-                debug_msg('Processes have finished.')
-                return True
-            else:
-                debug_msg(f'Processes restarted with PID {matching_processes[0].info["pid"]}. Restarting tracking.')
-        else:
-            debug_msg(f'Matching processes still running: {matching_processes}')
+    sync_diag.uploadButton.clicked.connect(lambda: choose("push"))
+    sync_diag.downloadButton.clicked.connect(lambda: choose("pull"))
+    sync_diag.nosyncButton.clicked.connect(lambda: choose("skip"))
 
-        time.sleep(2)
+    sync_diag.exec_()
+    return choice[0] if choice else None
 
 
-def launch_game(profile_id):
+def notify_sync_result(profile_name, result):
+    if result.direction == "push":
+        success_message = f"Profile \"{profile_name}\" has synced to the cloud successfully."
+        failure_message = f"Profile \"{profile_name}\" has failed to sync to the cloud: {result.error}"
+    else:
+        success_message = f"Profile \"{profile_name}\" has synced the cloud save to local successfully."
+        failure_message = f"Profile \"{profile_name}\" has failed to sync the cloud save to local: {result.error}"
+
+    if result.success:
+        debug_msg(f"Sync {result.direction} successful.")
+        send_notification(success_message)
+    else:
+        debug_msg(f"Sync {result.direction} failed: {result.error}")
+        send_notification(failure_message)
+
+
+def launch_game(profile_id, session=None):
     debug_msg("Launching game...")
-    cloud_storage_path = io_global("read", "config", "cloud_storage_path")
-    profile_data = io_profile("read", profile_id, "profile")
+    if session is None:
+        session = SyncSession(profile_id)
+    profile_data = session.profile
     profile_name = profile_data.get("name")
     game_executable = profile_data.get("game_executable")
 
     debug_msg(f"Profile name: {profile_name}, Game executable: {game_executable}")
 
     game_filename = os.path.basename(game_executable)
-    process_names = io_go("read", game_filename, "process_name")
-    process_names = [game_filename] + (process_names if process_names else [])
+    override_names = io_go("read", game_filename, "process_name") or []
+    chain_names = [game_filename] + override_names
 
-    debug_msg(f"Process names: {process_names}")
+    # Override names seen inside the launcher's own tree last time are tracked by the tree, not by name
+    process_tree = io_go("read", game_filename, "process_tree") or []
+    handoff_names = [name for name in chain_names if not name_observed(name, process_tree)] if override_names else []
+
+    debug_msg(f"Handoff process names: {handoff_names}")
 
     if not check_permissions(game_executable, 'game executable', "execute"):
         return
 
-    game_process = subprocess.Popen(game_executable)
+    # The checkout must be on the share before the game starts
+    with startup.phase("share write: checkout"):
+        session.wait_for_write()
+
+    subreaper = become_subreaper()
+    with startup.phase("game spawn"):
+        game_process = subprocess.Popen(game_executable)
+    startup.write_report()
 
     debug_msg("Game process started.")
     
     if io_go("read", game_filename, "process_tracking") == False:
         debug_msg("Process tracking disabled. Opening upload dialog.")
+        session.close()
         upload_dialog(profile_id)
         sys.exit()
 
-    if wait_for_process_to_finish(process_names):
+    tracker = ProcessTracker(debug_msg, chain_names)
+    with span("wait for game", "process", executable=game_filename):
+        game_finished = tracker.wait_for_game(game_process, handoff_names, subreaper)
+    if game_finished:
         debug_msg("Game process has finished.")
+        if override_names and len(tracker.tree_names) > 1:
+            record_process_tree(game_filename, tracker.tree_names, process_tree)
 
         def upload_and_exit():
             debug_msg("Starting cloud sync...")
-            result = copy_save_to_cloud(profile_id)
+            notify_sync_result(profile_name, run_sync_with_progress(SyncEngine(profile_id), "push"))
 
-            if result == None:
-                debug_msg("Cloud sync successful.")
-                send_notification(f"Profile \"{profile_name}\" has synced to the cloud successfully.")
-            else:
-                debug_msg(f"Cloud sync failed: {result}")
-                send_notification(f"Profile \"{profile_name}\" has failed to sync to the cloud: {result}")
-            
-            io_savetitan("write", profile_id, "profile", "checkout")
+            session.write("profile", "checkout")
+            session.close()
             sys.exit()
 
         QTimer.singleShot(0, upload_and_exit)
 
 
+# Remember which executables ran inside the launched game's tree so the next launch does not scan for them by name
+def record_process_tree(game_filename, tree_names, process_tree):
+    merged = list(process_tree)
+    for name in tree_names:
+        if not name_observed(name, merged):
+            merged.append(name)
+
+    if merged != process_tree:
+        debug_msg(f"Recording process tree for {game_filename}: {merged}")
+        io_go("write", game_filename, "process_tree", merged)
+
+
 def upload_dialog(profile_id):
     message_box = QMessageBox()
     message_box.setWindowTitle("Game in Progress")
@@ -346,7 +287,7 @@ def upload_dialog(profile_id):
     message_box.exec_()
 
     if message_box.clickedButton() == done_button:
-        copy_save_to_cloud(profile_id)
+        run_sync_with_progress(SyncEngine(profile_id), "push")
 
     io_savetitan("write", profile_id, "profile", "checkout")
 
@@ -358,6 +299,8 @@ def launch_game_without_sync(executable_path):
     if not check_permissions(executable_path, 'game executable', "execute"):
         return
 
-    subprocess.Popen(executable_path)
+    with startup.phase("game spawn"):
+        subprocess.Popen(executable_path)
+    startup.write_report()
     
     sys.exit()
\ No newline at end of file
@@ -0,0 +1,158 @@
+import socket
+
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.io import io_profile
+from modules.io import debug_msg
+
+from modules.session import SyncSession
+
+from modules.engine import SyncEngine
+from modules.engine import STATUS_CLOUD_EMPTY
+from modules.engine import STATUS_CLOUD_AHEAD
+from modules.engine import STATUS_CONFLICT
+
+from modules.trace import span
+
+sync_all_directions = ("push", "pull", "auto")
+
+# Profiles synced at once. Each profile's copies already run on the transfer worker pool, so a few profiles are
+# enough to keep a share busy without opening hundreds of files at the same time.
+default_sync_all_workers = 4
+
+
+def synced_profiles():
+    profile_fields = io_profile("read", None, "profile") or {}
+    return [(profile_id, profile_data) for profile_id, profile_data in profile_fields.items()
+            if profile_data.get("sync_mode") == "Sync"]
+
+
+def sync_outcome(profile_id, name, action, outcome, result=None, message=None):
+    return {
+        "profile_id": profile_id,
+        "name": name,
+        "action": action,
+        "outcome": outcome,
+        "message": message if message is not None else (result.error if result is not None else None),
+        "files_copied": result.files_copied if result is not None else 0,
+        "files_deleted": result.files_deleted if result is not None else 0,
+        "bytes_copied": result.bytes_copied if result is not None else 0,
+        "elapsed": result.elapsed if result is not None else 0.0,
+    }
+
+
+# The direction a profile is synced in, None when there is nothing to do. auto only moves saves when one side
+# plainly has to follow the other; a save changed on both sides is left for a launch to ask about.
+def choose_action(direction, status):
+    if direction == "push":
+        return None if status.push_plan.is_empty() else "push"
+    if direction == "pull":
+        return None if status.pull_plan.is_empty() else "pull"
+    if status.state == STATUS_CLOUD_EMPTY and not status.push_plan.is_empty():
+        return "push"
+    if status.state == STATUS_CLOUD_AHEAD:
+        return "pull"
+    return None
+
+
+# Sync one profile without any dialog. The profile is checked out to this computer for the length of the sync, the
+# same as a launch does. A profile that is already checked out is skipped: by another computer it is being played
+# there, by this one a launch from here is running or syncing. force only overrides a checkout held by this computer.
+def sync_profile(profile_id, direction, force=False):
+    session = SyncSession(profile_id)
+    name = session.profile.get("name")
+    hostname = socket.gethostname()
+    checked_out = False
+
+    with span("sync profile", profile_id=profile_id, direction=direction):
+        session.start()
+        try:
+            if not session.share_accessible():
+                return sync_outcome(profile_id, name, None, "skipped", message="Cloud path is inaccessible")
+
+            checkout = session.read("profile", "checkout")
+            if checkout and checkout != hostname:
+                return sync_outcome(profile_id, name, None, "skipped", message=f"Checked out by {checkout}")
+            if checkout and not force:
+                return sync_outcome(profile_id, name, None, "skipped",
+                                    message="Checked out by this computer, a launch may be running. Use --force to sync anyway")
+            if not checkout:
+                session.write("profile", "checkout", hostname)
+                session.flush()
+                checked_out = True
+
+            engine = SyncEngine(profile_id, session)
+            status = engine.status()
+            action = choose_action(direction, status)
+            if action is None:
+                if direction == "auto" and status.state == STATUS_CONFLICT:
+                    return sync_outcome(profile_id, name, None, "skipped",
+                                        message="Both sides changed, run with push or pull to choose")
+                return sync_outcome(profile_id, name, None, "up to date")
+
+            if action == "push":
+                result = engine.push(status.push_plan)
+            else:
+                result = engine.pull(status.pull_plan)
+            return sync_outcome(profile_id, name, action, "synced" if result.success else "failed", result)
+
+        # One profile failing in any way is reported in the summary instead of stopping the others
+        except Exception as e:
+            debug_msg(f"Sync all failed for profile {profile_id}: {e}", profile_id=profile_id)
+            return sync_outcome(profile_id, name, None, "failed", message=str(e) or type(e).__name__)
+
+        finally:
+            try:
+                if checked_out:
+                    session.write("profile", "checkout")
+                session.close()
+            except Exception as e:
+                debug_msg(f"Could not release the checkout of profile {profile_id}: {e}", profile_id=profile_id)
+
+
+# Sync every profile in Sync mode on a bounded pool and return one outcome per profile, in profile order.
+# report(outcome) is called as each profile finishes.
+def sync_all_profiles(direction="auto", workers=None, report=None, force=False):
+    if direction not in sync_all_directions:
+        raise ValueError(f"Invalid direction: {direction}. Expected one of {', '.join(sync_all_directions)}")
+
+    profiles = synced_profiles()
+    if not profiles:
+        return []
+
+    workers = max(1, min(workers or default_sync_all_workers, len(profiles)))
+    debug_msg(f"Syncing {len(profiles)} profile(s) with {workers} worker(s), direction: {direction}")
+
+    def run(profile_id):
+        outcome = sync_profile(profile_id, direction, force)
+        if report is not None:
+            report(outcome)
+        return outcome
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run, profile_id) for profile_id, profile_data in profiles]
+        return [future.result() for future in futures]
+
+
+def format_outcome(outcome):
+    detail = f" - {outcome['message']}" if outcome["message"] else ""
+    return f"{outcome['profile_id']} - {outcome['name']}: {outcome['outcome']}{detail}"
+
+
+def format_summary(outcomes):
+    name_width = max([len(str(outcome["name"])) for outcome in outcomes] + [len("Name")])
+    id_width = max([len(str(outcome["profile_id"])) for outcome in outcomes] + [len("Profile")])
+    lines = [f"{'Profile':<{id_width}}  {'Name':<{name_width}}  {'Action':<6}  {'Result':<10}  {'Files':>5}  "
+             f"{'Deleted':>7}  {'MB':>8}  {'Seconds':>7}  Message"]
+    for outcome in outcomes:
+        lines.append(f"{outcome['profile_id']:<{id_width}}  {str(outcome['name']):<{name_width}}  "
+                     f"{outcome['action'] or '-':<6}  {outcome['outcome']:<10}  {outcome['files_copied']:>5}  "
+                     f"{outcome['files_deleted']:>7}  {outcome['bytes_copied'] / (1024 * 1024):>8.1f}  "
+                     f"{outcome['elapsed']:>7.2f}  {outcome['message'] or ''}")
+
+    counts = {}
+    for outcome in outcomes:
+        counts[outcome["outcome"]] = counts.get(outcome["outcome"], 0) + 1
+    lines.append("")
+    lines.append(", ".join(f"{count} {name}" for name, count in counts.items()))
+    return "\n".join(lines)
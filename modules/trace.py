@@ -0,0 +1,157 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import functools
+import contextlib
+
+# Set to the output file to trace a run without passing --trace
+trace_env_var = "SAVETITAN_TRACE"
+
+trace_state = {"enabled": False, "trace_file": None, "memory": False, "written": False}
+trace_events = []
+trace_threads = {}
+trace_lock = threading.Lock()
+
+# Timestamps are microseconds since this module was imported, which is what the trace viewer expects
+trace_started = time.perf_counter()
+
+
+# Turn tracing on from --trace <file> [--trace-memory] or the environment variable. Read straight from argv so spans
+# in code that runs before argparse are recorded too.
+def enable_from_args(argv=None, environ=None):
+    argv = sys.argv[1:] if argv is None else argv
+    environ = os.environ if environ is None else environ
+
+    trace_file = environ.get(trace_env_var) or None
+    for index, arg in enumerate(argv):
+        if arg == "--trace" and index + 1 < len(argv):
+            trace_file = argv[index + 1]
+        elif arg.startswith("--trace="):
+            trace_file = arg.split("=", 1)[1]
+
+    if trace_file:
+        enable(trace_file, "--trace-memory" in argv)
+    return bool(trace_file)
+
+
+def enable(trace_file, memory=False):
+    trace_state["enabled"] = True
+    trace_state["trace_file"] = trace_file
+    trace_state["memory"] = memory
+    if memory:
+        import tracemalloc
+        tracemalloc.start()
+    atexit.register(write_trace)
+
+
+def tracing_enabled():
+    return trace_state["enabled"]
+
+
+def timestamp(moment):
+    return (moment - trace_started) * 1e6
+
+
+def add_event(event):
+    thread = threading.current_thread()
+    event["pid"] = os.getpid()
+    event["tid"] = thread.native_id
+    with trace_lock:
+        trace_events.append(event)
+        trace_threads[thread.native_id] = thread.name
+
+
+def memory_event(moment):
+    import tracemalloc
+    current, peak = tracemalloc.get_traced_memory()
+    add_event({"name": "memory", "ph": "C", "ts": timestamp(moment), "args": {"current": current, "peak": peak}})
+
+
+@contextlib.contextmanager
+def recorded_span(name, category, args):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        ended = time.perf_counter()
+        event = {"name": name, "cat": category, "ph": "X", "ts": timestamp(started), "dur": (ended - started) * 1e6}
+        if args:
+            event["args"] = {key: str(value) for key, value in args.items()}
+        add_event(event)
+        if trace_state["memory"]:
+            memory_event(ended)
+
+
+# Time a block as a span on the current thread. With tracing off this hands back a shared no-op context.
+def span(name, category="sync", **args):
+    if not trace_state["enabled"]:
+        return contextlib.nullcontext()
+    return recorded_span(name, category, args)
+
+
+# Record every call of a function as a span named after it, with the first positional arguments attached.
+# With tracing off the wrapper only checks the flag before calling through.
+def traced(category, arg_count=3):
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not trace_state["enabled"]:
+                return func(*args, **kwargs)
+            args_shown = {f"arg{index}": value for index, value in enumerate(args[:arg_count])}
+            with recorded_span(func.__name__, category, args_shown):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# Wrap a per-item worker function so each item gets its own span on the worker thread that ran it. Tuple items are
+# labelled by their first element, the relative path in every caller.
+def traced_items(func, name, category="transfer"):
+    if not trace_state["enabled"]:
+        return func
+
+    def run_item(item):
+        label = item[0] if isinstance(item, tuple) else item
+        with recorded_span(name, category, {"item": label}):
+            return func(item)
+
+    return run_item
+
+
+# Write everything recorded so far as Chrome trace-event JSON, which Perfetto and chrome://tracing open directly.
+# Called once at exit.
+def write_trace():
+    if not trace_state["enabled"] or trace_state["written"]:
+        return None
+    trace_state["written"] = True
+
+    with trace_lock:
+        events = list(trace_events)
+        threads = dict(trace_threads)
+
+    pid = os.getpid()
+    metadata = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "SaveTitan"}}]
+    metadata += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                 for tid, name in threads.items()]
+
+    other_data = {"argv": sys.argv, "platform": sys.platform, "python": sys.version.split()[0]}
+    if trace_state["memory"]:
+        import tracemalloc
+        current, peak = tracemalloc.get_traced_memory()
+        other_data["memory_peak"] = peak
+        print(f"Peak traced memory: {peak / (1024 * 1024):.1f} MB", file=sys.stderr)
+
+    trace_file = trace_state["trace_file"]
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(trace_file)), exist_ok=True)
+        with open(trace_file, 'w') as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms", "otherData": other_data}, f)
+    except OSError as e:
+        print(f"Could not write the trace to {trace_file}: {e}", file=sys.stderr)
+        return None
+
+    print(f"Trace with {len(events)} events written to {trace_file}", file=sys.stderr)
+    return trace_file
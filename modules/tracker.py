@@ -0,0 +1,223 @@
+import os
+import sys
+import time
+import select
+import ctypes
+import psutil
+
+# prctl option that makes orphaned descendants re-parent to this process instead of init (Linux 3.4+)
+PR_SET_CHILD_SUBREAPER = 36
+
+# Descendants are re-read quickly while the tree is changing and less often once it settles
+min_refresh_interval = 0.25
+max_refresh_interval = 5
+# How long to look for a handoff process once the launched game has exited. The window is never extended; a handoff
+# process that starts the next one before exiting is still found, by the scan made straight after it exits.
+handoff_window = 1
+handoff_scan_interval = 0.2
+
+
+# Make this process the subreaper for everything it launches, so a launcher's grandchildren can still be waited on
+# after the launcher itself exits. Must be called before the game is started.
+def become_subreaper():
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        return libc.prctl(PR_SET_CHILD_SUBREAPER, 1, 0, 0, 0) == 0
+    except (OSError, AttributeError):
+        return False
+
+
+# Find running processes by executable name, used only for launchers that hand the game off outside their own tree
+def find_processes_by_name(process_names):
+    wanted = {name.lower() for name in process_names}
+    processes = []
+    for proc in psutil.process_iter(['name', 'pid', 'status']):
+        name = proc.info['name']
+        if name and name.lower() in wanted and proc.info['status'] != psutil.STATUS_ZOMBIE:
+            processes.append((proc.info['pid'], name))
+    return processes
+
+
+# Linux truncates process names to 15 characters, so a truncated observed name matches by prefix
+def name_observed(name, observed_names):
+    name = name.lower()
+    for observed in observed_names:
+        observed = observed.lower()
+        if name == observed or (len(observed) == 15 and name.startswith(observed)):
+            return True
+    return False
+
+
+def process_name(pid):
+    try:
+        return psutil.Process(pid).name()
+    except psutil.Error:
+        return None
+
+
+# Collect exited children of this process. As a subreaper it inherits every orphan the game leaves behind, and those
+# would otherwise stay zombies until SaveTitan exits.
+def reap_children():
+    while True:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+
+
+# Follows a launched game and its handoff chain by PID. The chain is the game's executable plus its process_name
+# overrides: descendants with one of those names are waited on and remembered, so later launches know which of them run
+# inside the game's own tree. Any other descendant, like an updater, a launcher's helper or wineserver, is ignored.
+class ProcessTracker:
+    def __init__(self, debug_msg, chain_names=None):
+        self.debug_msg = debug_msg
+        self.chain_names = list(chain_names or [])
+        self.tree_names = []
+        self.handoff_names = []
+
+    def observe(self, name, names):
+        if name and name.lower() not in map(str.lower, names):
+            names.append(name)
+
+    def in_chain(self, name):
+        return bool(name) and any(name_observed(chain_name, [name]) for chain_name in self.chain_names)
+
+    # Block until one of pids exits or timeout seconds pass, and return the pids that exited. A pidfd becomes readable
+    # when its process exits, so this sleeps in the kernel; psutil.wait_procs is used where pidfds are not available.
+    def wait_for_exits(self, pids, timeout=None):
+        if hasattr(os, "pidfd_open"):
+            pidfds = {}
+            exited = set()
+            for pid in pids:
+                try:
+                    pidfds[os.pidfd_open(pid)] = pid
+                except ProcessLookupError:
+                    exited.add(pid)
+
+            try:
+                if pidfds and not exited:
+                    poller = select.poll()
+                    for pidfd in pidfds:
+                        poller.register(pidfd, select.POLLIN)
+                    events = poller.poll(None if timeout is None else int(timeout * 1000))
+                    exited.update(pidfds[pidfd] for pidfd, event in events)
+            finally:
+                for pidfd in pidfds:
+                    os.close(pidfd)
+            return exited
+
+        procs = []
+        exited = set()
+        for pid in pids:
+            try:
+                procs.append(psutil.Process(pid))
+            except psutil.NoSuchProcess:
+                exited.add(pid)
+        if procs and not exited:
+            gone, alive = psutil.wait_procs(procs, timeout=max_refresh_interval if timeout is None else timeout)
+            exited.update(proc.pid for proc in gone)
+        return exited
+
+    # Wait on processes this process did not start until all of them have exited
+    def wait_for_pids(self, pids):
+        pids = set(pids)
+        while pids:
+            for pid in self.wait_for_exits(pids):
+                self.debug_msg(f"Process {pid} exited.")
+                pids.discard(pid)
+
+    # Descendants of the launched game. A subreaper inherits the game's orphans, so they are all its own descendants.
+    # Otherwise the processes seen so far are re-read, and when one exits the process table is scanned once for its
+    # orphans, which keep their parent's PID on Windows.
+    def descendants(self, known, subreaper):
+        if subreaper:
+            try:
+                return psutil.Process(os.getpid()).children(recursive=True)
+            except psutil.Error:
+                return []
+
+        found = []
+        exited = set()
+        for pid, proc in list(known.items()):
+            if proc is None:
+                continue
+            try:
+                found.extend(proc.children(recursive=True))
+            except psutil.NoSuchProcess:
+                known[pid] = None
+                exited.add(pid)
+        if exited:
+            found.extend(proc for proc in psutil.process_iter(['ppid']) if proc.info['ppid'] in exited)
+        return found
+
+    # Wait until the launched process and every descendant in its handoff chain have exited. Each exit wakes the wait
+    # straight away; descendants are re-read on a backing-off interval, and once more after every exit so a handoff
+    # started just before its parent exited is not missed.
+    def wait_for_tree(self, root_pid, subreaper=False):
+        try:
+            known = {root_pid: psutil.Process(root_pid)}
+        except psutil.NoSuchProcess:
+            return
+        self.observe(process_name(root_pid), self.tree_names)
+
+        waiting = {root_pid}
+        interval = min_refresh_interval
+        while True:
+            found = False
+            for proc in self.descendants(known, subreaper):
+                if proc.pid in known:
+                    continue
+                known[proc.pid] = proc
+                name = process_name(proc.pid)
+                if self.in_chain(name):
+                    self.debug_msg(f"Tracking {name} (PID {proc.pid}) in the game's process tree.")
+                    self.observe(name, self.tree_names)
+                    waiting.add(proc.pid)
+                    found = True
+
+            if not waiting:
+                return
+
+            gone = self.wait_for_exits(waiting, interval)
+            for pid in gone:
+                self.debug_msg(f"Process {pid} exited.")
+                waiting.discard(pid)
+            if subreaper:
+                reap_children()
+
+            interval = min_refresh_interval if found or gone else min(interval * 2, max_refresh_interval)
+
+    # Look for handoff processes for a short, fixed window and wait on any that appear. After each handoff exits the
+    # names are scanned again at once, so a chain of handoffs is followed to its end.
+    def wait_for_handoff(self, process_names):
+        deadline = time.monotonic() + handoff_window
+        while True:
+            processes = find_processes_by_name(process_names)
+            if processes:
+                self.debug_msg(f"Launcher handed off to {processes}. Tracking them.")
+                for pid, name in processes:
+                    self.observe(name, self.handoff_names)
+                self.wait_for_pids([pid for pid, name in processes])
+                continue
+            if time.monotonic() >= deadline:
+                return
+            time.sleep(handoff_scan_interval)
+
+    # Wait for a launched game to finish: the game and its handoff chain by PID first, then, only when the game has
+    # process_name overrides, any handoff processes that were not seen inside its tree. subreaper should be the result
+    # of become_subreaper() called before the game was started.
+    def wait_for_game(self, game_process, handoff_names, subreaper=False):
+        self.debug_msg(f"Waiting on PID {game_process.pid} and its handoff chain {self.chain_names}.")
+        self.wait_for_tree(game_process.pid, subreaper)
+        game_process.poll()
+
+        self.debug_msg(f"Observed process tree: {self.tree_names}")
+
+        if handoff_names:
+            self.wait_for_handoff(handoff_names)
+
+        return True
@@ -0,0 +1,92 @@
+import os
+import json
+import tempfile
+
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.trace import traced_items
+
+default_transfer_workers = 4
+
+# mkstemp makes its files private to this user, written files are given the mode a plain open() would have
+process_umask = os.umask(0)
+os.umask(process_umask)
+
+
+# Run func over every item on a worker pool, collecting per-item errors instead of stopping at the first one. Any
+# exception is collected, so a bug in one file's copy still leaves the caller to record the files that did copy.
+# When tracing, each item is a span called name, or the function's name.
+def run_parallel(func, items, workers, name=None):
+    func = traced_items(func, name or func.__name__)
+    results = []
+    errors = []
+
+    if workers <= 1 or len(items) <= 1:
+        for item in items:
+            try:
+                results.append(func(item))
+            except Exception as e:
+                errors.append((item, e))
+        return results, errors
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [(item, executor.submit(func, item)) for item in items]
+        for item, future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                errors.append((item, e))
+    return results, errors
+
+
+# Write a text file through a temp file so readers never see it half written. Each writer gets its own temp file, so
+# two threads, or two computers on the share, writing the same file never publish each other's partial file.
+def write_text_atomic(path, text, encoding=None):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        with open(temp_path, 'w', encoding=encoding) as f:
+            f.write(text)
+        if os.path.exists(path):
+            os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+        else:
+            os.chmod(temp_path, 0o666 & ~process_umask)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_json_atomic(path, data):
+    write_text_atomic(path, json.dumps(data))
+
+
+# Create the parent directories for a set of files in sorted order before any worker writes into them
+def make_parent_dirs(file_paths):
+    for directory in sorted({os.path.dirname(str(file_path)) for file_path in file_paths}):
+        os.makedirs(directory, exist_ok=True)
+
+
+# Raised in place of copying a file once a sync has been cancelled. run_parallel collects it like any other failed
+# file, so the files that did copy are still recorded.
+class SyncCancelled(OSError):
+    pass
+
+
+def sync_was_cancelled(errors):
+    return any(isinstance(error, SyncCancelled) for item, error in errors)
+
+
+def transfer_error_message(errors):
+    if not errors:
+        return None
+    cancelled = [item for item, error in errors if isinstance(error, SyncCancelled)]
+    if len(cancelled) == len(errors):
+        return f"Sync cancelled with {len(cancelled)} file(s) left to copy"
+    failed = [(item, error) for item, error in errors if not isinstance(error, SyncCancelled)]
+    item, error = failed[0]
+    return f"{len(failed)} file(s) failed to sync. First error on {item}: {str(error) or type(error).__name__}"
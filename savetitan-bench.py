@@ -0,0 +1,102 @@
+import os
+import argparse
+import sys
+import shutil
+import tempfile
+
+import modules.paths as paths
+
+# Parse command-line arguments
+parser = argparse.ArgumentParser(description="Time SaveTitan's sync paths against synthetic save folders")
+
+parser.add_argument("--shapes", help="Comma separated save layouts to run: tiny, huge, deep, omitted (default: all)")
+parser.add_argument("--scale", type=float, default=1.0, help="Multiply every file count and size by this")
+parser.add_argument("--repeat", type=int, default=3, help="Runs per layout, the median is reported")
+parser.add_argument("--layout", choices=['folder', 'chunked'], default='folder', help="Cloud storage layout to benchmark")
+parser.add_argument("--no-slots", dest="no_slots", action='store_true', help="Skip the save slot switching scenario")
+parser.add_argument("--share-sim", dest="share_sim", help="Simulate a slow cloud share: a preset (lan, wifi, vpn) or settings such as latency_ms=40,jitter_ms=10,bandwidth_mb_s=5")
+parser.add_argument("--forms", action='store_true', help="Also time loading every dialog with uic.loadUi against the compiled form cache")
+parser.add_argument("--output", help="Write the results as JSON to this file")
+parser.add_argument("--baseline", help="Compare the results against a JSON file written by an earlier run")
+parser.add_argument("--compare", nargs=2, metavar=('BASELINE', 'CURRENT'), help="Compare two saved results files without running anything")
+parser.add_argument("--threshold", type=float, default=0.10, help="Slowdown counted as a regression, 0.10 is 10%%")
+parser.add_argument("--work-dir", dest="work_dir", help="Folder for the synthetic saves, config and caches (default: a temporary folder)")
+parser.add_argument("--keep", action='store_true', help="Keep the work folder afterwards")
+
+args = parser.parse_args()
+
+work_dir = args.work_dir or tempfile.mkdtemp(prefix="savetitan-bench-")
+os.makedirs(work_dir, exist_ok=True)
+
+# Config, profiles, caches and logs all go to the work folder so a real setup is never touched. This has to happen
+# before anything imports modules.io, which reads these paths once.
+paths.user_config_file = os.path.join(work_dir, "user")
+paths.global_config_file = os.path.join(work_dir, "global.json")
+paths.game_overrides_config_file = os.path.join(work_dir, "game_overrides.json")
+if not os.path.exists(paths.global_config_file):
+    with open(paths.global_config_file, 'w') as f:
+        f.write("{}")
+
+from modules.benchmark import run_suite
+from modules.benchmark import tree_shapes
+from modules.benchmark import compare_results
+from modules.benchmark import format_results
+from modules.benchmark import format_comparison
+from modules.benchmark import load_results
+from modules.benchmark import save_results
+
+from modules.sharesim import parse_share_settings
+from modules.sharesim import install_share_simulator
+from modules.sharesim import share_sim_env_var
+
+
+def report_comparison(baseline, current):
+    rows = compare_results(baseline, current, args.threshold)
+    print(format_comparison(rows))
+    regressions = [row for row in rows if row[4]]
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+        return 1
+    print("No regressions")
+    return 0
+
+
+if args.compare:
+    sys.exit(report_comparison(load_results(args.compare[0]), load_results(args.compare[1])))
+
+shape_names = args.shapes.split(",") if args.shapes else list(tree_shapes)
+unknown_shapes = [name for name in shape_names if name not in tree_shapes]
+if unknown_shapes:
+    print(f"Unknown layout(s): {', '.join(unknown_shapes)}. Choose from {', '.join(tree_shapes)}")
+    sys.exit(1)
+
+# The cloud folders are added to the simulated share as each run creates them
+share_settings = parse_share_settings(args.share_sim or os.environ.get(share_sim_env_var))
+if share_settings:
+    install_share_simulator(cloud_storage_path="", settings=share_settings)
+
+# Building dialogs needs an application object, the offscreen platform lets that run without a display
+app = None
+if args.forms:
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication([])
+
+try:
+    results = run_suite(os.path.join(work_dir, "runs"), shape_names, args.scale, args.repeat, layout=args.layout,
+                        include_slots=not args.no_slots, include_forms=args.forms, report=print)
+finally:
+    if not args.keep and not args.work_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+print(format_results(results))
+
+if args.output:
+    save_results(args.output, results)
+    print(f"Results written to {args.output}")
+
+exit_code = 0
+if args.baseline:
+    exit_code = report_comparison(load_results(args.baseline), results)
+
+sys.exit(exit_code)
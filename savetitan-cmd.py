@@ -1,18 +1,15 @@
 import os
 import argparse
 import sys
+import atexit
 
-from PyQt5.QtWidgets import QApplication, QDialog, QLabel, QCheckBox, QPushButton, QVBoxLayout
-from PyQt5.QtCore import Qt
+# Imported first so --profile-startup and --trace can time every import that follows
+import modules.trace as trace
+trace.enable_from_args()
 
-from modules.io import io_profile
-from modules.io import io_global
-from modules.io import io_go
-
-from modules.sync import check_and_sync_saves
-from modules.sync import upload_dialog
-
-from components.config_dialog import show_config_dialog
+import modules.startup as startup
+startup.enable_from_args()
+atexit.register(startup.write_report)
 
 import modules.paths as paths
 script_dir = paths.script_dir
@@ -21,47 +18,136 @@ global_config_file = paths.global_config_file
 game_overrides_config_file = paths.game_overrides_config_file
 python_exe_path = paths.python_exe_path
 
-with open('debug.log', 'w'):
-    pass
 
+def list_profiles(as_json):
+    from modules.io import io_profile
 
-class RiskWarningDialog(QDialog):
-    def __init__(self, parent=None):
-        super().__init__(parent)
+    profile_fields = io_profile("read", None, "profile")
+    if as_json:
+        import json
+        profiles = [dict(profile_data, profile_id=profile_id) for profile_id, profile_data in profile_fields.items()]
+        print(json.dumps(profiles, indent=2))
+    elif not profile_fields:
+        print("No profiles found in profiles.ini")
+    else:
+        for profile_id, profile_data in profile_fields.items():
+            name = profile_data.get('name')
+            save_slot = profile_data.get('save_slot')
+            print(f"{profile_id} - {name} - Save Slot: {save_slot}")
 
-        self.setWindowTitle("Unstable Build Warning")
-        self.setFixedSize(400, 150)
 
-        self.label = QLabel("This is an unstable build of the program which is likely to be broken in many ways. Use at your own risk and always make personal backups of everything you point this at.", self)
-        self.label.setWordWrap(True)
+def edit_game_overrides(args):
+    from modules.io import io_go
 
-        self.checkbox = QCheckBox("I acknowledge the risk", self)
-        self.checkbox.stateChanged.connect(self.on_checkbox_state_changed)
+    read_write_mode = 'read' if args.go_modifier == 'list' else 'write'
+    if args.go_field in ['process_tracking', 'process_name']:
+        if args.go_field == 'process_tracking':
+            if args.go_value.lower() not in ['true', 'false']:
+                print("Invalid value for 'process_tracking'. It should be either 'true' or 'false'.")
+            else:
+                io_go(read_write_mode, args.executable_name, args.go_field, args.go_value)
+        elif args.go_field == 'process_name':
+            io_go(read_write_mode, args.executable_name, args.go_field, args.go_value, args.go_modifier)
 
-        self.ok_button = QPushButton("OK", self)
-        self.ok_button.setEnabled(False)
-        self.ok_button.clicked.connect(self.accept)
 
-        layout = QVBoxLayout(self)
-        layout.addWidget(self.label)
-        layout.addWidget(self.checkbox)
-        layout.addWidget(self.ok_button)
+def list_backups(args):
+    from modules.io import list_backup_copies
 
-    def on_checkbox_state_changed(self, state):
-        self.ok_button.setEnabled(state == Qt.Checked)
+    which_side = f"{args.side}_backup"
+    backups = list_backup_copies(args.list_backups, which_side)
+    if not backups:
+        print("No backups found for this profile.")
+    for backup_name in backups:
+        print(backup_name)
 
-    def closeEvent(self, event):
-        sys.exit(1)
 
+def restore_backup(args):
+    from modules.io import io_profile
+    from modules.io import restore_backup_copy
 
-def show_risk_warning_if_needed():
-    risk_acknowledged = io_global("read", "config", "risk_acknowledged")
-    if risk_acknowledged is not None:
+    if not io_profile("read", args.restore, "profile"):
+        print("Profile ID not found. Aborting.")
         return
+    result = restore_backup_copy(args.restore, f"{args.side}_backup", args.backup)
+    if result is None:
+        print(f"Restored the {args.side} save for profile {args.restore}.")
+    else:
+        print(f"Restore failed: {result}")
 
-    dialog = RiskWarningDialog()
-    if dialog.exec() == QDialog.Accepted:
-        io_global("write", "config", "risk_acknowledged", "1")
+
+# Percentiles of sync duration and throughput for a profile, from this computer's history and the recent syncs of
+# every computer kept in profile_info.savetitan
+def show_stats(args):
+    from modules.io import io_profile
+    from modules.io import io_global
+    from modules.history import load_local_history
+    from modules.history import load_cloud_history
+    from modules.history import merge_history
+    from modules.history import history_stats
+    from modules.history import format_stats
+
+    profile_id = args.stats
+    profile_fields = io_profile("read", profile_id, "profile")
+    if not profile_fields:
+        profile_id_list = io_profile("read", None, "profile", "name", args.stats)
+        if len(profile_id_list) != 1:
+            print("Profile not found, or more than one profile has that name. Use the profile ID.")
+            return
+        profile_id = profile_id_list[0]
+        profile_fields = io_profile("read", profile_id, "profile")
+
+    cloud_records = []
+    cloud_storage_path = io_global("read", "config", "cloud_storage_path")
+    if cloud_storage_path:
+        try:
+            cloud_records = load_cloud_history(os.path.join(cloud_storage_path, profile_id, "profile_info.savetitan"))
+        except (OSError, ValueError) as e:
+            print(f"Could not read the cloud sync history, showing this computer's only: {e}", file=sys.stderr)
+
+    records = merge_history(load_local_history(profile_id), cloud_records)
+    stats = history_stats(records)
+
+    if args.json:
+        import json
+        print(json.dumps(dict(stats, profile_id=profile_id, records=len(records)), indent=2))
+    elif not records:
+        print(f"No syncs recorded for \"{profile_fields.get('name')}\" ({profile_id}) yet.")
+    else:
+        print(f"Sync history for \"{profile_fields.get('name')}\" ({profile_id}): {len(records)} sync(s)")
+        print(format_stats(stats))
+
+
+# Push, pull or bring up to date every profile in Sync mode at once, without any dialogs
+def sync_all(args):
+    from modules.sharesim import install_share_simulator
+    from modules.syncall import sync_all_profiles
+    from modules.syncall import format_outcome
+    from modules.syncall import format_summary
+
+    install_share_simulator()
+
+    report = None if args.json else lambda outcome: print(format_outcome(outcome), flush=True)
+    outcomes = sync_all_profiles(args.sync_all, args.jobs, report, args.force)
+
+    if args.json:
+        import json
+        print(json.dumps(outcomes, indent=2))
+    elif not outcomes:
+        print("No profiles are set to Sync.")
+    else:
+        print()
+        print(format_summary(outcomes))
+    return 1 if any(outcome["outcome"] == "failed" for outcome in outcomes) else 0
+
+
+def set_debug(args):
+    from modules.io import io_global
+
+    io_global("write", "config", "debug", args.debug)
+    if args.debug == "enable":
+        print('Debug print messages set to enabled')
+    elif args.debug == "disable":
+        print('Debug print messages set to disabled')
 
 
 # Parse command-line arguments
@@ -70,9 +156,25 @@ parser = argparse.ArgumentParser()
 parser.add_argument("--runprofile", help="Specify the game profile name to be used")
 parser.add_argument("--runid", help="Specify the profile ID to be used")
 parser.add_argument("--list", action='store_true', help="List all profiles in profiles.ini")
+parser.add_argument("--json", action='store_true', help="With --list, --stats or --sync-all, print JSON")
 parser.add_argument('--upload')
 parser.add_argument('--go', action='store_true', help='Command line config editor for io_go')
 parser.add_argument("--debug", help="Enable or disable debug mode", choices=['enable', 'disable'])
+parser.add_argument("--list-backups", dest="list_backups", help="List the save backups of the specified profile ID")
+parser.add_argument("--restore", help="Restore a save backup for the specified profile ID")
+parser.add_argument("--sync-all", dest="sync_all", nargs='?', const='auto', choices=['push', 'pull', 'auto'],
+                    help="Sync every profile in Sync mode at once: push, pull, or auto to only sync profiles where one side is plainly behind (default)")
+parser.add_argument("--jobs", type=int, help="With --sync-all, the number of profiles synced at the same time (default: 4)")
+parser.add_argument("--force", action='store_true', help="With --sync-all, also sync profiles checked out by this computer")
+parser.add_argument("--stats", help="Show sync duration and throughput percentiles for the specified profile ID or name")
+parser.add_argument("--profile-startup", dest="profile_startup", nargs='?', const='', metavar='FILE',
+                    help=f"Time each launch phase, print a table and write it as JSON (or set {startup.startup_env_var})")
+parser.add_argument("--trace", metavar='FILE', help=f"Write the phases of this run as Chrome trace-event JSON for Perfetto (or set {trace.trace_env_var})")
+parser.add_argument("--trace-memory", dest="trace_memory", action='store_true', help="With --trace, also record memory use with tracemalloc and report the peak")
+
+backup_group = parser.add_argument_group('backup arguments')
+backup_group.add_argument('--backup', help='Backup name to restore (defaults to the latest)')
+backup_group.add_argument('--side', choices=['cloud', 'local'], default='cloud', help='Restore the cloud save slot or the local save folder')
 
 go_group = parser.add_argument_group('go arguments')
 go_group.add_argument('--executable_name', help='Executable Name')
@@ -82,28 +184,67 @@ go_group.add_argument('--go_value', help='Go Value', nargs='?', default=None)
 
 args = parser.parse_args()
 
-QApplication.setAttribute(Qt.AA_EnableHighDpiScaling)
+# Subcommands that only read or write config files run without loading Qt or any dialog
+# JSON output is meant for scripts, so it exits 0 on success
+if args.list:
+    list_profiles(args.json)
+    sys.exit(0 if args.json else 1)
+
+if not (args.runprofile or args.runid or args.upload):
+    if args.go:
+        edit_game_overrides(args)
+        sys.exit(1)
+    elif args.list_backups:
+        list_backups(args)
+        sys.exit(1)
+    elif args.restore:
+        restore_backup(args)
+        sys.exit(1)
+    elif args.stats:
+        show_stats(args)
+        sys.exit(1)
+    elif args.sync_all:
+        sys.exit(sync_all(args))
+    elif args.debug:
+        set_debug(args)
+        sys.exit(1)
 
-app = QApplication([])
+with startup.phase("import PyQt5"):
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5.QtCore import Qt
 
-profile_data = None
+with startup.phase("import modules.io"):
+    from modules.io import io_profile
+    from modules.io import io_global
 
-cloud_storage_path = io_global("read", "config", "cloud_storage_path")
+with startup.phase("import modules.session"):
+    from modules.session import start_session
 
-if args.list:
-    profile_fields = io_profile("read", None, "profile")
-    if profile_fields is None:
-        print("No profiles found in profiles.ini")
-        sys.exit(1)
-    else:
-        for profile_id, profile_data in profile_fields.items():
-            name = profile_data.get('name')
-            save_slot = profile_data.get('save_slot')
-            print(f"{profile_id} - {name} - Save Slot: {save_slot}")
-        sys.exit(1)
+with startup.phase("import modules.sync"):
+    from modules.sync import check_and_sync_saves
+    from modules.sync import upload_dialog
+
+with startup.phase("import components.risk_warning"):
+    from components.risk_warning import show_risk_warning_if_needed
 
-elif args.runprofile:
-    profile_id_list = io_profile("read", None, "profile", "name", args.runprofile)
+from modules.sharesim import install_share_simulator
+
+# Only does anything when a slow share simulation is configured for testing
+install_share_simulator()
+
+with startup.phase("QApplication"):
+    QApplication.setAttribute(Qt.AA_EnableHighDpiScaling)
+
+    app = QApplication([])
+
+profile_data = None
+
+with startup.phase("config read: global.json"):
+    cloud_storage_path = io_global("read", "config", "cloud_storage_path")
+
+if args.runprofile:
+    with startup.phase("config read: profile lookup"):
+        profile_id_list = io_profile("read", None, "profile", "name", args.runprofile)
     if len(profile_id_list) > 1:
         print("Conflict: There are multiple profiles with the same name. Aborting.")
         sys.exit(1)
@@ -114,19 +255,28 @@ elif args.runprofile:
     if not profile_id:
         print("The specified game profile does not exist in profiles.ini")
         sys.exit(1)
+    with startup.phase("session start"):
+        session = start_session(profile_id)
     show_risk_warning_if_needed()
     app.setQuitOnLastWindowClosed(False)
-    check_and_sync_saves(profile_id)
+    check_and_sync_saves(profile_id, session=session)
     
 elif args.runid:
     if not cloud_storage_path:
         print("Cloud storage path is not configured. Run the script without a parameter to run the first-time setup")
         sys.exit(1)
-    if not os.path.exists(cloud_storage_path):
+    profile_id = args.runid
+
+    # The share is probed on the session's threads alongside the local scan instead of before it
+    with startup.phase("session start"):
+        session = start_session(profile_id)
+    with startup.phase("share check: wait"):
+        share_exists = session.share_accessible()
+    if not share_exists:
         print("Cloud storage path is invalid. Run the configuration tool to fix.")
         sys.exit(1)
-    profile_id = args.runid
-    profile_fields = io_profile("read", profile_id)
+    with startup.phase("config read: profile"):
+        profile_fields = io_profile("read", profile_id)
     if not profile_fields:
         print("Profile ID not found. Aborting.")
         sys.exit(1)
@@ -142,19 +292,7 @@ elif args.runid:
 
     show_risk_warning_if_needed()
     app.setQuitOnLastWindowClosed(False)
-    check_and_sync_saves(profile_id)
-
-elif args.go:
-    read_write_mode = 'read' if args.go_modifier == 'list' else 'write'
-    if args.go_field in ['process_tracking', 'process_name']:
-        if args.go_field == 'process_tracking':
-            if args.go_value.lower() not in ['true', 'false']:
-                print("Invalid value for 'process_tracking'. It should be either 'true' or 'false'.")
-            else:
-                io_go(read_write_mode, args.executable_name, args.go_field, args.go_value)
-        elif args.go_field == 'process_name':
-            io_go(read_write_mode, args.executable_name, args.go_field, args.go_value, args.go_modifier)
-    sys.exit(1)
+    check_and_sync_saves(profile_id, session=session)
 
 elif args.upload:
     if args.upload:
@@ -164,12 +302,4 @@ elif args.upload:
         print("Error: -upload requires a profile ID")
         sys.exit(1)
 
-elif args.debug:
-    io_global("write", "config", "debug", args.debug)
-    if args.debug == "enable":
-        print('Debug print messages set to enabled')
-    elif args.debug == "disable":
-        print('Debug print messages set to disabled')
-    sys.exit(1)
-
 sys.exit(1)
\ No newline at end of file
@@ -1,18 +1,34 @@
 import os
 import argparse
 import sys
+import atexit
 
-from PyQt5.QtWidgets import QApplication, QDialog, QLabel, QCheckBox, QPushButton, QVBoxLayout
-from PyQt5.QtCore import Qt
+# Desktop shortcuts launch through this script too, so it honours --profile-startup and --trace the same way
+# savetitan-cmd.py does
+import modules.trace as trace
+trace.enable_from_args()
+
+import modules.startup as startup
+startup.enable_from_args()
+atexit.register(startup.write_report)
+
+with startup.phase("import PyQt5"):
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5.QtCore import Qt
 
 from modules.io import io_profile
 from modules.io import io_global
 from modules.io import io_go
 
+from modules.session import start_session
+
 from modules.sync import check_and_sync_saves
 from modules.sync import upload_dialog
 
 from components.config_dialog import show_config_dialog
+from components.risk_warning import show_risk_warning_if_needed
+
+from modules.sharesim import install_share_simulator
 
 import modules.paths as paths
 script_dir = paths.script_dir
@@ -21,60 +37,26 @@ global_config_file = paths.global_config_file
 game_overrides_config_file = paths.game_overrides_config_file
 python_exe_path = paths.python_exe_path
 
-with open('debug.log', 'w'):
-    pass
-
-
-class RiskWarningDialog(QDialog):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-
-        self.setWindowTitle("Unstable Build Warning")
-        self.setFixedSize(400, 150)
-
-        self.label = QLabel("This is an unstable build of the program which is likely to be broken in many ways. Use at your own risk and always make personal backups of everything you point this at.", self)
-        self.label.setWordWrap(True)
-
-        self.checkbox = QCheckBox("I acknowledge the risk", self)
-        self.checkbox.stateChanged.connect(self.on_checkbox_state_changed)
-
-        self.ok_button = QPushButton("OK", self)
-        self.ok_button.setEnabled(False)
-        self.ok_button.clicked.connect(self.accept)
-
-        layout = QVBoxLayout(self)
-        layout.addWidget(self.label)
-        layout.addWidget(self.checkbox)
-        layout.addWidget(self.ok_button)
-
-    def on_checkbox_state_changed(self, state):
-        self.ok_button.setEnabled(state == Qt.Checked)
-
-    def closeEvent(self, event):
-        sys.exit(1)
-
-
-def show_risk_warning_if_needed():
-    risk_acknowledged = io_global("read", "config", "risk_acknowledged")
-    if risk_acknowledged is not None:
-        return
-
-    dialog = RiskWarningDialog()
-    if dialog.exec() == QDialog.Accepted:
-        io_global("write", "config", "risk_acknowledged", "1")
-
 
 # Parse command-line arguments
 parser = argparse.ArgumentParser()
 
 parser.add_argument("--runprofile", help="Specify the game profile name to be used")
 parser.add_argument("--runid", help="Specify the profile ID to be used")
+parser.add_argument("--profile-startup", dest="profile_startup", nargs='?', const='', metavar='FILE',
+                    help=f"Time each launch phase and write it as JSON (or set {startup.startup_env_var})")
+parser.add_argument("--trace", metavar='FILE', help=f"Write the phases of this run as Chrome trace-event JSON (or set {trace.trace_env_var})")
+parser.add_argument("--trace-memory", dest="trace_memory", action='store_true', help="With --trace, also record memory use with tracemalloc")
 
 args = parser.parse_args()
 
-QApplication.setAttribute(Qt.AA_EnableHighDpiScaling)
+with startup.phase("QApplication"):
+    QApplication.setAttribute(Qt.AA_EnableHighDpiScaling)
+
+    app = QApplication([])
 
-app = QApplication([])
+# Only does anything when a slow share simulation is configured for testing
+install_share_simulator()
 
 profile_data = None
 
@@ -92,18 +74,22 @@ if args.runprofile:
     if not profile_id:
         print("The specified game profile does not exist in profiles.ini")
         sys.exit(1)
+    session = start_session(profile_id)
     show_risk_warning_if_needed()
     app.setQuitOnLastWindowClosed(False)
-    check_and_sync_saves(profile_id)
+    check_and_sync_saves(profile_id, session=session)
     
 elif args.runid:
     if not cloud_storage_path:
         print("Cloud storage path is not configured. Run the script without a parameter to run the first-time setup")
         sys.exit(1)
-    if not os.path.exists(cloud_storage_path):
+    profile_id = args.runid
+
+    # The share is probed on the session's threads alongside the local scan instead of before it
+    session = start_session(profile_id)
+    if not session.share_accessible():
         print("Cloud storage path is invalid. Run the configuration tool to fix.")
         sys.exit(1)
-    profile_id = args.runid
     profile_fields = io_profile("read", profile_id)
     if not profile_fields:
         print("Profile ID not found. Aborting.")
@@ -120,7 +106,7 @@ elif args.runid:
 
     show_risk_warning_if_needed()
     app.setQuitOnLastWindowClosed(False)
-    check_and_sync_saves(profile_id)
+    check_and_sync_saves(profile_id, session=session)
 
 else:
     show_risk_warning_if_needed()